@@ -1,114 +1,217 @@
 import os
-import time
-from selenium import webdriver
+import sys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 import requests
-from urllib.parse import unquote, urljoin, urlparse
+from urllib.parse import unquote, urljoin
 
-# 设置Chrome选项
-chrome_options = Options()
-# chrome_options.add_argument("--headless")  # 调试时先注释掉
-chrome_options.add_argument("--disable-gpu")
-chrome_options.add_argument("--no-sandbox")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.browser import make_chrome
+from crawler_common.journal import CrawlJournal, DOWNLOADED, FAILED, RESOLVED
+from crawler_common.metrics import metrics
+from crawler_common.mediawiki import (best_image_url, first_available, original_url, resolve_file_titles,
+                                       saved_name, sized_name, sized_urls, title_from_url)
+from crawler_common.blob_store import BlobStore
+from crawler_common.download import AssetIndex, download_file
+from crawler_common.rate_limit import navigate
+
+# 配置
+# "api": 通过MediaWiki API每50个文件一次批量解析原图地址（推荐）
+# "derive": 由文件名按MediaWiki的哈希目录规则直接算出原图地址，不发出任何解析请求；下载失败的再用API解析
+# "browser": 用浏览器逐个打开文件页面
+RESOLVE_MODE = "api"
+# 分辨率策略：max_width为图片的最大宽度（None为原图），更宽的图片向MediaWiki请求该宽度的缩略图，不下载原图；
+# webp为True时优先请求服务器转换的WebP缩略图（服务器不提供时退回原格式）。限制宽度时输出到单独的目录（如 NPC立绘_1024px）
+RESOLUTION = {"max_width": None, "webp": False}
+OUTPUT_DIR = "NPC立绘"
+JOURNAL_PATH = "NPC立绘.journal.db"  # 爬取记录，中断后重新运行会从上次停止处继续
+METRICS_REPORT = "NPC立绘.metrics.json"  # 运行报告（各阶段耗时、字节数、错误），.prom后缀则为Prometheus格式
+INCREMENTAL = True  # 增量模式：记录ETag/Last-Modified，未变化的图片不再重新下载
+asset_index = AssetIndex(f"{OUTPUT_DIR}.assets.db") if INCREMENTAL else None
+DEDUPLICATE = True  # 相同内容只保存一份，输出目录中的文件为指向内容仓库的硬链接
+blob_store = BlobStore(".blobs") if DEDUPLICATE else None
+
+# 浏览器设置：无头 + 精简模式（不加载图片、字体、媒体），只用来读取页面中的链接
+HEADLESS = True  # 调试时可改为False观察浏览器
 
 # 替换为你的chromedriver路径
 driver_path = "C:/Users/mimsd/.cache/selenium/chromedriver/win64/135.0.7049.114/chromedriver.exe"
-service = Service(driver_path)
-
-# 初始化浏览器
-driver = webdriver.Chrome(service=service, options=chrome_options)
 
 # 目标网页URL
 base_url = "https://prts.wiki"
+api_url = "https://prts.wiki/api.php"
+image_base = "https://media.prts.wiki"  # 原图所在的图片服务器
 target_url = "https://prts.wiki/w/%E5%89%A7%E6%83%85%E8%B5%84%E6%BA%90%E6%A6%82%E8%A7%88"
 
-driver.get(target_url)
-time.sleep(15)  # 等待页面加载
+def collect_image_links(driver):
+    """第一部分：获取NPC部分的所有图片链接"""
+    navigate(driver, target_url)
+    # 等待页面中的图片链接出现
+    with metrics.timer("wait"):
+        WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.XPATH, '//a[@class="image"]')))
 
-# 第一部分：获取NPC部分的所有图片链接
-image_links = []
+    image_links = []
 
-# 直接查找所有带有class="image"的<a>标签，这些是图片链接
-a_tags = driver.find_elements(By.XPATH, '//a[@class="image"]')
+    # 直接查找所有带有class="image"的<a>标签，这些是图片链接
+    a_tags = driver.find_elements(By.XPATH, '//a[@class="image"]')
 
-for a_tag in a_tags:
-    # 检查这个<a>标签是否在NPC部分（通过检查父级结构中是否有NPC标题）
-    try:
-        # 获取href属性
-        href = a_tag.get_attribute("href")
-        if href and ("文件:" in href or "File:" in href or "Avg_avg_npc" in href):
-            # 补全URL
-            full_url = urljoin(base_url, href)
-            image_links.append(full_url)
-            print(f"找到图片链接: {full_url}")
-    except Exception as e:
-        print(f"处理链接时出错: {str(e)}")
+    for a_tag in a_tags:
+        # 检查这个<a>标签是否在NPC部分（通过检查父级结构中是否有NPC标题）
+        try:
+            # 获取href属性
+            href = a_tag.get_attribute("href")
+            if href and ("文件:" in href or "File:" in href or "Avg_avg_npc" in href):
+                # 补全URL
+                full_url = urljoin(base_url, href)
+                image_links.append(full_url)
+                print(f"找到图片链接: {full_url}")
+        except Exception as e:
+            print(f"处理链接时出错: {str(e)}")
+
+    print(f"共找到 {len(image_links)} 个图片链接")
+    return image_links
 
-print(f"共找到 {len(image_links)} 个图片链接")
+def clean_image_name(name):
+    """清理文件名"""
+    name = unquote(name)
+    name = name.replace("™", "TM").replace(" ", "_")
+    return "".join(c for c in name if c not in '\/:*?"<>|').strip()
 
-# 第二部分：访问每个图片页面并下载原始图片
-if not os.path.exists("NPC立绘"):
-    os.makedirs("NPC立绘")
+def save_image(session, image_urls, title, expected_sha1=None, output_dir=OUTPUT_DIR, mime=None):
+    """
+    下载文件title的图片到输出目录，返回是否成功；image_urls为按分辨率策略依次尝试的地址（见sized_urls），最后一个为原图
+    文件名由标题和实际下载地址的扩展名决定（见saved_name），各解析模式相同；
+    expected_sha1为API返回的原图哈希，内容已存在时不再下载
+    """
+    def download(image_url):
+        filename = clean_image_name(saved_name(title, image_url, mime))
+        file_path = os.path.join(output_dir, filename)
+
+        print(f"图片URL: {image_url}")
+        print(f"文件名: {filename}")
 
-for img_page_url in image_links[700:]:
+        # 下载图片；缩略图与原图内容不同，不按原图哈希查找
+        sha1 = expected_sha1 if image_url == image_urls[-1] else None
+        if download_file(session, image_url, file_path, index=asset_index, store=blob_store, expected_sha1=sha1):
+            print(f"已保存: {file_path}")
+            return True
+        return False
+
+    return first_available(download, image_urls) is not None
+
+def process_image_page(driver, session, img_page_url, resolution=None):
+    """浏览器模式：访问图片页面并下载原始图片（或分辨率策略限制的缩略图），返回是否成功"""
+    resolution = resolution or RESOLUTION
     try:
         print(f"\n正在处理: {img_page_url}")
-        driver.get(img_page_url)
-        time.sleep(2)  # 等待页面加载
-        
-        # 获取原始图片URL - 直接从img标签获取srcset中的最高分辨率图片
+        navigate(driver, img_page_url)
+
+        # 获取原始图片URL：取src/srcset中最大的候选，缩略图地址换算为原图地址
         img_tag = driver.find_element(By.XPATH, '//div[@class="fullImageLink"]//img')
-        
-        # 尝试获取srcset中的最高分辨率图片
-        srcset = img_tag.get_attribute("srcset")
-        if srcset:
-            # 获取srcset中最大的图片（通常是最后一个）
-            image_url = srcset.split()[-2]  # 获取倒数第二个元素（URL）
-        else:
-            # 如果没有srcset，则使用src属性
-            image_url = img_tag.get_attribute("src")
-        
-        # 移除URL中的查询参数
-        image_url = image_url.split('?')[0]
-        
-        # 获取图片文件名
-        alt_text = img_tag.get_attribute("alt")
-        if alt_text.startswith(("文件:", "File:")):
-            clean_name = alt_text.split(":", 1)[1].strip()
-        else:
-            clean_name = alt_text
-        
-        # 清理文件名
-        clean_name = unquote(clean_name)
-        clean_name = clean_name.replace("™", "TM").replace(" ", "_")
-        clean_name = "".join(c for c in clean_name if c not in '\/:*?"<>|').strip()
-        
-        # 从URL中提取文件扩展名
-        parsed_url = urlparse(image_url)
-        filename = os.path.basename(parsed_url.path)
-        file_ext = os.path.splitext(filename)[1] or ".png"
-        
-        # 确保文件名不重复
-        file_path = os.path.join("NPC立绘", f"{clean_name}{file_ext}")
-        
-        print(f"图片URL: {image_url}")
-        print(f"文件名: {clean_name}{file_ext}")
-        
-        # 下载图片
-        response = requests.get(image_url, stream=True)
-        if response.status_code == 200:
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            print(f"已保存: {file_path}")
-        else:
-            print(f"下载失败，状态码: {response.status_code}")
-            
+        image_url = best_image_url(img_tag.get_attribute("src"), img_tag.get_attribute("srcset"), img_page_url)
+
+        # 与API模式一样按页面标题命名
+        return save_image(session, sized_urls(image_url, **resolution), title_from_url(img_page_url),
+                          output_dir=sized_name(OUTPUT_DIR, resolution["max_width"]))
+
     except Exception as e:
         print(f"处理 {img_page_url} 时出错: {str(e)}")
+        return False
+
+def process_with_api(session, journal, image_links, resolution=None):
+    """API模式：批量解析文件标题，直接下载原图（限制宽度时为API返回的缩略图），不再逐个打开文件页面"""
+    resolution = resolution or RESOLUTION
+    output_dir = sized_name(OUTPUT_DIR, resolution["max_width"])
+    titles = {title_from_url(url): url for url in image_links}
+    print(f"\n正在通过API解析 {len(titles)} 个文件...")
+    resolved = resolve_file_titles(session, api_url, list(titles), max_width=resolution["max_width"])
+
+    for title, img_page_url in titles.items():
+        info = resolved.get(title)
+        if not info:
+            print(f"未能解析: {img_page_url}")
+            journal.mark(img_page_url, FAILED, error="unresolved")
+            metrics.error("resolve", "unresolved")
+            metrics.complete()
+            continue
+        journal.mark(img_page_url, RESOLVED, info)
+        try:
+            print(f"\n正在处理: {title}")
+            image_urls = sized_urls(info["url"], width=info["width"], thumb=info["thumb_url"], **resolution)
+            ok = save_image(session, image_urls, title, info["sha1"], output_dir, info["mime"])
+            journal.mark(img_page_url, DOWNLOADED if ok else FAILED)
+        except Exception as e:
+            print(f"处理 {img_page_url} 时出错: {str(e)}")
+            journal.mark(img_page_url, FAILED, error=str(e))
+        metrics.complete()
+
+def process_with_derive(session, journal, image_links, resolution=None):
+    """推算模式：由文件标题直接算出原图（或缩略图）地址并下载，推算的地址下载失败时再交给API解析"""
+    resolution = resolution or RESOLUTION
+    output_dir = sized_name(OUTPUT_DIR, resolution["max_width"])
+    unresolved = []
+    for img_page_url in image_links:
+        title = title_from_url(img_page_url)
+        try:
+            print(f"\n正在处理: {title}")
+            image_urls = sized_urls(original_url(image_base, title), **resolution)
+            ok = save_image(session, image_urls, title, output_dir=output_dir)
+        except Exception as e:
+            print(f"处理 {img_page_url} 时出错: {str(e)}")
+            ok = False
+        if not ok:
+            unresolved.append(img_page_url)
+            continue
+        journal.mark(img_page_url, DOWNLOADED)
+        metrics.complete()
+
+    if unresolved:
+        print(f"\n{len(unresolved)} 个文件无法按推算的地址下载，改用API解析")
+        process_with_api(session, journal, unresolved, resolution)
+
+def main():
+    # 初始化浏览器
+    driver = make_chrome(headless=HEADLESS, driver_path=driver_path)
+    session = requests.Session()
+    journal = CrawlJournal(sized_name(JOURNAL_PATH, RESOLUTION["max_width"]))
+
+    try:
+        image_links = collect_image_links(driver)
+
+        # 第二部分：访问每个图片页面并下载原始图片
+        os.makedirs(sized_name(OUTPUT_DIR, RESOLUTION["max_width"]), exist_ok=True)
+
+        # 跳过爬取记录中已完成的图片
+        for img_page_url in image_links:
+            journal.discover(img_page_url)
+        image_links = [url for url in image_links if not journal.is_done(url)]
+        print(f"本次需要处理 {len(image_links)} 个图片")
+        metrics.add_total(len(image_links))
+        metrics.start_progress()
+
+        if RESOLVE_MODE in ("api", "derive"):
+            # 链接已收集完毕，后续不再需要浏览器
+            driver.quit()
+            driver = None
+            if RESOLVE_MODE == "derive":
+                process_with_derive(session, journal, image_links)
+            else:
+                process_with_api(session, journal, image_links)
+        else:
+            for img_page_url in image_links:
+                ok = process_image_page(driver, session, img_page_url)
+                journal.mark(img_page_url, DOWNLOADED if ok else FAILED)
+                metrics.complete()
+    finally:
+        # 关闭浏览器
+        if driver:
+            driver.quit()
+        journal.close()
+        metrics.stop_progress()
+        print(metrics.summary())
+        metrics.write_report(METRICS_REPORT)
+    print("任务完成")
 
-# 关闭浏览器
-driver.quit()
-print("任务完成")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import sys
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from urllib.parse import quote
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.daemon import run_cli
+from crawler_common.journal import CrawlJournal
+from crawler_common.mediawiki import sized_name
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import navigate
+
+# 常驻服务：保持预热的无头浏览器和HTTP会话，通过本地接口接收任务，不需要手动导航和确认
+# 启动：python 明日方舟PRTS常驻服务.py serve
+# 提交：python 明日方舟PRTS常驻服务.py submit skins --wait
+#       python 明日方舟PRTS常驻服务.py submit search query=宣传图 --wait
+#       python 明日方舟PRTS常驻服务.py submit npc max_width=1024 webp=true
+#       python 明日方舟PRTS常驻服务.py submit new_files --wait
+#       python 明日方舟PRTS常驻服务.py submit operators url=<已设置好筛选条件的干员一览地址> select=true
+# 查询：python 明日方舟PRTS常驻服务.py status [任务id]
+
+# 配置
+PORT = 8791  # 只监听本机
+POOL_SIZE = 2  # 常驻的无头浏览器数量上限
+WARM_BROWSERS = 1  # 启动时预热的浏览器数量
+BASE_URL = "https://prts.wiki"
+OPERATOR_LIST_URL = f"{BASE_URL}/w/干员一览"
+HOMEPAGE_URL = f"{BASE_URL}/w/首页"
+SEARCH_URL = f"{BASE_URL}/index.php"
+SEARCH_LIMIT = 500  # 搜索结果每页的条数
+PROXIES = []  # 出口代理（如 "http://127.0.0.1:8080"），设置后常驻的浏览器和HTTP会话分摊到各代理上
+
+# 各任务复用的脚本，第一次用到时才加载
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = {
+    "operators": "明日方舟PRTS干员列表.py",
+    "operators_select": "明日方舟PRTS干员列表（可选择）.py",
+    "skins": "明日方舟PRTS新增皮肤（首页）.py",
+    "npc": "明日方舟PRTSNPC立绘.py",
+    "search": "明日方舟PRTS搜索页面图片.py",
+    "new_files": "明日方舟PRTS新增文件.py",
+}
+
+def script(daemon, name):
+    return daemon.script(os.path.join(SCRIPT_DIR, SCRIPTS[name]))
+
+def resolution(module, max_width=None, webp=None):
+    """任务参数覆盖脚本中的分辨率策略（RESOLUTION），每个任务单独生效"""
+    policy = dict(module.RESOLUTION)
+    if max_width is not None:
+        policy["max_width"] = max_width or None
+    if webp is not None:
+        policy["webp"] = webp
+    return policy
+
+def job_operators(daemon, url=OPERATOR_LIST_URL, select=False):
+    """干员列表：打开列表页面（可传入已设置好筛选条件的地址），下载尚未完成的干员的立绘"""
+    module = script(daemon, "operators_select" if select else "operators")
+    # 先读完列表再归还浏览器，详情解析阶段可以用到池中所有浏览器
+    with daemon.pool.lease() as driver:
+        navigate(driver, url)
+        with metrics.timer("wait"):
+            WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.long-container")))
+        operator_infos = module.collect_operator_info(driver)
+
+    counter = {"found": 0, "skipped": 0}
+    with CrawlJournal(module.JOURNAL_PATH) as journal:
+        stages = module.crawl_operators(daemon.pool, journal, module.skip_done(operator_infos, journal, counter))
+    return dict(counter, stages=stages)
+
+def job_skins(daemon):
+    """首页新增时装：下载首页'新增时装'中各干员的最新立绘"""
+    module = script(daemon, "skins")
+    with daemon.pool.lease() as driver:
+        navigate(driver, HOMEPAGE_URL)
+        operator_list = module.collect_specific_operators(driver)
+        metrics.add_total(len(operator_list))
+        for operator_info in operator_list:
+            module.process_operator(driver, operator_info)
+            metrics.complete()
+    return {"operators": len(operator_list)}
+
+def job_npc(daemon, max_width=None, webp=None):
+    """NPC立绘：读取剧情资源概览中的文件链接，下载尚未完成的图片；max_width/webp为本次的分辨率策略"""
+    module = script(daemon, "npc")
+    policy = resolution(module, max_width, webp)
+    with daemon.pool.lease() as driver:
+        image_links = module.collect_image_links(driver)
+
+    os.makedirs(sized_name(module.OUTPUT_DIR, policy["max_width"]), exist_ok=True)
+    with CrawlJournal(sized_name(module.JOURNAL_PATH, policy["max_width"])) as journal:
+        for img_page_url in image_links:
+            journal.discover(img_page_url)
+        pending = [url for url in image_links if not journal.is_done(url)]
+        metrics.add_total(len(pending))
+        # 常驻服务中总是直接解析原图地址，不用浏览器逐个打开文件页面
+        if module.RESOLVE_MODE == "derive":
+            module.process_with_derive(daemon.session, journal, pending, policy)
+        else:
+            module.process_with_api(daemon.session, journal, pending, policy)
+    return {"found": len(image_links), "processed": len(pending)}
+
+def job_search(daemon, query, limit=SEARCH_LIMIT, max_width=None, webp=None):
+    """搜索页面图片：搜索文件命名空间，下载结果中的所有图片；max_width/webp为本次的分辨率策略"""
+    module = script(daemon, "search")
+    policy = resolution(module, max_width, webp)
+    url = f"{SEARCH_URL}?search={quote(query)}&fulltext=1&ns6=1&limit={limit}"
+    with daemon.pool.lease() as driver:
+        navigate(driver, url)
+        detail_urls = [link.get_attribute("href") for link in module.get_image_links(driver)]
+
+    metrics.add_total(len(detail_urls))
+    if module.RESOLVE_MODE == "derive":
+        module.download_images_with_derive(detail_urls, daemon.session, policy)
+    else:
+        module.download_images_with_api(detail_urls, daemon.session, policy)
+    return {"files": len(detail_urls)}
+
+def job_new_files(daemon, since=None, max_width=None, webp=None):
+    """新增文件：下载上传日志中上次运行（或since，如2026-01-01T00:00:00Z）之后上传的立绘，不需要浏览器"""
+    module = script(daemon, "new_files")
+    policy = resolution(module, max_width, webp)
+    with CrawlJournal(sized_name(module.JOURNAL_PATH, policy["max_width"])) as journal:
+        return module.crawl_new_files(daemon.session, journal, since, policy)
+
+JOBS = {
+    "operators": job_operators,
+    "skins": job_skins,
+    "npc": job_npc,
+    "search": job_search,
+    "new_files": job_new_files,
+}
+
+if __name__ == "__main__":
+    run_cli(JOBS, "明日方舟PRTS常驻服务", port=PORT, pool_size=POOL_SIZE, warm=WARM_BROWSERS,
+            proxies=PROXIES)
@@ -1,16 +1,63 @@
 import os
-import time
-from selenium import webdriver
+import sys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import requests
 import re
+from functools import partial
+from urllib.parse import urljoin
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.blob_store import BlobStore
+from crawler_common.browser import make_chrome
+from crawler_common.dom_extract import extract_images, extract_operators
+from crawler_common.download import AssetIndex, download_file
+from crawler_common.driver_pool import DriverPool
+from crawler_common.html_parser import only_tags, parse_html
+from crawler_common.journal import CrawlJournal, DOWNLOADED, FAILED
+from crawler_common.metrics import metrics
+from crawler_common.pipeline import Pipeline
+from crawler_common.postprocess import PostProcessor
+from crawler_common.proxy_pool import use_proxies
+from crawler_common.rate_limit import navigate, request_with_limit
+from crawler_common.work_queue import open_queue, per_item, run_worker
 
 # 配置
-WAIT_TIME = 2  # 每次请求间隔3秒
 OUTPUT_DIR = "新增干员立绘"  # 输出目录
 BASE_URL = "https://prts.wiki"
+POOL_SIZE = max(2, (os.cpu_count() or 4) // 2)  # 并行处理详情页的无头浏览器数量
+MAX_PAGES_PER_BROWSER = 50  # 每个浏览器处理多少个页面后重建，控制内存占用
+DOWNLOAD_WORKERS = 8  # 下载阶段的并发数
+QUEUE_SIZE = 32  # 流水线各阶段之间的队列长度，队列满时上游等待
+EXTRACT_MODE = "script"  # "script": 每个页面一次execute_script批量提取；"element": 逐个元素读取
+# "http": 直接请求详情页HTML解析立绘，静态HTML中找不到时才用浏览器；"browser": 全部用浏览器
+DETAIL_MODE = "http"
+HTTP_WORKERS = 16  # http模式下并行请求详情页的线程数
+JOURNAL_PATH = f"{OUTPUT_DIR}.journal.db"  # 爬取记录，中断后重新运行会从上次停止处继续
+# 分布式爬取：多个进程（可在不同机器上）共享一个任务队列，各自领取干员处理
+# 设为队列的SQLite路径（如 f"{OUTPUT_DIR}.queue.db"）或 "http://主机:8790"；None为单进程
+# 队列为空时由当前进程打开浏览器手动导航并登记干员，之后启动的进程直接领取，不需要浏览器导航
+WORK_QUEUE = None
+# 出口代理（如 "http://127.0.0.1:8080"、"socks5://127.0.0.1:1080"，SOCKS需要PySocks）；为空时直接连接
+# 设置后详情页请求、图片下载和并行解析的无头浏览器分摊到各代理上，每个代理单独限速，
+# 并发上限为 proxy_pool.PER_PROXY_CONCURRENCY，连续失败、过慢或被封禁的代理自动停用；手动导航的窗口仍直接连接
+PROXIES = []
+METRICS_REPORT = f"{OUTPUT_DIR}.metrics.json"  # 运行报告（各阶段耗时、字节数、错误），.prom后缀则为Prometheus格式
+INCREMENTAL = True  # 增量模式：记录ETag/Last-Modified，未变化的图片不再重新下载
+session = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_maxsize=HTTP_WORKERS + DOWNLOAD_WORKERS)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+asset_index = AssetIndex(f"{OUTPUT_DIR}.assets.db") if INCREMENTAL else None
+DEDUPLICATE = True  # 相同内容只保存一份，输出目录中的文件为指向内容仓库的硬链接
+blob_store = BlobStore(".blobs") if DEDUPLICATE else None
+# 后处理：下载完成后在进程池中无损压缩PNG、记录真实格式和尺寸并生成预览图（需要Pillow）
+POSTPROCESS = False
+postprocessor = PostProcessor(f"{OUTPUT_DIR}.images.db", index=asset_index, store=blob_store) if POSTPROCESS else None
+
+# 详情页中只解析立绘区域
+CHARIMG = only_tags("div", id="charimg-wrapper")
 
 # 创建输出目录
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -20,19 +67,18 @@ def sanitize_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', "", filename)
 
 def download_image(url, filepath):
-    """下载图片并保存"""
+    """下载图片并保存，返回是否成功"""
     if not url.startswith("http"):
         url = "https:" + url
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
+    return download_file(session, url, filepath, index=asset_index, store=blob_store)
+
+def iter_operator_info(driver):
+    """逐个产出干员的基本信息和详情页URL"""
+    if EXTRACT_MODE == "script":
+        # 一次往返取回整个列表
+        yield from extract_operators(driver)
+        return
 
-def collect_operator_info(driver):
-    """收集所有干员的基本信息和详情页URL"""
-    operator_list = []
-    
     # 获取所有干员元素
     operator_elements = driver.find_elements(By.CSS_SELECTOR, "div.long-container")
     
@@ -49,85 +95,243 @@ def collect_operator_info(driver):
             if not all([chinese_name, english_name, operator_id, operator_url]):
                 continue
                 
-            operator_info = {
+            yield {
                 "chinese_name": chinese_name,
                 "english_name": english_name,
                 "operator_id": operator_id,
                 "operator_url": operator_url
             }
-            operator_list.append(operator_info)
             
         except Exception as e:
             print(f"跳过无效元素: {str(e)}")
             continue
+
+def collect_operator_info(driver):
+    """收集所有干员的基本信息和详情页URL"""
+    return list(iter_operator_info(driver))
+
+def operator_images(operator_info, img_pairs):
+    """由立绘的 (id, src) 生成 [(保存路径, 图片URL)]"""
+    # 清理干员名中的非法字符
+    safe_chinese = sanitize_filename(operator_info["chinese_name"].strip())
+    safe_english = sanitize_filename(operator_info["english_name"].strip())
     
-    return operator_list
+    images = []
+    for img_id, img_src in img_pairs:
+        if img_src and img_id:
+            # 构建文件名
+            filename = f"{operator_info['operator_id']}_{safe_chinese}_{safe_english}_{img_id}.png"
+            images.append((os.path.join(OUTPUT_DIR, filename), img_src))
+    return images
 
-def process_operator(driver, operator_info):
-    """处理单个干员，下载所有立绘"""
-    chinese_name = operator_info["chinese_name"]
-    english_name = operator_info["english_name"]
-    operator_id = operator_info["operator_id"]
+def fetch_operator(operator_info):
+    """直接请求详情页HTML，从 #charimg-wrapper 中解析立绘；找不到时返回空列表"""
     operator_url = operator_info["operator_url"]
+    response = request_with_limit(session, operator_url, timeout=30)
+    response.raise_for_status()
+    wrapper = parse_html(response.text, CHARIMG).find("div", id="charimg-wrapper")
+    if not wrapper:
+        return []
+    img_pairs = []
+    for img in wrapper.find_all("img"):
+        img_src = img.get("src") or img.get("data-src")
+        if img_src:
+            img_pairs.append((img.get("id"), urljoin(operator_url, img_src)))
+    return operator_images(operator_info, img_pairs)
+
+def resolve_operator(driver, operator_info):
+    """用浏览器打开干员详情页，返回所有立绘的 [(保存路径, 图片URL)]"""
+    # 访问详情页
+    navigate(driver, operator_info["operator_url"])
     
-    print(f"\n处理干员: {chinese_name} ({operator_id})")
-    
-    try:
-        # 访问详情页
-        driver.get(operator_url)
-        
-        # 等待立绘区域加载
+    # 等待立绘区域加载
+    with metrics.timer("wait"):
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.ID, "charimg-wrapper"))
         )
-        
-        # 查找所有立绘img标签
-        img_elements = driver.find_elements(By.CSS_SELECTOR, "#charimg-wrapper img")
-        
-        for img in img_elements:
-            img_id = img.get_attribute("id")
-            img_src = img.get_attribute("src")
-            
-            if img_src and img_id:
-                # 清理干员名中的非法字符
-                safe_chinese = sanitize_filename(chinese_name.strip())
-                safe_english = sanitize_filename(english_name.strip())
-                
-                # 构建文件名
-                filename = f"{operator_id}_{safe_chinese}_{safe_english}_{img_id}.png"
-                filepath = os.path.join(OUTPUT_DIR, filename)
-                
-                print(f"正在下载: {filename}")
-                download_image(img_src, filepath)
-                time.sleep(WAIT_TIME)
+    
+    # 查找所有立绘img标签
+    if EXTRACT_MODE == "script":
+        img_pairs = [(img["id"], img["src"]) for img in extract_images(driver, "#charimg-wrapper img")]
+    else:
+        img_pairs = [(img.get_attribute("id"), img.get_attribute("src"))
+                     for img in driver.find_elements(By.CSS_SELECTOR, "#charimg-wrapper img")]
+    return operator_images(operator_info, img_pairs)
+
+def process_operator(driver, operator_info):
+    """处理单个干员，下载所有立绘，返回是否全部成功"""
+    chinese_name = operator_info["chinese_name"]
+    print(f"\n处理干员: {chinese_name} ({operator_info['operator_id']})")
+    ok = True
+    
+    try:
+        for filepath, img_src in resolve_operator(driver, operator_info):
+            print(f"正在下载: {os.path.basename(filepath)}")
+            ok = download_image(img_src, filepath) and ok
                 
     except Exception as e:
         print(f"处理干员 {chinese_name} 时出错: {str(e)}")
+        return False
+    return ok
+
+# ---- 流水线各阶段：列表发现 → 详情解析 → 下载 → 完成记录 ----
+
+def resolve_stage(pool, operator_info):
+    """详情解析阶段：先直接请求HTML解析，找不到立绘时再借用池中的浏览器，产出该干员的下载任务"""
+    key = operator_info["operator_url"]
+    print(f"\n处理干员: {operator_info['chinese_name']} ({operator_info['operator_id']})")
+    try:
+        images = []
+        if DETAIL_MODE == "http":
+            try:
+                images = fetch_operator(operator_info)
+            except Exception as e:
+                print(f"直接请求详情页失败，改用浏览器: {str(e)}")
+        if not images:
+            with pool.lease() as driver:
+                images = resolve_operator(driver, operator_info)
+    except Exception as e:
+        print(f"处理干员 {operator_info['chinese_name']} 时出错: {str(e)}")
+        return [{"operator_url": key, "total": 0, "ok": False}]
+
+    if not images:
+        return [{"operator_url": key, "total": 0, "ok": True}]
+    metrics.add_total(len(images))
+    return [{"operator_url": key, "total": len(images), "filepath": filepath, "url": img_src}
+            for filepath, img_src in images]
+
+def download_stage(task):
+    """下载阶段"""
+    if "url" in task:
+        print(f"正在下载: {os.path.basename(task['filepath'])}")
+        try:
+            task["ok"] = download_image(task["url"], task["filepath"])
+            if task["ok"] and postprocessor:
+                postprocessor.submit(task["filepath"])
+        except Exception as e:
+            print(f"下载失败 {task['url']}: {str(e)}")
+            task["ok"] = False
+        metrics.complete()
+    return [task]
+
+def finalize_stage(journal, remaining, task):
+    """完成阶段：一个干员的所有立绘都处理完后写入爬取记录"""
+    key = task["operator_url"]
+    state = remaining.setdefault(key, {"left": task["total"], "ok": True})
+    state["left"] -= 1
+    state["ok"] = state["ok"] and task["ok"]
+    if state["left"] <= 0:
+        journal.mark(key, DOWNLOADED if state["ok"] else FAILED)
+        del remaining[key]
+
+def iter_pending_operators(driver, journal, counter):
+    """列表发现阶段：边读取列表边产出尚未完成的干员"""
+    return skip_done(iter_operator_info(driver), journal, counter)
+
+def skip_done(operator_infos, journal, counter):
+    """登记干员并跳过爬取记录中已完成的"""
+    for operator_info in operator_infos:
+        counter["found"] += 1
+        journal.discover(operator_info["operator_url"], operator_info)
+        if journal.is_done(operator_info["operator_url"]):
+            counter["skipped"] += 1
+            continue
+        yield operator_info
+
+def crawl_operators(pool, journal, operator_infos):
+    """流水线处理干员：详情解析 → 下载 → 完成记录，operator_infos可以是边读取列表边产出的生成器"""
+    resolve_workers = HTTP_WORKERS if DETAIL_MODE == "http" else POOL_SIZE
+    print(f"\n开始处理干员（{resolve_workers} 个线程解析，最多 {pool.size} 个浏览器，{DOWNLOAD_WORKERS} 个线程下载）...")
+    pipeline = Pipeline(QUEUE_SIZE)
+    pipeline.add_stage("详情解析", partial(resolve_stage, pool), workers=resolve_workers)
+    pipeline.add_stage("下载", download_stage, workers=DOWNLOAD_WORKERS)
+    pipeline.add_stage("完成记录", partial(finalize_stage, journal, {}), workers=1)
+    pipeline.run(operator_infos)
+    print(f"各阶段处理数: {pipeline.summary()}")
+    return pipeline.summary()
+
+def open_driver_pool(proxies=None):
+    """并行解析详情页的无头浏览器池；使用代理池时每个浏览器分配一个出口"""
+    factory = proxies.chrome_factory() if proxies else make_chrome
+    return DriverPool(POOL_SIZE, factory=factory, max_pages=MAX_PAGES_PER_BROWSER)
+
+def process_operator_task(pool, journal, key, operator_info):
+    """分布式模式：处理队列中领取到的一个干员，解析并下载它的全部立绘后汇报结果"""
+    ok = True
+    for task in resolve_stage(pool, operator_info):
+        task = download_stage(task)[0]
+        ok = ok and task["ok"]
+    journal.mark(key, DOWNLOADED if ok else FAILED)
+    return ok
+
+def run_distributed(journal, proxies=None):
+    """分布式模式：队列为空时先手动导航登记干员，然后从共享队列领取处理"""
+    resolve_workers = HTTP_WORKERS if DETAIL_MODE == "http" else POOL_SIZE
+    with open_queue(WORK_QUEUE) as queue:
+        if not queue.counts():
+            driver = make_chrome(headless=False)
+            driver.maximize_window()
+            try:
+                print("任务队列为空，请手动导航到干员列表页面: https://prts.wiki/w/首页")
+                input("准备好后按Enter键继续...")
+                counter = {"found": 0, "skipped": 0}
+                queue.put((info["operator_url"], info)
+                          for info in iter_pending_operators(driver, journal, counter))
+                print(f"已登记 {counter['found'] - counter['skipped']} 个干员")
+            finally:
+                driver.quit()
+        metrics.start_progress()
+        with open_driver_pool(proxies) as pool:
+            run_worker(queue, per_item(partial(process_operator_task, pool, journal)), threads=resolve_workers)
+        print(f"任务队列: {queue.counts()}")
+
+def finish():
+    """输出运行报告，等待后处理完成"""
+    metrics.stop_progress()
+    print(metrics.summary())
+    metrics.write_report(METRICS_REPORT)
+    if postprocessor:
+        print("等待图片后处理完成...")
+        postprocessor.close()
+        print(postprocessor.summary())
 
 def main():
-    driver = webdriver.Chrome()
+    proxies = use_proxies(PROXIES)
+    if WORK_QUEUE:
+        journal = CrawlJournal(JOURNAL_PATH)
+        try:
+            run_distributed(journal, proxies)
+        finally:
+            journal.close()
+            finish()
+        return
+
+    # 需要手动导航，使用可见窗口；仍然不加载图片等资源
+    driver = make_chrome(headless=False)
     driver.maximize_window()
+    journal = CrawlJournal(JOURNAL_PATH)
     
     try:
         print("请手动导航到干员列表页面: https://prts.wiki/w/首页")
         input("准备好后按Enter键继续...")
         
-        # 第一步：收集所有干员信息
-        print("\n正在收集干员信息...")
-        operator_list = collect_operator_info(driver)
-        print(f"共找到 {len(operator_list)} 个干员")
-        
-        # 第二步：逐个处理干员
-        print("\n开始下载立绘...")
-        for operator_info in operator_list:
-            process_operator(driver, operator_info)
+        # 流水线：收集到第一个干员就开始解析详情页，解析出第一张立绘就开始下载
+        counter = {"found": 0, "skipped": 0}
+        metrics.start_progress()
+        with open_driver_pool(proxies) as pool:
+            crawl_operators(pool, journal, iter_pending_operators(driver, journal, counter))
+
+        print(f"\n共找到 {counter['found']} 个干员，跳过已完成的 {counter['skipped']} 个")
             
         print("\n所有干员处理完成!")
         
     except Exception as e:
         print(f"程序出错: {str(e)}")
     finally:
-        driver.quit()
+        if driver:
+            driver.quit()
+        journal.close()
+        finish()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
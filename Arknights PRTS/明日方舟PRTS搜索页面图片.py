@@ -1,11 +1,33 @@
 import os
-import time
-from selenium import webdriver
+import sys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 import requests
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.browser import make_chrome
+from crawler_common.mediawiki import (first_available, original_url, resolve_file_titles, saved_name, sized_name,
+                                       sized_urls, title_from_url)
+from crawler_common.blob_store import BlobStore
+from crawler_common.download import AssetIndex, download_file
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import navigate
+
+# "api": 通过MediaWiki API每50个文件一次批量解析原图地址（推荐）
+# "derive": 由文件名按MediaWiki的哈希目录规则直接算出原图地址，不发出任何解析请求；下载失败的再用API解析
+# "browser": 用浏览器逐个打开文件页面
+RESOLVE_MODE = "api"
+API_URL = "https://prts.wiki/api.php"
+IMAGE_BASE = "https://media.prts.wiki"  # 原图所在的图片服务器
+# 分辨率策略：max_width为图片的最大宽度（None为原图），更宽的图片向MediaWiki请求该宽度的缩略图，不下载原图；
+# webp为True时优先请求服务器转换的WebP缩略图（服务器不提供时退回原格式）。限制宽度时输出到单独的目录（如 prts搜索_1024px）
+RESOLUTION = {"max_width": None, "webp": False}
+OUTPUT_DIR = "prts搜索"
+INCREMENTAL = True  # 增量模式：记录ETag/Last-Modified，未变化的图片不再重新下载
+asset_index = AssetIndex("prts搜索.assets.db") if INCREMENTAL else None
+DEDUPLICATE = True  # 相同内容只保存一份，输出目录中的文件为指向内容仓库的硬链接
+blob_store = BlobStore(".blobs") if DEDUPLICATE else None
+METRICS_REPORT = "prts搜索.metrics.json"  # 运行报告（各阶段耗时、字节数、错误），.prom后缀则为Prometheus格式
+
 def wait_for_user_confirmation():
     print("\n请手动打开目标网页并确认页面已完全加载...")
     print("确认页面加载完成后，请在此处输入'y'并按回车键继续爬取")
@@ -24,60 +46,117 @@ def get_image_links(driver):
     image_links = driver.find_elements(By.CSS_SELECTOR, "table.searchResultImage a.image")
     return image_links
 
-def download_images(driver, detail_urls):
+def download_images(driver, detail_urls, resolution=None):
+    resolution = resolution or RESOLUTION
+    output_dir = sized_name(OUTPUT_DIR, resolution["max_width"])
     # 创建保存图片的目录
-    if not os.path.exists("prts搜索"):
-        os.makedirs("prts搜索")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    session = requests.Session()
     
     for i, url in enumerate(detail_urls, 1):
         try:
             print(f"\n正在处理第 {i}/{len(detail_urls)} 个页面: {url}")
-            driver.get(url)
-            
-            # 等待用户确认页面加载完成
-            time.sleep(2)
+            navigate(driver, url)
             
-            # 获取图片元素
+            # 获取图片URL，与API模式一样按页面标题命名
             full_image_link = driver.find_element(By.CSS_SELECTOR, "div.fullImageLink a")
-            img_element = full_image_link.find_element(By.TAG_NAME, "img")
-            
-            # 获取图片URL和名称
             image_url = full_image_link.get_attribute("href")
-            image_name = img_element.get_attribute("alt").replace("文件:", "").strip()
+            title = title_from_url(url)
             
             print(f"图片URL: {image_url}")
-            print(f"图片名称: {image_name}")
+            print(f"图片名称: {title}")
             
             # 下载图片
-            response = requests.get(image_url, stream=True)
-            if response.status_code == 200:
-                # 清理文件名中的非法字符
-                safe_name = "".join([c for c in image_name if c not in r'\/:*?"<>|'])
-                file_path = os.path.join("prts搜索", f"{safe_name}.png")
-                
-                with open(file_path, "wb") as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                print(f"图片已保存为: {file_path}")
-            else:
-                print(f"下载失败，状态码: {response.status_code}")
+            save_image(session, sized_urls(image_url, **resolution), title, output_dir=output_dir)
                 
         except Exception as e:
             print(f"处理第 {i} 个页面时出错: {str(e)}")
             continue
+        finally:
+            metrics.complete()
 
-def main():
-    # 设置Chrome选项 - 不使用无头模式以便观察
-    chrome_options = Options()
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
+def save_image(session, image_urls, title, expected_sha1=None, output_dir=OUTPUT_DIR, mime=None):
+    """
+    下载文件title的图片到输出目录；image_urls为按分辨率策略依次尝试的地址（见sized_urls），最后一个为原图
+    文件名由标题和实际下载地址的扩展名决定（见saved_name），各解析模式相同；
+    expected_sha1为API返回的原图哈希，内容已存在时不再下载
+    """
+    def download(image_url):
+        # 清理文件名中的非法字符
+        safe_name = "".join([c for c in saved_name(title, image_url, mime) if c not in r'\/:*?"<>|'])
+        file_path = os.path.join(output_dir, safe_name)
+        # 缩略图与原图内容不同，不按原图哈希查找
+        sha1 = expected_sha1 if image_url == image_urls[-1] else None
+        if download_file(session, image_url, file_path, index=asset_index, store=blob_store, expected_sha1=sha1):
+            print(f"图片已保存为: {file_path}")
+            return True
+        return False
+
+    return first_available(download, image_urls) is not None
+
+def download_images_with_api(detail_urls, session=None, resolution=None):
+    """API模式：批量解析文件标题后直接下载（限制宽度时为API返回的缩略图），不再逐个打开文件页面"""
+    resolution = resolution or RESOLUTION
+    output_dir = sized_name(OUTPUT_DIR, resolution["max_width"])
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    session = session or requests.Session()
+
+    titles = [title_from_url(url) for url in detail_urls]
+    resolved = resolve_file_titles(session, API_URL, titles, max_width=resolution["max_width"])
+
+    for i, title in enumerate(titles, 1):
+        info = resolved.get(title)
+        if not info:
+            print(f"第 {i} 个文件未能解析: {title}")
+            metrics.error("resolve", "unresolved")
+            metrics.complete()
+            continue
+        try:
+            print(f"\n正在处理第 {i}/{len(titles)} 个文件: {title}")
+            image_urls = sized_urls(info["url"], width=info["width"], thumb=info["thumb_url"], **resolution)
+            print(f"图片URL: {image_urls[0]}")
+            save_image(session, image_urls, title, info["sha1"], output_dir, info["mime"])
+        except Exception as e:
+            print(f"处理第 {i} 个文件时出错: {str(e)}")
+            continue
+        finally:
+            metrics.complete()
+
+def download_images_with_derive(detail_urls, session=None, resolution=None):
+    """推算模式：由文件标题直接算出原图（或缩略图）地址并下载，推算的地址下载失败时再交给API解析"""
+    resolution = resolution or RESOLUTION
+    output_dir = sized_name(OUTPUT_DIR, resolution["max_width"])
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    session = session or requests.Session()
+
+    unresolved = []
+    for i, url in enumerate(detail_urls, 1):
+        title = title_from_url(url)
+        try:
+            print(f"\n正在处理第 {i}/{len(detail_urls)} 个文件: {title}")
+            image_urls = sized_urls(original_url(IMAGE_BASE, title), **resolution)
+            ok = save_image(session, image_urls, title, output_dir=output_dir)
+        except Exception as e:
+            print(f"处理第 {i} 个文件时出错: {str(e)}")
+            ok = False
+        if not ok:
+            unresolved.append(url)
+            continue
+        metrics.complete()
 
+    if unresolved:
+        print(f"\n{len(unresolved)} 个文件无法按推算的地址下载，改用API解析")
+        download_images_with_api(unresolved, session, resolution)
+
+def main():
     # 替换为你的chromedriver路径
     driver_path = "C:/Users/mimsd/.cache/selenium/chromedriver/win64/135.0.7049.114/chromedriver.exe"  # 或者指定完整路径如 "C:/path/to/chromedriver.exe"
-    service = Service(driver_path)
 
-    # 初始化浏览器
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # 初始化浏览器 - 需要手动打开搜索页，不使用无头模式；精简模式不加载图片等资源
+    driver = make_chrome(headless=False, driver_path=driver_path)
     
     try:
         # 第一步：等待用户手动打开目标网页
@@ -102,13 +181,23 @@ def main():
         
         print(f"\n找到 {len(detail_urls)} 个图片页面")
         print("即将开始下载图片...")
+        metrics.add_total(len(detail_urls))
+        metrics.start_progress()
         
         # 第二步：下载图片
-        download_images(driver, detail_urls)
+        if RESOLVE_MODE == "api":
+            download_images_with_api(detail_urls)
+        elif RESOLVE_MODE == "derive":
+            download_images_with_derive(detail_urls)
+        else:
+            download_images(driver, detail_urls)
             
     finally:
         # 关闭浏览器
         driver.quit()
+        metrics.stop_progress()
+        print(metrics.summary())
+        metrics.write_report(METRICS_REPORT)
         print("\n爬虫运行结束")
 
 if __name__ == "__main__":
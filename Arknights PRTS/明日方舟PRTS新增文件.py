@@ -0,0 +1,157 @@
+import os
+import re
+import sys
+import time
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.blob_store import BlobStore
+from crawler_common.download import AssetIndex, download_file
+from crawler_common.journal import CrawlJournal, DOWNLOADED, FAILED, SKIPPED
+from crawler_common.mediawiki import (api_timestamp, file_name, first_available, iter_uploads, resolve_file_titles,
+                                       saved_name, sized_name, sized_urls)
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import request_with_limit
+
+# 增量发现：读取MediaWiki上传日志中上次运行之后上传或更新的文件，只下载这些文件，
+# 不再遍历干员列表或剧情资源概览，也不会漏掉已经从首页"新增时装"中轮换下去的时装
+# 上次运行的位置（游标）保存在爬取记录中，全部下载成功后才前移；第一次运行时从 FIRST_RUN_DAYS 天前开始
+
+# 配置
+API_URL = "https://prts.wiki/api.php"
+OUTPUT_DIR = "PRTS新增文件"  # 输出目录，按 FILE_PATTERNS 分到子目录
+JOURNAL_PATH = f"{OUTPUT_DIR}.journal.db"  # 爬取记录和游标
+METRICS_REPORT = f"{OUTPUT_DIR}.metrics.json"  # 运行报告（各阶段耗时、字节数、错误），.prom后缀则为Prometheus格式
+CURSOR_KEY = "uploads_cursor"
+FIRST_RUN_DAYS = 30  # 没有游标时读取最近多少天的上传
+CURSOR_OVERLAP = 600  # 游标比本次开始时间提前的秒数，容忍本机与服务器的时钟误差（重复读到的文件按记录跳过）
+GONE_STATUS = (404, 410)  # 原图地址返回这些状态码时视为文件已被删除，记为skipped，不阻止游标前移
+# 要下载的文件：{子目录: 文件名正则}，按顺序匹配，不匹配任何一项的文件跳过；{"": ""} 为下载所有新文件
+FILE_PATTERNS = {
+    "立绘": r"^立绘_",  # 干员立绘和时装
+    "NPC立绘": r"^Avg_(avg_)?npc_",
+}
+# 分辨率策略：max_width为图片的最大宽度（None为原图），webp为True时优先请求WebP缩略图（见NPC立绘脚本）
+RESOLUTION = {"max_width": None, "webp": False}
+INCREMENTAL = True  # 增量模式：记录ETag/Last-Modified，未变化的图片不再重新下载
+asset_index = AssetIndex(f"{OUTPUT_DIR}.assets.db") if INCREMENTAL else None
+DEDUPLICATE = True  # 相同内容只保存一份，输出目录中的文件为指向内容仓库的硬链接
+blob_store = BlobStore(".blobs") if DEDUPLICATE else None
+
+def classify(name):
+    """文件名对应的子目录，不需要下载时返回None"""
+    for folder, pattern in FILE_PATTERNS.items():
+        if re.search(pattern, name):
+            return folder
+    return None
+
+def discover_uploads(session, journal, since):
+    """
+    读取since之后的上传日志，返回需要下载的 {文件标题: 记录键}
+    记录键为 标题@上传时间：同一文件上传了新版本时是新的条目，会重新下载；已下载过的版本跳过
+    """
+    files = {}
+    found = 0
+    for event in iter_uploads(session, API_URL, since):
+        found += 1
+        if classify(file_name(event["title"])) is None:
+            continue
+        key = f"{event['title']}@{event['timestamp']}"
+        journal.discover(key, event)
+        # 同一文件在这段时间内上传了多次时只下载最新的版本
+        files[event["title"]] = key
+    pending = {title: key for title, key in files.items()
+               if not journal.is_done(key) and journal.get(key)[0] != SKIPPED}
+    print(f"上传日志中有 {found} 条记录，需要下载 {len(pending)} 个文件")
+    return pending
+
+def save_image(session, image_urls, title, folder, expected_sha1=None, mime=None):
+    """按分辨率策略依次尝试image_urls（最后一个为原图），保存为 folder/文件名（见saved_name），返回是否成功"""
+    def download(image_url):
+        file_path = os.path.join(folder, re.sub(r'[\\/*?:"<>|]', "", saved_name(title, image_url, mime)))
+        # 缩略图与原图内容不同，不按原图哈希查找
+        sha1 = expected_sha1 if image_url == image_urls[-1] else None
+        if download_file(session, image_url, file_path, index=asset_index, store=blob_store, expected_sha1=sha1):
+            print(f"已保存: {file_path}")
+            return True
+        return False
+
+    return first_available(download, image_urls) is not None
+
+def is_gone(session, url):
+    """文件是否已从服务器上删除；请求本身失败时按暂时性错误处理"""
+    try:
+        response = request_with_limit(session, url, method="HEAD", retries=0, timeout=30)
+    except Exception:
+        return False
+    return response.status_code in GONE_STATUS
+
+def crawl_new_files(session, journal, since=None, resolution=None):
+    """
+    下载since（api_timestamp格式，默认为上次运行的游标）之后上传或更新的文件，返回本次运行的统计
+    没有暂时性失败时把游标前移到本次开始的时间，否则保留游标，下次运行重新读取这段日志（已完成的文件跳过）；
+    已被删除的文件（API中查不到或原图地址返回GONE_STATUS）记为skipped，不会让游标停在原地
+    """
+    resolution = resolution or RESOLUTION
+    started = time.time()
+    since = since or journal.get_meta(CURSOR_KEY) or api_timestamp(started - FIRST_RUN_DAYS * 86400)
+    print(f"正在读取 {since} 之后的上传日志...")
+    pending = discover_uploads(session, journal, since)
+    metrics.add_total(len(pending))
+
+    resolved = resolve_file_titles(session, API_URL, list(pending), max_width=resolution["max_width"])
+    output_dir = sized_name(OUTPUT_DIR, resolution["max_width"])
+    failed = skipped = 0
+    for title, key in pending.items():
+        info = resolved.get(title)
+        name = file_name(title)
+        error = None
+        try:
+            if not info:
+                # API中查不到：上传之后又被删除或改名，重试也不会成功
+                state, error = SKIPPED, "missing"
+            else:
+                print(f"\n正在处理: {title}")
+                folder = os.path.join(output_dir, classify(name))
+                os.makedirs(folder, exist_ok=True)
+                image_urls = sized_urls(info["url"], width=info["width"], thumb=info["thumb_url"], **resolution)
+                if save_image(session, image_urls, title, folder, info["sha1"], info["mime"]):
+                    state = DOWNLOADED
+                elif is_gone(session, info["url"]):
+                    state, error = SKIPPED, "gone"
+                else:
+                    state = FAILED
+        except Exception as e:
+            print(f"处理 {title} 时出错: {str(e)}")
+            state, error = FAILED, str(e)
+        if state == SKIPPED:
+            print(f"文件已不存在，跳过: {title}")
+        journal.mark(key, state, error=error)
+        failed += state == FAILED
+        skipped += state == SKIPPED
+        metrics.complete()
+
+    # 只有暂时性的失败才保留游标，已被删除的文件不影响
+    if not failed:
+        journal.set_meta(CURSOR_KEY, api_timestamp(started - CURSOR_OVERLAP))
+    else:
+        print(f"{failed} 个文件下载失败，游标保持在 {since}，下次运行时重试")
+    return {"since": since, "files": len(pending), "failed": failed, "skipped": skipped}
+
+def main():
+    session = requests.Session()
+    journal = CrawlJournal(sized_name(JOURNAL_PATH, RESOLUTION["max_width"]))
+    metrics.start_progress()
+    try:
+        result = crawl_new_files(session, journal)
+        print(f"\n本次下载 {result['files'] - result['failed'] - result['skipped']} 个文件，"
+              f"失败 {result['failed']} 个，已删除 {result['skipped']} 个")
+        print(f"爬取记录: {journal.counts()}")
+    finally:
+        journal.close()
+        metrics.stop_progress()
+        print(metrics.summary())
+        metrics.write_report(METRICS_REPORT)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,34 @@
 import os
-import time
-from selenium import webdriver
+import sys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import requests
 import re
+from urllib.parse import urljoin
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.blob_store import BlobStore
+from crawler_common.browser import block_resources, make_chrome
+from crawler_common.download import AssetIndex, download_file
+from crawler_common.html_parser import only_tags, parse_html
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import navigate, request_with_limit
 
 # 配置
-WAIT_TIME = 3  # 每次请求间隔3秒
 OUTPUT_DIR = "新增时装"  # 输出目录
 BASE_URL = "https://prts.wiki"
+# "http": 直接请求详情页HTML解析立绘，静态HTML中找不到时才用浏览器；"browser": 全部用浏览器
+DETAIL_MODE = "http"
+METRICS_REPORT = f"{OUTPUT_DIR}.metrics.json"  # 运行报告（各阶段耗时、字节数、错误），.prom后缀则为Prometheus格式
+INCREMENTAL = True  # 增量模式：记录ETag/Last-Modified，未变化的图片不再重新下载
+session = requests.Session()
+asset_index = AssetIndex(f"{OUTPUT_DIR}.assets.db") if INCREMENTAL else None
+DEDUPLICATE = True  # 相同内容只保存一份，输出目录中的文件为指向内容仓库的硬链接
+blob_store = BlobStore(".blobs") if DEDUPLICATE else None
+
+# 详情页中只解析立绘区域
+CHARIMG = only_tags("div", id="charimg-wrapper")
 
 # 创建输出目录
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -20,14 +38,10 @@ def sanitize_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', "", filename)
 
 def download_image(url, filepath):
-    """下载图片并保存"""
+    """下载图片并保存，返回是否成功"""
     if not url.startswith("http"):
         url = "https:" + url
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
+    return download_file(session, url, filepath, index=asset_index, store=blob_store)
 
 def collect_specific_operators(driver):
     """收集'新增时装'部分的干员信息"""
@@ -61,53 +75,77 @@ def collect_specific_operators(driver):
     
     return operator_list
 
+def fetch_last_image(operator_url):
+    """直接请求详情页HTML，返回 #charimg-wrapper 中最后一张立绘的 (id, src)；找不到时返回None"""
+    response = request_with_limit(session, operator_url, timeout=30)
+    response.raise_for_status()
+    wrapper = parse_html(response.text, CHARIMG).find("div", id="charimg-wrapper")
+    imgs = wrapper.find_all("img") if wrapper else []
+    if not imgs:
+        return None
+    img_src = imgs[-1].get("src") or imgs[-1].get("data-src")
+    return imgs[-1].get("id"), urljoin(operator_url, img_src) if img_src else None
+
+def save_skin(operator_info, img_id, img_src):
+    """按干员信息命名并下载立绘"""
+    if img_src and img_id:
+        # 清理干员名中的非法字符
+        safe_chinese = sanitize_filename(operator_info["chinese_name"].strip())
+        safe_english = sanitize_filename(operator_info["english_name"].strip())
+        
+        # 构建文件名
+        filename = f"{operator_info['operator_id']}_{safe_chinese}_{safe_english}_{img_id}.png"
+        filepath = os.path.join(OUTPUT_DIR, filename)
+        
+        print(f"正在下载: {filename}")
+        download_image(img_src, filepath)
+
 def process_operator(driver, operator_info):
     """处理单个干员，下载所有立绘"""
     chinese_name = operator_info["chinese_name"]
-    english_name = operator_info["english_name"]
     operator_id = operator_info["operator_id"]
     operator_url = operator_info["operator_url"]
     
     print(f"\n处理干员: {chinese_name} ({operator_id})")
     
+    if DETAIL_MODE == "http":
+        try:
+            found = fetch_last_image(operator_url)
+            if found and found[1]:
+                save_skin(operator_info, *found)
+                return
+        except Exception as e:
+            print(f"直接请求详情页失败，改用浏览器: {str(e)}")
+    
+    main_window = driver.current_window_handle
     try:
-        # 使用新标签页访问详情页
-        driver.execute_script(f"window.open('{operator_url}');")
-        driver.switch_to.window(driver.window_handles[1])
+        # 使用新标签页访问详情页：先打开空白标签页，请求屏蔽（只对当前标签页生效）设置好之后再导航，
+        # 详情页的图片、字体等资源一开始就不会加载；经过限速器导航，响应时间和错误计入限速反馈
+        driver.switch_to.new_window("tab")
+        block_resources(driver)
+        navigate(driver, operator_url)
         
         # 等待立绘区域加载
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "charimg-wrapper")))
+        with metrics.timer("wait"):
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "charimg-wrapper")))
         
         # 查找所有立绘img标签
         img_elements = driver.find_elements(By.CSS_SELECTOR, "#charimg-wrapper img")
         
         img = img_elements[-1]
-        img_id = img.get_attribute("id")
-        img_src = img.get_attribute("src")
-        
-        if img_src and img_id:
-            # 清理干员名中的非法字符
-            safe_chinese = sanitize_filename(chinese_name.strip())
-            safe_english = sanitize_filename(english_name.strip())
-            
-            # 构建文件名
-            filename = f"{operator_id}_{safe_chinese}_{safe_english}_{img_id}.png"
-            filepath = os.path.join(OUTPUT_DIR, filename)
-            
-            print(f"正在下载: {filename}")
-            download_image(img_src, filepath)
-            time.sleep(WAIT_TIME)
+        save_skin(operator_info, img.get_attribute("id"), img.get_attribute("src"))
                 
     except Exception as e:
         print(f"处理干员 {chinese_name} 时出错: {str(e)}")
     finally:
         # 关闭详情页标签页并切换回主标签页
-        if len(driver.window_handles) > 1:
+        if driver.current_window_handle != main_window:
             driver.close()
-            driver.switch_to.window(driver.window_handles[0])
+            driver.switch_to.window(main_window)
 
 def main():
-    driver = webdriver.Chrome()
+    # 需要手动导航，使用可见窗口；仍然不加载图片等资源
+    driver = make_chrome(headless=False)
     driver.maximize_window()
     
     try:
@@ -121,8 +159,11 @@ def main():
         
         # 第二步：逐个处理干员
         print("\n开始下载立绘...")
+        metrics.add_total(len(operator_list))
+        metrics.start_progress()
         for operator_info in operator_list:
             process_operator(driver, operator_info)
+            metrics.complete()
             
         print("\n所有干员处理完成!")
         
@@ -130,6 +171,9 @@ def main():
         print(f"程序出错: {str(e)}")
     finally:
         driver.quit()
+        metrics.stop_progress()
+        print(metrics.summary())
+        metrics.write_report(METRICS_REPORT)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,63 +1,126 @@
 import os
 import re
-import time
+import json
+import sys
 import random
+import threading
+import time
 import requests
-from bs4 import BeautifulSoup
+from functools import partial
 from urllib.parse import urljoin
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_common.async_download import AsyncDownloader
+from crawler_common.blob_store import BlobStore
+from crawler_common.download import AssetIndex, download_file
+from crawler_common.html_parser import iter_table_rows, only_tags, parse_html
+from crawler_common.http_archive import ResponseArchive, REPLAY
+from crawler_common.journal import CrawlJournal, DISCOVERED, DOWNLOADED, FAILED
+from crawler_common.mediawiki import (api_timestamp, best_image_url, cargo_query, file_usage, first_available,
+                                       iter_recent_changes, iter_uploads, name_for_url, parse_api_timestamp, sized_name,
+                                       sized_urls, title_from_url)
+from crawler_common.metrics import metrics
+from crawler_common.postprocess import PostProcessor
+from crawler_common.proxy_pool import use_proxies
+from crawler_common.work_queue import open_queue, per_item, run_worker
+
 # 基础配置
 BASE_URL = "https://azurlane.koumakan.jp"
 SHIP_LIST_URL = f"{BASE_URL}/wiki/List_of_Ships"
+API_URL = f"{BASE_URL}/w/api.php"
 IMAGE_BASE = "https://azurlane.netojuu.com/images"
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0"
 ]
+DOWNLOAD_CONCURRENCY = 16  # 同时进行的下载数
+PER_HOST_CONCURRENCY = 8  # 单个主机（图片CDN）的并发上限
+JOURNAL_PATH = "碧蓝航线舰船.journal.db"  # 爬取记录，中断后重新运行会从上次停止处继续
+INCREMENTAL = True  # 增量模式：记录ETag/Last-Modified，未变化的图片不再重新下载
+DEDUPLICATE = True  # 立绘和插画中相同的图片只保存一份，两个目录中的文件为指向内容仓库的硬链接
+# 分辨率策略：max_width为图片的最大宽度（None为原图），更宽的图片向Wiki请求该宽度的缩略图，不下载原图；
+# webp为True时优先请求服务器转换的WebP缩略图（服务器不提供时退回原格式）
+# 限制宽度时输出到单独的目录（如 立绘_1024px）并使用单独的爬取记录
+RESOLUTION = {"max_width": None, "webp": False}
+# 页面存档："cache" 存档未过期时不再请求；"refresh" 总是重新请求并更新存档；
+# "replay" 只用存档离线运行，只生成下载计划不下载；"off" 不使用存档
+ARCHIVE_MODE = "cache"
+ARCHIVE_DIR = "碧蓝航线页面存档"
+ARCHIVE_TTL = 7 * 24 * 3600  # 存档有效期（秒）
+PLAN_PATH = "碧蓝航线下载计划.json"  # replay模式下输出的下载计划
+# 分布式爬取：多个进程（可在不同机器上）共享一个任务队列，各自领取舰船处理，不需要手动切分列表
+# 设为队列的SQLite路径（如 "碧蓝航线舰船.queue.db"，同一台机器）或 "http://主机:8790"
+# （在一台机器上运行 python -m crawler_common.work_queue 碧蓝航线舰船.queue.db）；None为单进程
+WORK_QUEUE = None
+# 元数据预取："cargo" 先用Cargo API批量查询所有舰船的中文名（每500艘一次请求），不再逐个请求角色页面，
+# 查询失败或查不到的舰船仍会请求角色页面；"page" 为逐个请求角色页面
+METADATA_MODE = "cargo"
+SHIP_CARGO_TABLE = "ships"
+SHIP_CARGO_FIELDS = "Name,CNName,ShipID,Nationality"
+WORKER_THREADS = 4  # 分布式模式下每个进程同时处理的舰船数
+# 增量发现："recent" 只处理上次运行之后Gallery/角色页面被编辑过、或用到了新上传文件的舰船
+# （读取最近更改和上传日志，每天运行只需几个API请求加上有变化的舰船）；"full" 为处理列表中所有未完成的舰船
+# 第一次运行、或上次运行已超过 RECENT_MAX_DAYS 天（最近更改只保留一段时间）时自动进行完整爬取
+DISCOVERY = "recent"
+CURSOR_KEY = "recent_cursor"
+RECENT_MAX_DAYS = 30
+CURSOR_OVERLAP = 600  # 游标比本次开始时间提前的秒数，容忍本机与服务器的时钟误差
+# 出口代理（如 "http://127.0.0.1:8080"、"socks5://127.0.0.1:1080"，SOCKS需要PySocks）；为空时直接连接
+# 设置后页面请求和图片下载分摊到各代理上，每个代理单独限速，并发上限为 proxy_pool.PER_PROXY_CONCURRENCY，
+# 连续失败、过慢或被封禁的代理自动停用；DOWNLOAD_CONCURRENCY 可相应调高到代理数 × 单代理并发
+PROXIES = []
+METRICS_REPORT = "碧蓝航线舰船.metrics.json"  # 运行报告（各阶段耗时、字节数、错误），.prom后缀则为Prometheus格式
+# 后处理：下载完成后在进程池中无损压缩PNG、记录真实格式和尺寸并生成预览图（需要Pillow）
+POSTPROCESS = False
+
+# 各页面只解析用得到的部分
+SHIP_TABLE_CLASSES = ['wikitable', 'sortable']
+CARD_HEADLINE = only_tags('div', ['card-headline'])
+GALLERY_PARTS = only_tags('div', ['shipskin-image', 'shipgirl-gallery'])
 
 # 创建保存目录
-os.makedirs("立绘", exist_ok=True)
-os.makedirs("插画", exist_ok=True)
+SKIN_DIR = sized_name("立绘", RESOLUTION["max_width"])
+ARTWORK_DIR = sized_name("插画", RESOLUTION["max_width"])
+os.makedirs(SKIN_DIR, exist_ok=True)
+os.makedirs(ARTWORK_DIR, exist_ok=True)
+asset_index = AssetIndex("碧蓝航线舰船.assets.db") if INCREMENTAL else None
+blob_store = BlobStore(".blobs") if DEDUPLICATE else None
+archive = ResponseArchive(ARCHIVE_DIR, ARCHIVE_MODE, ARCHIVE_TTL)
+postprocessor = PostProcessor("碧蓝航线图片.db", index=asset_index, store=blob_store) if POSTPROCESS else None
 
 def clean_filename(filename):
     """清理文件名中的非法字符"""
     return re.sub(r'[\\/*?:"<>|]', "", filename)
 
 def get_original_image_url(img_element):
-    """
-    从img元素中获取原始尺寸图片URL
-    现在更精确地构造原始图片URL
-    """
+    """从img元素的src/srcset中获取原始尺寸图片URL（缩略图地址换算为原图地址）"""
     src = img_element.get('src', '')
     if not src:
         return None
-    
-    # 处理缩略图URL
-    if '/thumb/' in src:
-        try:
-            # 示例: https://azurlane.netojuu.com/images/thumb/b/bd/Universal_BulinEvent.png/531px-Universal_BulinEvent.png
-            # 转换为: https://azurlane.netojuu.com/images/b/bd/Universal_BulinEvent.png
-            match = re.match(r'https?://azurlane\.netojuu\.com/images/thumb/([^/]+)/([^/]+)/([^/]+\.(?:png|jpg|jpeg|gif))', src)
-            if match:
-                hash1, hash2, filename = match.groups()
-                return f"{IMAGE_BASE}/{hash1}/{hash2}/{filename}"
-        except Exception as e:
-            print(f"解析图片URL出错: {e}")
-            return None
-    
-    # 处理普通URL
-    if src.startswith(IMAGE_BASE):
-        return src
-    
-    # 处理相对URL
-    return urljoin(IMAGE_BASE, src) if not src.startswith('http') else src
+    return best_image_url(src, img_element.get('srcset'), IMAGE_BASE)
+
+_thread_local = threading.local()
+
+def get_session():
+    """每个下载线程复用一个带重试策略的会话，保持连接池"""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        retry = requests.adapters.HTTPAdapter(max_retries=3, pool_maxsize=PER_HOST_CONCURRENCY)
+        session.mount('http://', retry)
+        session.mount('https://', retry)
+        _thread_local.session = session
+    return session
 
 def download_image(url, filename, folder):
-    """下载图片并保存"""
+    """
+    下载图片并保存，返回实际保存的路径，失败时返回None
+    url为原图地址，按分辨率策略限制宽度时先尝试缩略图；扩展名随实际下载的地址（见name_for_url，WebP缩略图保存为 .webp）
+    """
     try:
         if not url or not url.startswith('http'):
             print(f"无效的URL: {url}")
-            return False
+            return None
 
         headers = {
             'User-Agent': random.choice(USER_AGENTS),
@@ -65,87 +128,173 @@ def download_image(url, filename, folder):
             'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
         }
 
-        # 创建会话并设置重试策略
-        session = requests.Session()
-        retry = requests.adapters.HTTPAdapter(max_retries=3)
-        session.mount('http://', retry)
-        session.mount('https://', retry)
-
-        # 随机延迟1-3秒
-        time.sleep(2)
+        os.makedirs(folder, exist_ok=True)
 
-        response = session.get(url, headers=headers, stream=True, timeout=10)
-        response.raise_for_status()
+        def image_path(image_url):
+            return os.path.join(folder, clean_filename(name_for_url(filename, image_url)))
 
-        # 验证内容类型
-        if 'image' not in response.headers.get('Content-Type', '').lower():
-            print(f"非图片内容: {url}")
-            return False
+        def download(image_url):
+            # 验证内容类型，增量模式下未变化的图片不会重新写入
+            return download_file(get_session(), image_url, image_path(image_url), index=asset_index,
+                                 store=blob_store, headers=headers, require_image=True)
 
-        os.makedirs(folder, exist_ok=True)
-        filepath = os.path.join(folder, clean_filename(filename))
-        
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        image_url = first_available(download, sized_urls(url, **RESOLUTION))
+        if not image_url:
+            return None
         
         print(f"成功下载: {filename}")
-        return True
+        return image_path(image_url)
         
     except Exception as e:
         print(f"下载失败 {filename} | URL: {url} | 错误: {str(e)}")
-        return False
-    finally:
-        session.close()
+        return None
+
+def download_tracked(journal, url, filename, folder, recheck=False):
+    """
+    下载图片并写入爬取记录，记录中已完成的图片直接跳过
+    recheck为True时（有变化的舰船）不按记录跳过，由条件请求判断图片是否上传了新版本
+    """
+    key = f"{folder}/{filename}"
+    if not recheck and journal.is_done(key):
+        metrics.complete()
+        return True
+    path = download_image(url, filename, folder)
+    journal.mark(key, DOWNLOADED if path else FAILED, {'url': url})
+    metrics.complete()
+    if path and postprocessor:
+        postprocessor.submit(path)
+    return path is not None
+
+class DownloadPlan:
+    """离线重放时代替下载引擎，只记录将要下载的图片"""
+
+    def __init__(self):
+        self.items = []
 
-def get_ship_list():
-    """获取所有舰船列表"""
+    def submit(self, url, filename, folder, recheck=False):
+        self.items.append({'url': url, 'filename': clean_filename(filename), 'folder': folder})
+        return True
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.items, f, ensure_ascii=False, indent=2)
+        print(f"下载计划已保存: {path}（共 {len(self.items)} 张图片）")
+
+def prefetch_ship_metadata(refresh=False):
+    """
+    批量查询所有舰船的编号、中文名和阵营，返回 {页面标题: 元数据}；查询失败时返回空字典
+    refresh为True时不使用存档中的查询结果
+    """
+    print("正在批量查询舰船元数据...")
+    headers = {'User-Agent': random.choice(USER_AGENTS)}
+    metadata = {}
+    try:
+        # 查询结果同样经过页面存档，replay模式下不联网
+        fetch = lambda url: archive.fetch(get_session(), url, refresh=refresh, headers=headers)
+        for row in cargo_query(get_session(), API_URL, SHIP_CARGO_TABLE, SHIP_CARGO_FIELDS, fetch=fetch):
+            name = (row.get('Name') or '').strip()
+            if name:
+                metadata[name.replace('_', ' ')] = {
+                    'number': (row.get('ShipID') or '').strip(),
+                    'cn_name': (row.get('CNName') or '').strip() or None,
+                    'faction': (row.get('Nationality') or '').strip().upper(),
+                }
+    except Exception as e:
+        print(f"批量查询舰船元数据失败，改为逐个请求角色页面: {str(e)}")
+        return {}
+    print(f"已获取 {len(metadata)} 艘舰船的元数据")
+    return metadata
+
+def iter_ship_list(metadata=None, refresh=False, status=None):
+    """
+    边下载边解析舰船列表，每读完表格中的一行就产出一艘舰船，不必等整个页面下载和解析完
+    metadata为 prefetch_ship_metadata() 的结果，查到的中文名直接填入，处理时不再请求角色页面；
+    refresh为True时不使用存档中的列表；传入status字典时，完整读完列表后设置 status['complete'] = True
+    """
     print("正在获取舰船列表...")
+    count = 0
     try:
-        response = requests.get(SHIP_LIST_URL, headers={'User-Agent': random.choice(USER_AGENTS)})
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        ships = []
-        tables = soup.find_all('table', {'class': ['wikitable', 'sortable']})
-        
-        for table in tables:
-            for row in table.find_all('tr')[1:]:  # 跳过表头
-                cells = row.find_all('td')
-                if not cells:
-                    continue
-                    
-                # 获取编号
-                number = cells[0].get('data-sort-value', '').strip()
-                
-                # 获取角色页面链接
-                link = cells[1].find('a')
-                if not link:
-                    continue
-                page_url = urljoin(BASE_URL, link['href'])
-                
-                # 获取阵营
-                faction = cells[-7].find('a')
-                faction_name = faction.text.strip() if faction else "Unknown"
-                
-                ships.append({
-                    'number': number,
-                    'page_url': page_url,
-                    'faction': faction_name.upper(),
-                    'cn_name': None  # 稍后获取
-                })
-        
-        print(f"共找到 {len(ships)} 艘舰船")
-        return ships
-    
+        chunks = archive.stream(get_session(), SHIP_LIST_URL, refresh=refresh,
+                                headers={'User-Agent': random.choice(USER_AGENTS)})
+        for cells in iter_table_rows(chunks, SHIP_TABLE_CLASSES):
+            # 表头行没有td
+            if len(cells) < 7:
+                continue
+
+            # 获取编号
+            number = cells[0]['attrs'].get('data-sort-value', '').strip()
+
+            # 获取角色页面链接
+            link = cells[1]['links'][0] if cells[1]['links'] else None
+            if not link or not link['href']:
+                continue
+            page_url = urljoin(BASE_URL, link['href'])
+
+            # 获取阵营
+            faction = cells[-7]['links'][0] if cells[-7]['links'] else None
+            faction_name = faction['text'].strip() if faction else "Unknown"
+
+            count += 1
+            meta = (metadata or {}).get(title_from_url(page_url), {})
+            yield {
+                'number': number or meta.get('number', ''),
+                'page_url': page_url,
+                'faction': faction_name.upper() if faction else meta.get('faction') or "UNKNOWN",
+                'cn_name': meta.get('cn_name')  # 没有查到时处理舰船时再从角色页面获取
+            }
+
+        if status is not None:
+            status['complete'] = True
     except Exception as e:
         print(f"获取舰船列表失败: {str(e)}")
-        return []
+    print(f"共找到 {count} 艘舰船")
+
+def iter_pending_ships(journal, counter, metadata=None, changed=None):
+    """
+    边读取列表边产出尚未完成的舰船，产出的页面链接记入counter['pending']，完整读完列表时counter['complete']为True
+    changed为有变化的舰船页面标题：只处理这些舰船（已完成的也重新处理），页面和列表都联网获取最新版本
+    """
+    for ship in iter_ship_list(metadata, refresh=changed is not None, status=counter):
+        counter['found'] += 1
+        journal.discover(ship['page_url'], ship)
+        if changed is not None:
+            if title_from_url(ship['page_url']) not in changed:
+                counter['skipped'] += 1
+                continue
+            ship['refresh'] = True
+            journal.mark(ship['page_url'], DISCOVERED)
+        elif journal.is_done(ship['page_url']):
+            counter['skipped'] += 1
+            continue
+        counter['pending'].append(ship['page_url'])
+        yield ship
 
-def process_artwork(soup, ship_info):
-    """处理插画下载"""
+def discover_changed_ships(since):
+    """
+    增量发现：返回since（上次运行的游标）之后有变化的舰船页面标题集合，需要完整爬取时返回None
+    有变化指角色页或其子页面（如Gallery）被新建/编辑，或页面用到的文件上传了新文件或新版本
+    """
+    if not since or time.time() - parse_api_timestamp(since) > RECENT_MAX_DAYS * 86400:
+        print("没有可用的增量游标，进行完整爬取")
+        return None
+    print(f"正在读取 {since} 之后的最近更改和上传日志...")
+    try:
+        changed = {change['title'].split('/')[0] for change in iter_recent_changes(get_session(), API_URL, since)}
+        uploads = [event['title'] for event in iter_uploads(get_session(), API_URL, since)]
+        for pages in file_usage(get_session(), API_URL, uploads).values():
+            changed.update(page.split('/')[0] for page in pages)
+    except Exception as e:
+        print(f"读取最近更改失败，改为完整爬取: {str(e)}")
+        return None
+    print(f"有变化的页面 {len(changed)} 个，新上传的文件 {len(uploads)} 个")
+    return changed
+
+def process_artwork(soup, ship_info, downloader=None):
+    """处理插画下载，传入downloader时放入下载队列而不阻塞"""
+    results = []
     gallery_div = soup.find('div', {'class': 'shipgirl-gallery'})
     if not gallery_div:
-        return
+        return results
 
     print(f"正在处理 {ship_info['number']} 的插画...")
     
@@ -158,11 +307,17 @@ def process_artwork(soup, ship_info):
         # 只使用原文件名
         filename = os.path.basename(original_url)
         
-        download_image(original_url, filename, "插画")
+        if downloader:
+            results.append(downloader.submit(original_url, filename, ARTWORK_DIR, ship_info.get('refresh', False)))
+        else:
+            results.append(download_image(original_url, filename, ARTWORK_DIR))
+
+    return results
 
-def process_skins(soup, ship_info):
+def process_skins(soup, ship_info, downloader=None):
     """处理立绘下载 - 现在确保获取原始尺寸图片"""
     print(f"正在处理 {ship_info['number']} 的立绘...")
+    results = []
     
     for div in soup.find_all('div', {'class': 'shipskin-image'}):
         img = div.find('img', {'class': 'mw-file-element'})
@@ -182,52 +337,125 @@ def process_skins(soup, ship_info):
         # 生成文件名：编号-中文名-阵营-原文件名
         filename = f"{ship_info['number']}-{ship_info['cn_name']}-{ship_info['faction']}-{original_name}"
         
-        download_image(original_url, filename, "立绘")
+        if downloader:
+            results.append(downloader.submit(original_url, filename, SKIN_DIR, ship_info.get('refresh', False)))
+        else:
+            results.append(download_image(original_url, filename, SKIN_DIR))
+
+    return results
 
-def process_ship(ship):
-    """处理单个舰船"""
+def process_ship(ship, downloader=None):
+    """处理单个舰船，返回各图片的下载结果（或Future），出错时返回None"""
     print(f"\n开始处理舰船: {ship['number']} - {ship['page_url']}")
+    # 增量发现标记为有变化的舰船不使用存档中的旧页面
+    refresh = ship.get('refresh', False)
     
     try:
-        # 获取角色页面信息
-        response = requests.get(ship['page_url'], headers={'User-Agent': random.choice(USER_AGENTS)})
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 获取中文名
-        headline = soup.find('div', {'class': 'card-headline'})
-        if headline:
-            cn_span = headline.find('span', {'lang': 'zh'})
-            if cn_span:
-                ship['cn_name'] = cn_span.text.strip()
+        # 批量元数据中没有中文名时，才请求角色页面获取
+        if not ship.get('cn_name'):
+            response = archive.fetch(get_session(), ship['page_url'], refresh=refresh,
+                                     headers={'User-Agent': random.choice(USER_AGENTS)})
+            soup = parse_html(response.text, CARD_HEADLINE)
+            
+            # 获取中文名
+            headline = soup.find('div', {'class': 'card-headline'})
+            if headline:
+                cn_span = headline.find('span', {'lang': 'zh'})
+                if cn_span:
+                    ship['cn_name'] = cn_span.text.strip()
         
         if not ship.get('cn_name'):
             ship['cn_name'] = "未知"
         
         # 跳转到Gallery页面
         gallery_url = f"{ship['page_url']}/Gallery"
-        response = requests.get(gallery_url, headers={'User-Agent': random.choice(USER_AGENTS)})
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = archive.fetch(get_session(), gallery_url, refresh=refresh,
+                                 headers={'User-Agent': random.choice(USER_AGENTS)})
+        soup = parse_html(response.text, GALLERY_PARTS)
         
         # 处理立绘和插画
-        process_skins(soup, ship)
-        process_artwork(soup, ship)
+        return process_skins(soup, ship, downloader) + process_artwork(soup, ship, downloader)
         
     except Exception as e:
         print(f"处理舰船 {ship['number']} 时出错: {str(e)}")
+        return None
+
+def process_ship_task(journal, downloader, key, ship):
+    """分布式模式：处理队列中领取到的一艘舰船，等它的图片全部下载完再汇报结果"""
+    results = process_ship(ship, downloader)
+    metrics.add_total(len(results or []))
+    journal.mark_when_done(ship['page_url'], results)
+    if results is None:
+        return False
+    return all(r.result() if hasattr(r, 'result') else r for r in results)
 
 def main():
     """主函数"""
-    ships = get_ship_list()
-    
-    # 可以选择只处理前几个作为测试
-    # ships = ships[:5]
-    
-    for ship in ships[555:]:
-        process_ship(ship)
-        # 每个舰船处理完后稍作休息
-        time.sleep(random.uniform(2, 5))
+    if ARCHIVE_MODE == REPLAY:
+        # 离线重放：只解析存档中的页面并生成下载计划，不联网，也不写爬取记录
+        metadata = prefetch_ship_metadata() if METADATA_MODE == "cargo" else None
+        plan = DownloadPlan()
+        for ship in iter_ship_list(metadata):
+            process_ship(ship, plan)
+        plan.save(PLAN_PATH)
+        return
+
+    use_proxies(PROXIES)
+    journal = CrawlJournal(sized_name(JOURNAL_PATH, RESOLUTION["max_width"]))
+    counter = {'found': 0, 'skipped': 0, 'pending': [], 'complete': False}
+    started = time.time()
+    since = journal.get_meta(CURSOR_KEY)
+    changed = discover_changed_ships(since) if DISCOVERY == "recent" else None
+    metadata = prefetch_ship_metadata(refresh=changed is not None) if METADATA_MODE == "cargo" else None
     
-    print("\n所有舰船处理完成！")
+    metrics.start_progress()
+    with AsyncDownloader(partial(download_tracked, journal), concurrency=DOWNLOAD_CONCURRENCY,
+                         per_host=PER_HOST_CONCURRENCY) as downloader:
+        if WORK_QUEUE:
+            # 每个进程都登记一遍（已登记的保持原状态），然后从共享队列领取
+            with open_queue(WORK_QUEUE) as queue:
+                if changed is None:
+                    tasks = ((ship['page_url'], ship) for ship in iter_pending_ships(journal, counter, metadata))
+                else:
+                    # 队列中已完成的舰船不会再被领取，有变化的舰船按游标登记为新任务；
+                    # 上次运行中尝试次数用完的任务（游标未前移，这次登记的是同一批）放回队列
+                    queue.retry_failed()
+                    tasks = ((f"{ship['page_url']}@{since}", ship)
+                             for ship in iter_pending_ships(journal, counter, metadata, changed))
+                queue.put(tasks)
+                run_worker(queue, per_item(partial(process_ship_task, journal, downloader)),
+                           threads=WORKER_THREADS)
+                print(f"任务队列: {queue.counts()}")
+        else:
+            # 列表的第一行解析出来就开始处理，不等整个列表
+            for ship in iter_pending_ships(journal, counter, metadata, changed):
+                # 请求节奏由共用的限速器按主机自动调整
+                results = process_ship(ship, downloader)
+                metrics.add_total(len(results or []))
+                journal.mark_when_done(ship['page_url'], results)
+        print(f"已完成 {counter['skipped']} 艘，本次处理 {counter['found'] - counter['skipped']} 艘")
+
+        print("\n等待剩余图片下载完成...")
+
+    print(f"\n所有舰船处理完成！成功 {downloader.succeeded} 张，失败 {downloader.failed} 张")
+    print(f"爬取记录: {journal.counts()}")
+    # 完整读完舰船列表，且本次登记的舰船全部完成（分布式模式下包括由同一台机器上其他进程处理的）时游标前移；
+    # 列表读取失败或有失败的舰船时保留，下次运行重新读取这段时间的更改（没有游标时重新完整爬取）
+    failed = [url for url in counter['pending'] if journal.get(url)[0] != DOWNLOADED]
+    if not counter['complete']:
+        print("舰船列表未完整读取，增量游标保持不变")
+    elif failed:
+        print(f"{len(failed)} 艘舰船未完成，增量游标保持不变")
+    else:
+        journal.set_meta(CURSOR_KEY, api_timestamp(started - CURSOR_OVERLAP))
+    journal.close()
+    metrics.stop_progress()
+    print(metrics.summary())
+    metrics.write_report(METRICS_REPORT)
+    if postprocessor:
+        print("等待图片后处理完成...")
+        postprocessor.close()
+        print(postprocessor.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,166 @@
+# 模拟PRTS和碧蓝航线Wiki页面的测试数据，结构照搬真实页面中爬虫用到的部分
+import hashlib
+import re
+import struct
+import zlib
+from urllib.parse import quote
+
+GALLERY_SKINS = 4  # 每艘舰船Gallery页中的立绘数（record_changes() 新增的立绘排在后面）
+FACTIONS = ["Eagle Union", "Royal Navy", "Sakura Empire", "Iron Blood", "Dragon Empery"]
+
+def operator_name(i):
+    return f"干员{i:03d}", f"Operator{i:03d}", f"R{i:03d}"
+
+def file_title(kind, i):
+    return f"{kind}_{i:04d}.png"
+
+def image_path(name):
+    """MediaWiki风格的原图路径 /images/x/xy/Name"""
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+    return f"/images/{digest[0]}/{digest[:2]}/{quote(name)}"
+
+def thumb_path(name, width):
+    """MediaWiki风格的缩略图路径 /images/thumb/x/xy/Name/<宽>px-Name"""
+    return f"{image_path(name).replace('/images/', '/images/thumb/', 1)}/{width}px-{quote(name)}"
+
+def noise(blocks):
+    """页面中爬虫不关心的导航、侧栏等内容"""
+    items = "".join(f'<li><a href="/w/Nav_{j}" title="Nav {j}">导航 {j}</a></li>' for j in range(20))
+    return "".join(f'<div class="mw-portlet"><ul>{items}</ul></div>' for _ in range(blocks))
+
+def page(title, body, scripts=True):
+    script = '<script>RLCONF={"wgAction":"view"};</script>' if scripts else ""
+    return (f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>{title}</title>{script}</head>'
+            f'<body><div id="content"><h1 id="firstHeading">{title}</h1>'
+            f'<div id="mw-content-text">{body}</div></div>{noise(30)}</body></html>')
+
+# ---- PRTS ----
+
+def prts_operator_list(count):
+    """干员一览：div.long-container 列表"""
+    cards = []
+    for i in range(count):
+        cn, en, op_id = operator_name(i)
+        cards.append(
+            f'<div class="long-container"><div class="avatar"><img src="/images/avatar_{i}.png"></div>'
+            f'<div class="name"><div><a href="/w/{quote(cn)}"><div>{cn}</div></a>'
+            f'<div>{en}</div><div>オペレーター</div><div>{op_id}</div></div></div></div>'
+        )
+    return page("干员一览", f'<div id="filter-result">{"".join(cards)}</div>')
+
+def prts_operator_detail(base, i, images=3):
+    """干员详情页：#charimg-wrapper 中的立绘"""
+    cn, _, _ = operator_name(i)
+    imgs = "".join(
+        f'<img id="立绘_{cn}_{k}" src="{base}{image_path(f"立绘_{cn}_{k}.png")}" style="display:none">'
+        for k in range(images)
+    )
+    return page(cn, f'<div class="charimg-container"><div id="charimg-wrapper">{imgs}</div></div>{noise(20)}')
+
+def prts_homepage(count):
+    """首页：mp-operators 中的 新增时装"""
+    links = "".join(
+        f'<a href="/w/{quote(operator_name(i)[0])}" title="{operator_name(i)[0]}"><img src="/images/head_{i}.png"></a>'
+        for i in range(count)
+    )
+    body = (f'<div class="mp-operators"><div class="mp-operators-title">近期新增</div><div></div>'
+            f'<div class="mp-operators-title">新增时装</div><div class="mp-operators-list">{links}</div></div>')
+    return page("首页", body)
+
+def prts_file_links(kind, count):
+    return [f"/w/{quote('文件:' + file_title(kind, i))}" for i in range(count)]
+
+def prts_npc_overview(count):
+    """剧情资源概览：a.image 链接到文件页"""
+    links = "".join(
+        f'<a href="{href}" class="image"><img src="/images/thumb_{i}.png" width="120"></a>'
+        for i, href in enumerate(prts_file_links("Avg_avg_npc", count))
+    )
+    return page("剧情资源概览", f'<div class="resource-overview">{links}</div>')
+
+def prts_search_results(count):
+    """搜索结果页：table.searchResultImage"""
+    rows = "".join(
+        f'<table class="searchResultImage"><tr><td><a href="{href}" class="image">'
+        f'<img src="/images/thumb_s{i}.png" width="120"></a></td><td>宣传图 {i}</td></tr></table>'
+        for i, href in enumerate(prts_file_links("Search", count))
+    )
+    return page("搜索结果", f'<ul class="mw-search-results">{rows}</ul>')
+
+def prts_file_page(base, name):
+    """文件页：div.fullImageLink"""
+    url = f"{base}{image_path(name)}"
+    body = (f'<div class="fullImageLink" id="file"><a href="{url}">'
+            f'<img alt="文件:{name}" src="{url}" srcset="{url}?w=1.5 1.5x, {url} 2x" width="800"></a></div>')
+    return page(f"文件:{name}", body)
+
+# ---- 碧蓝航线 ----
+
+def ship_row(i):
+    faction = FACTIONS[i % len(FACTIONS)]
+    cells = [f'<td data-sort-value="{i:03d}"><a href="/wiki/Ship_{i}">{i:03d}</a></td>',
+             f'<td><a href="/wiki/Ship_{i}" title="Ship {i}">Ship {i}</a></td>',
+             '<td>Super Rare</td>', '<td>Destroyer</td>',
+             f'<td><a href="/wiki/{quote(faction)}" title="{faction}">{faction}</a></td>']
+    cells += [f'<td>{k * 10 + i % 7}</td>' for k in range(6)]
+    return f'<tr>{"".join(cells)}</tr>'
+
+def azurlane_ship_list(count, tables=3):
+    """List_of_Ships：多个 wikitable sortable 表格"""
+    parts = []
+    for t in range(tables):
+        rows = "".join(ship_row(i) for i in range(t, count, tables))
+        header = "<tr><th>ID</th><th>Name</th><th>Rarity</th><th>Type</th><th>Affiliation</th>" \
+                 + "".join(f"<th>Stat{k}</th>" for k in range(6)) + "</tr>"
+        parts.append(f'<table class="wikitable sortable jquery-tablesorter">{header}{rows}</table>')
+    return page("List of Ships", "".join(parts))
+
+def azurlane_ship_page(i):
+    """角色页：div.card-headline 中的中文名"""
+    body = (f'<div class="ship-card"><div class="card-headline"><span lang="en">Ship {i}</span>'
+            f'<span lang="zh">舰船{i}</span><span lang="ja">艦船{i}</span></div></div>{noise(20)}')
+    return page(f"Ship {i}", body)
+
+def azurlane_cargo_ships(count):
+    """Cargo的ships表（cargoquery返回的行）"""
+    return [{"Name": f"Ship {i}", "CNName": f"舰船{i}", "ShipID": f"{i:03d}",
+             "Nationality": FACTIONS[i % len(FACTIONS)]} for i in range(count)]
+
+def azurlane_gallery(base, i, extra_skins=0, artworks=6):
+    """Gallery页：shipskin-image 立绘和 shipgirl-gallery 插画，extra_skins为之后新增的立绘数"""
+    skins = GALLERY_SKINS + extra_skins
+    skin_html = "".join(
+        f'<div class="shipskin"><div class="shipskin-image"><img class="mw-file-element" '
+        f'src="{base}{image_path(f"Ship_{i}_Skin{k}.png")}" width="531"></div></div>'
+        for k in range(skins)
+    )
+    art_html = "".join(
+        f'<div class="gallerybox"><img class="mw-file-element" '
+        f'src="{base}{image_path(f"Ship_{i}_Art{k}.png")}" width="300"></div>'
+        for k in range(artworks)
+    )
+    return page(f"Ship {i}/Gallery", f'{skin_html}<div class="shipgirl-gallery">{art_html}</div>')
+
+def azurlane_file_usage(title):
+    """prop=fileusage：舰船立绘和插画只在该舰船的Gallery页中使用"""
+    match = re.match(r"File:Ship[ _](\d+)[ _]", title)
+    return [{"ns": 0, "title": f"Ship {match.group(1)}/Gallery"}] if match else []
+
+# ---- 图片 ----
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def image_payload(path, size):
+    """
+    为每个路径生成内容不同、大小约为size字节的合法PNG
+    （像素数据不压缩，文件大小与size接近）
+    """
+    seed = hashlib.sha1(path.encode("utf-8")).digest()
+    width = 256
+    row = 1 + width * 3
+    height = max(1, size // row)
+    raw = b"".join(b"\x00" + (seed * (row // len(seed) + 1))[:row - 1] for _ in range(height))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", ihdr)
+            + png_chunk(b"IDAT", zlib.compress(raw, 0)) + png_chunk(b"IEND", b""))
@@ -0,0 +1,127 @@
+# 本地模拟HTTP正向代理，用于测试出口代理池；可注入延迟、连接失败和封禁
+import http.client
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "proxy-authorization", "te", "trailers",
+               "transfer-encoding", "upgrade"}
+
+class MockProxy:
+    """
+    模拟正向代理（只支持http目标，不支持CONNECT）
+    转发时添加 X-Forwarded-For: 代理名，模拟服务器据此区分出口；
+    latency为每个请求额外的延迟（秒），fail_rate为直接断开连接的概率，banned为True时所有请求返回403
+    """
+
+    def __init__(self, name=None, latency=0.0, fail_rate=0.0, banned=False, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.banned = banned
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        proxy = self
+
+        class Handler(ProxyHandler):
+            pass
+
+        Handler.proxy = proxy
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_port}"
+        self.name = name or f"proxy-{self.server.server_port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    proxy = None
+    # 响应头和较小的正文分两次写入，不关闭Nagle算法时每个响应会多等一次延迟确认（约40ms）
+    disable_nagle_algorithm = True
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.forward()
+
+    def do_GET(self):
+        self.forward()
+
+    def forward(self):
+        proxy = self.proxy
+        with proxy._lock:
+            proxy.requests += 1
+        if proxy.latency:
+            time.sleep(proxy.latency)
+        if proxy.fail_rate and random.random() < proxy.fail_rate:
+            self.close_connection = True
+            self.connection.close()
+            return
+        if proxy.banned:
+            body = b"forbidden"
+            self.send_response(403)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+            return
+
+        target = urlsplit(self.path)
+        if target.scheme != "http":
+            self.send_error(501, "只支持http目标")
+            return
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+        headers["X-Forwarded-For"] = proxy.name
+        path = target.path + (f"?{target.query}" if target.query else "")
+        connection = http.client.HTTPConnection(target.netloc, timeout=30)
+        try:
+            connection.request(self.command, path, headers=headers)
+            response = connection.getresponse()
+            self.send_response(response.status)
+            for key, value in response.getheaders():
+                if key.lower() not in HOP_HEADERS:
+                    self.send_header(key, value)
+            self.end_headers()
+            while True:
+                chunk = response.read(64 * 1024)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+        except OSError:
+            self.close_connection = True
+        finally:
+            connection.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="启动本地模拟代理")
+    parser.add_argument("--count", type=int, default=2, help="代理数量")
+    parser.add_argument("--port", type=int, default=8770, help="第一个代理的端口，其余依次加一")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    proxies = [MockProxy(latency=args.latency, fail_rate=args.fail_rate, port=args.port + i)
+               for i in range(args.count)]
+    for proxy in proxies:
+        print(f"模拟代理已启动: {proxy.start()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for proxy in proxies:
+            proxy.stop()
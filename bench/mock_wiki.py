@@ -0,0 +1,360 @@
+# 本地模拟Wiki服务器，同时提供PRTS和碧蓝航线两套页面，可注入延迟和错误
+import hashlib
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import fixtures
+
+ORIGINAL_WIDTH = 2048  # 模拟原图的宽度，缩略图大小按宽度的平方缩小
+HISTORY = 86400  # 上传日志和最近更改覆盖的时长（秒），截止到服务器启动时
+
+class MockWiki:
+    """
+    模拟Wiki服务器
+    latency/jitter为每个请求额外的延迟（秒），error_rate为返回429/503的概率，
+    client_rate为每个客户端（按X-Forwarded-For或来源地址区分）每秒允许的请求数，超出时返回429，模拟单IP限制
+    webp为False时不提供WebP缩略图（请求 .webp 缩略图返回404）
+    上传日志和最近更改：启动前HISTORY秒内依次上传了每个NPC文件，每艘舰船的Gallery被编辑（偶数号）或上传了新立绘（奇数号）；
+    record_changes() 模拟启动之后的更改，页面和图片内容随之变化
+    """
+
+    def __init__(self, operators=30, ships=30, files=60, image_size=200 * 1024,
+                 latency=0.0, jitter=0.0, error_rate=0.0, client_rate=None, webp=True, host="127.0.0.1", port=0):
+        self.operators = operators
+        self.ships = ships
+        self.files = files
+        self.image_size = image_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.client_rate = client_rate
+        self.webp = webp
+        self.epoch = time.time() - HISTORY
+        self.gallery_extra = {}  # 舰船编号: Gallery页中新增的立绘数
+        self.revisions = {}  # 图片路径: 重新上传的次数（内容和ETag随之变化）
+        self.uploads = []  # record_changes() 记录的上传 (时间, 标题, action)
+        self.edits = []  # record_changes() 记录的编辑 (时间, 标题)
+        self._windows = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        wiki = self
+
+        class Handler(MockHandler):
+            pass
+
+        Handler.wiki = wiki
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://{host}:{self.server.server_port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"pages": 0, "page_bytes": 0, "api": 0, "images": 0, "image_bytes": 0, "thumbs": 0,
+                          "not_modified": 0, "errors": 0, "client_limited": 0}
+            self.clients = {}
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def admit(self, client):
+        """记录客户端的请求，超出client_rate时返回False（每秒一个窗口）"""
+        with self._lock:
+            self.clients[client] = self.clients.get(client, 0) + 1
+            if not self.client_rate:
+                return True
+            second = int(time.monotonic())
+            window, count = self._windows.get(client, (second, 0))
+            if window != second:
+                window, count = second, 0
+            self._windows[client] = (window, count + 1)
+            return count < self.client_rate
+
+    def image(self, path, width=ORIGINAL_WIDTH):
+        return self._payload(path, width, self.revisions.get(path, 0))
+
+    @lru_cache(maxsize=256)
+    def _payload(self, path, width, revision):
+        size = self.image_size * width * width // (ORIGINAL_WIDTH * ORIGINAL_WIDTH)
+        return fixtures.image_payload(f"{path}#{revision}" if revision else path, max(size, 1024))
+
+    def etag(self, path):
+        revision = self.revisions.get(path, 0)
+        return '"%s"' % hashlib.sha1(f"{path}#{revision}".encode("utf-8")).hexdigest()[:16]
+
+    def record_changes(self, ships):
+        """模拟之后的更改：偶数号舰船的Gallery页新增一张立绘，奇数号舰船的Skin0上传了新版本（文件名不变）"""
+        now = time.time()
+        with self._lock:
+            for i in ships:
+                if i % 2 == 0:
+                    extra = self.gallery_extra.get(i, 0)
+                    self.gallery_extra[i] = extra + 1
+                    self.uploads.append((now, f"File:Ship_{i}_Skin{fixtures.GALLERY_SKINS + extra}.png", "upload"))
+                    self.edits.append((now, f"Ship {i}/Gallery"))
+                else:
+                    name = f"Ship_{i}_Skin0.png"
+                    path = unquote(fixtures.image_path(name))
+                    self.revisions[path] = self.revisions.get(path, 0) + 1
+                    self.uploads.append((now, f"File:{name}", "overwrite"))
+
+    def image_info(self, title, thumb_width=None):
+        """api.php 中单个文件的 imageinfo，thumb_width对应iiurlwidth"""
+        name = title.split(":", 1)[-1].replace(" ", "_")
+        path = fixtures.image_path(name)
+        payload = self.image(unquote(path))
+        info = {"url": f"{self.base}{path}", "size": len(payload), "width": ORIGINAL_WIDTH,
+                "height": ORIGINAL_WIDTH, "mime": "image/png", "sha1": hashlib.sha1(payload).hexdigest()}
+        if thumb_width:
+            width = min(thumb_width, ORIGINAL_WIDTH)
+            thumb = info["url"] if width == ORIGINAL_WIDTH else f"{self.base}{fixtures.thumb_path(name, width)}"
+            info.update(thumburl=thumb, thumbwidth=width, thumbheight=width)
+        return info
+
+    def event_time(self, i, count):
+        """第i个（共count个）事件的时间，均匀分布在HISTORY内"""
+        return self.epoch + (i + 1) * HISTORY // (count + 1)
+
+    def log_events(self):
+        """按时间排序的上传日志：NPC文件和奇数号舰船的立绘"""
+        events = [(self.event_time(i, self.files), f"文件:{fixtures.file_title('Avg_avg_npc', i)}")
+                  for i in range(self.files)]
+        events += [(self.event_time(i, self.ships), f"File:Ship_{i}_Skin0.png") for i in range(1, self.ships, 2)]
+        events = [(t, title, "upload") for t, title in events] + self.uploads
+        return [{"title": title.replace("_", " "), "timestamp": timestamp(t), "action": action, "type": "upload"}
+                for t, title, action in sorted(events)]
+
+    def recent_changes(self):
+        """按时间排序的最近更改：偶数号舰船的Gallery页"""
+        edits = [(self.event_time(i, self.ships), f"Ship {i}/Gallery") for i in range(0, self.ships, 2)] + self.edits
+        return [{"title": title, "timestamp": timestamp(t), "type": "edit"} for t, title in sorted(edits)]
+
+def timestamp(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+class MockHandler(BaseHTTPRequestHandler):
+    wiki = None
+    # 响应头和较小的正文分两次写入，不关闭Nagle算法时每个响应会多等一次延迟确认（约40ms）
+    disable_nagle_algorithm = True
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_page(self, html):
+        body = html.encode("utf-8")
+        self.wiki.count("pages")
+        self.wiki.count("page_bytes", len(body))
+        self.send_body(body, "text/html; charset=UTF-8")
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        wiki = self.wiki
+        if wiki.latency or wiki.jitter:
+            time.sleep(wiki.latency + random.uniform(0, wiki.jitter))
+        if wiki.error_rate and random.random() < wiki.error_rate:
+            wiki.count("errors")
+            status = random.choice((429, 503))
+            return self.send_body(b"busy", "text/plain", status, {"Retry-After": "1"})
+        if not wiki.admit(self.headers.get("X-Forwarded-For") or self.client_address[0]):
+            wiki.count("client_limited")
+            return self.send_body(b"rate limited", "text/plain", 429, {"Retry-After": "1"})
+
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = parse_qs(parsed.query)
+        try:
+            self.route(path, query)
+        except (KeyError, ValueError):
+            self.send_body(b"not found", "text/plain", 404)
+
+    def route(self, path, query):
+        wiki = self.wiki
+        base = wiki.base
+
+        if path.startswith("/images/thumb/"):
+            return self.send_thumb(path)
+        if path.startswith("/images/"):
+            return self.send_image(path)
+        if path == "/api.php":
+            return self.send_api(query)
+        if path == "/index.php" and "search" in query:
+            return self.send_page(fixtures.prts_search_results(wiki.files))
+
+        # PRTS
+        if path == "/w/干员一览":
+            return self.send_page(fixtures.prts_operator_list(wiki.operators))
+        if path == "/w/首页":
+            return self.send_page(fixtures.prts_homepage(min(wiki.operators, 10)))
+        if path == "/w/剧情资源概览":
+            return self.send_page(fixtures.prts_npc_overview(wiki.files))
+        if path.startswith("/w/特殊:搜索"):
+            return self.send_page(fixtures.prts_search_results(wiki.files))
+        if path.startswith("/w/文件:"):
+            return self.send_page(fixtures.prts_file_page(base, path[len("/w/文件:"):]))
+        if path.startswith("/w/干员"):
+            index = int(path[len("/w/干员"):])
+            if index >= wiki.operators:
+                raise KeyError(path)
+            return self.send_page(fixtures.prts_operator_detail(base, index))
+
+        # 碧蓝航线
+        if path == "/wiki/List_of_Ships":
+            return self.send_page(fixtures.azurlane_ship_list(wiki.ships))
+        if path.startswith("/wiki/Ship_"):
+            name, _, sub = path[len("/wiki/Ship_"):].partition("/")
+            index = int(name)
+            if index >= wiki.ships:
+                raise KeyError(path)
+            if sub == "Gallery":
+                return self.send_page(fixtures.azurlane_gallery(base, index, wiki.gallery_extra.get(index, 0)))
+            return self.send_page(fixtures.azurlane_ship_page(index))
+
+        raise KeyError(path)
+
+    def send_image(self, path):
+        wiki = self.wiki
+        payload = wiki.image(path)
+        etag = wiki.etag(path)
+        if self.headers.get("If-None-Match") == etag:
+            wiki.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        wiki.count("images")
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            start = int(byte_range[len("bytes="):].split("-")[0])
+            if start >= len(payload):
+                return self.send_body(b"", "image/png", 416, {"Content-Range": f"bytes */{len(payload)}"})
+            wiki.count("image_bytes", len(payload) - start)
+            return self.send_body(payload[start:], "image/png", 206, headers={
+                "ETag": etag,
+                "Content-Range": f"bytes {start}-{len(payload) - 1}/{len(payload)}",
+            })
+        wiki.count("image_bytes", len(payload))
+        self.send_body(payload, "image/png", headers={
+            "ETag": etag,
+            "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+            "Accept-Ranges": "bytes",
+        })
+
+    def send_thumb(self, path):
+        """/images/thumb/x/xy/文件名/<宽>px-文件名[.webp]；宽度不小于原图时与MediaWiki一样返回错误"""
+        wiki = self.wiki
+        original, _, thumb = path[len("/images/thumb"):].rpartition("/")
+        webp = thumb.endswith(".webp")
+        width = int(thumb.split("px-", 1)[0])
+        if (webp and not wiki.webp) or width >= ORIGINAL_WIDTH:
+            raise KeyError(path)
+        payload = wiki.image(f"/images{original}", width)
+        if webp:
+            payload = payload[:len(payload) // 2]
+        wiki.count("thumbs")
+        wiki.count("image_bytes", len(payload))
+        self.send_body(payload, "image/webp" if webp else "image/png")
+
+    def send_api(self, query):
+        wiki = self.wiki
+        wiki.count("api")
+        action = query.get("action", [""])[0]
+        if action == "cargoquery":
+            return self.send_cargo(query)
+        if action != "query":
+            raise KeyError(action)
+        if query.get("list", [""])[0] in ("logevents", "recentchanges"):
+            return self.send_list(query)
+
+        titles = query.get("titles", [""])[0].split("|")
+        normalized = []
+        pages = []
+        for title in titles:
+            if not title:
+                continue
+            canonical = title.replace("_", " ")
+            if canonical != title:
+                normalized.append({"from": title, "to": canonical})
+            if query.get("prop", [""])[0] == "fileusage":
+                pages.append({"title": canonical, "fileusage": fixtures.azurlane_file_usage(canonical)})
+                continue
+            thumb_width = int(query.get("iiurlwidth", ["0"])[0]) or None
+            pages.append({"title": canonical, "imageinfo": [wiki.image_info(canonical, thumb_width)]})
+
+        body = json.dumps({"batchcomplete": True,
+                           "query": {"normalized": normalized, "pages": pages}}).encode("utf-8")
+        self.send_body(body, "application/json; charset=utf-8")
+
+    def send_list(self, query):
+        """list=logevents / list=recentchanges：从start开始按时间顺序，每页limit条，用continue翻页"""
+        wiki = self.wiki
+        name = query["list"][0]
+        prefix = "le" if name == "logevents" else "rc"
+        items = wiki.log_events() if name == "logevents" else wiki.recent_changes()
+        start = query.get(f"{prefix}start", [""])[0]
+        items = [item for item in items if item["timestamp"] >= start]
+        offset = int(query.get(f"{prefix}continue", ["0"])[0])
+        limit = int(query.get(f"{prefix}limit", ["50"])[0])
+        body = {"batchcomplete": True, "query": {name: items[offset:offset + limit]}}
+        if offset + limit < len(items):
+            body["continue"] = {f"{prefix}continue": str(offset + limit), "continue": "-||"}
+        self.send_body(json.dumps(body).encode("utf-8"), "application/json; charset=utf-8")
+
+    def send_cargo(self, query):
+        """api.php?action=cargoquery：只支持碧蓝航线的ships表，按limit/offset分页"""
+        if query.get("tables", [""])[0] != "ships":
+            raise KeyError("tables")
+        fields = query.get("fields", [""])[0].split(",")
+        limit = int(query.get("limit", ["50"])[0])
+        offset = int(query.get("offset", ["0"])[0])
+        rows = fixtures.azurlane_cargo_ships(self.wiki.ships)[offset:offset + limit]
+        result = [{"title": {field: row.get(field) for field in fields}} for row in rows]
+        self.send_body(json.dumps({"cargoquery": result}).encode("utf-8"), "application/json; charset=utf-8")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="启动本地模拟Wiki服务器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--client-rate", type=float, default=None)
+    args = parser.parse_args()
+
+    wiki = MockWiki(latency=args.latency, error_rate=args.error_rate, client_rate=args.client_rate, port=args.port)
+    print(f"模拟Wiki已启动: {wiki.base}")
+    wiki.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        wiki.stop()
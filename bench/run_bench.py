@@ -0,0 +1,370 @@
+# 爬虫性能基准：在本地模拟Wiki上运行各脚本的流程，统计吞吐量和资源占用
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import fixtures  # noqa: E402
+from mock_proxy import MockProxy  # noqa: E402
+from mock_wiki import HISTORY, MockWiki, timestamp  # noqa: E402
+
+SCRIPTS = {
+    "azurlane": "Azur Lane Wiki/碧蓝航线WIKI舰船列表.py",
+    "prts_operators": "Arknights PRTS/明日方舟PRTS干员列表.py",
+    "prts_operators_select": "Arknights PRTS/明日方舟PRTS干员列表（可选择）.py",
+    "prts_skins": "Arknights PRTS/明日方舟PRTS新增皮肤（首页）.py",
+    "prts_npc": "Arknights PRTS/明日方舟PRTSNPC立绘.py",
+    "prts_search": "Arknights PRTS/明日方舟PRTS搜索页面图片.py",
+    "prts_new_files": "Arknights PRTS/明日方舟PRTS新增文件.py",
+}
+
+class Skipped(Exception):
+    pass
+
+def load_script(name):
+    """按文件路径加载爬虫脚本（脚本文件名不是合法的模块名）"""
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", os.path.join(ROOT, SCRIPTS[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def start_chrome(args):
+    """需要浏览器的阶段：启动无头Chrome，不可用时跳过"""
+    if args.no_browser:
+        raise Skipped("已指定 --no-browser")
+    from crawler_common.browser import make_chrome
+    try:
+        return make_chrome()
+    except Exception as e:
+        raise Skipped(f"无法启动Chrome: {str(e).splitlines()[0]}")
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    except (ImportError, AttributeError):
+        return None
+
+def apply_resolution(module, args):
+    """--max-width/--webp 覆盖脚本中的分辨率策略"""
+    module.RESOLUTION = {"max_width": args.max_width, "webp": args.webp}
+
+# ---- 各脚本的流程（在子进程中运行） ----
+
+def run_azurlane(base, args, al=None):
+    from crawler_common.mediawiki import sized_name
+
+    al = al or load_script("azurlane")
+    al.BASE_URL = base
+    al.SHIP_LIST_URL = f"{base}/wiki/List_of_Ships"
+    al.API_URL = f"{base}/api.php"
+    al.IMAGE_BASE = f"{base}/images"
+    apply_resolution(al, args)
+    al.SKIN_DIR = sized_name("立绘", args.max_width)
+    al.ARTWORK_DIR = sized_name("插画", args.max_width)
+    al.main()
+
+def run_azurlane_recent(base, args):
+    """增量发现：在完整爬取（SETUP）留下的存档和爬取记录上运行，只处理之后有变化的舰船"""
+    al = load_script("azurlane")
+    al.DISCOVERY = "recent"
+    run_azurlane(base, args, al)
+
+def run_prts_operators(base, args, name="prts_operators"):
+    from crawler_common import rate_limit
+    from crawler_common.journal import CrawlJournal
+    from crawler_common.rate_limit import navigate
+
+    module = load_script(name)
+    module.POOL_SIZE = args.pool_size
+    driver = start_chrome(args)
+    try:
+        # 与脚本的main()相同的流水线，只是不需要手动导航
+        navigate(driver, f"{base}/w/干员一览")
+        counter = {"found": 0, "skipped": 0}
+        with CrawlJournal(module.JOURNAL_PATH) as journal, module.open_driver_pool(rate_limit.egress) as pool:
+            module.crawl_operators(pool, journal, module.iter_pending_operators(driver, journal, counter))
+    finally:
+        driver.quit()
+
+def run_prts_operators_select(base, args):
+    run_prts_operators(base, args, "prts_operators_select")
+
+def run_prts_skins(base, args):
+    from crawler_common.rate_limit import navigate
+
+    module = load_script("prts_skins")
+    driver = start_chrome(args)
+    try:
+        navigate(driver, f"{base}/w/首页")
+        for operator_info in module.collect_specific_operators(driver):
+            module.process_operator(driver, operator_info)
+    finally:
+        driver.quit()
+
+def file_page_urls(base, kind, args):
+    return [base + href for href in fixtures.prts_file_links(kind, args.files)]
+
+def run_prts_npc(base, args):
+    import requests
+    from crawler_common.journal import CrawlJournal
+    from crawler_common.mediawiki import sized_name
+
+    module = load_script("prts_npc")
+    module.base_url = base
+    module.api_url = f"{base}/api.php"
+    module.target_url = f"{base}/w/剧情资源概览"
+    apply_resolution(module, args)
+    os.makedirs(sized_name(module.OUTPUT_DIR, args.max_width), exist_ok=True)
+    try:
+        driver = start_chrome(args)
+        try:
+            image_links = module.collect_image_links(driver)
+        finally:
+            driver.quit()
+    except Skipped as e:
+        # 没有浏览器时直接使用概览页中的链接，只测量API解析和下载阶段
+        print(f"跳过浏览器阶段: {e}")
+        image_links = file_page_urls(base, "Avg_avg_npc", args)
+    with CrawlJournal(sized_name(module.JOURNAL_PATH, args.max_width)) as journal:
+        module.process_with_api(requests.Session(), journal, image_links)
+
+def run_prts_search(base, args):
+    module = load_script("prts_search")
+    module.API_URL = f"{base}/api.php"
+    apply_resolution(module, args)
+    try:
+        driver = start_chrome(args)
+        try:
+            driver.get(f"{base}/index.php?search=宣传图&fulltext=1&ns6=1")
+            detail_urls = [link.get_attribute("href") for link in module.get_image_links(driver)]
+        finally:
+            driver.quit()
+    except Skipped as e:
+        print(f"跳过浏览器阶段: {e}")
+        detail_urls = file_page_urls(base, "Search", args)
+    module.download_images_with_api(detail_urls)
+
+def run_prts_new_files(base, args):
+    """上传日志中 --changed 比例的最近的NPC文件"""
+    import requests
+    from crawler_common.journal import CrawlJournal
+    from crawler_common.mediawiki import sized_name
+
+    module = load_script("prts_new_files")
+    module.API_URL = f"{base}/api.php"
+    apply_resolution(module, args)
+    with CrawlJournal(sized_name(module.JOURNAL_PATH, args.max_width)) as journal:
+        module.crawl_new_files(requests.Session(), journal, args.since)
+
+# 先在同一目录中运行的流程（不计入结果），之后模拟服务器记录 --changed 比例的舰船的更改，再运行要测量的流程
+SETUP = {"azurlane_recent": "azurlane"}
+
+PIPELINES = {
+    "azurlane": run_azurlane,
+    "azurlane_recent": run_azurlane_recent,
+    "prts_operators": run_prts_operators,
+    "prts_operators_select": run_prts_operators_select,
+    "prts_skins": run_prts_skins,
+    "prts_npc": run_prts_npc,
+    "prts_search": run_prts_search,
+    "prts_new_files": run_prts_new_files,
+}
+
+def run_child(args):
+    """子进程：在临时目录中运行一个流程，把耗时和资源占用写入结果文件"""
+    from crawler_common.metrics import metrics
+    from crawler_common.rate_limit import limiter
+
+    host = urlparse(args.base).netloc
+    limiter.host_rates[host] = args.host_rate
+    limiter.max_rate = max(limiter.max_rate, args.host_rate)
+    if args.proxy_urls:
+        # 所有请求经过模拟代理，每个代理的限速器使用相同的初始速率
+        from crawler_common.proxy_pool import use_proxies
+        pool = use_proxies(args.proxy_urls.split(","), health_url=f"{args.base}/api.php?action=query&titles=")
+        for proxy in pool.proxies:
+            proxy.limiter.host_rates[host] = args.host_rate
+            proxy.limiter.max_rate = limiter.max_rate
+
+    result = {"status": "ok"}
+    log = open(os.path.join(os.getcwd(), "bench.log"), "w", encoding="utf-8")
+    stdout = sys.stdout
+    sys.stdout = log
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        PIPELINES[args.child](args.base, args)
+    except Skipped as e:
+        result = {"status": "skipped", "reason": str(e)}
+    except Exception as e:
+        result = {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+    finally:
+        sys.stdout = stdout
+        log.close()
+    result["wall"] = time.perf_counter() - start_wall
+    result["cpu"] = time.process_time() - start_cpu
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["metrics"] = metrics.report()
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+# ---- 主进程 ----
+
+def run_child_process(name, wiki, args, workdir, result_path, proxy_urls=()):
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, "--base", wiki.base,
+               "--result", result_path, "--files", str(args.files), "--pool-size", str(args.pool_size),
+               "--host-rate", str(args.host_rate),
+               "--since", timestamp(wiki.epoch + HISTORY * (1 - args.changed))]
+    if args.no_browser:
+        command.append("--no-browser")
+    if proxy_urls:
+        command += ["--proxy-urls", ",".join(proxy_urls)]
+    if args.max_width:
+        command += ["--max-width", str(args.max_width)]
+    if args.webp:
+        command.append("--webp")
+    subprocess.run(command, cwd=workdir, check=False)
+
+def run_pipeline(name, wiki, args, proxy_urls=()):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    if name in SETUP:
+        run_child_process(SETUP[name], wiki, args, workdir, os.path.join(workdir, "setup.json"), proxy_urls)
+        os.replace(os.path.join(workdir, "bench.log"), os.path.join(workdir, "setup.log"))
+        changed = max(1, round(args.ships * args.changed))
+        wiki.record_changes(range(args.ships - changed, args.ships))
+    wiki.reset_stats()
+    result_path = os.path.join(workdir, "result.json")
+    run_child_process(name, wiki, args, workdir, result_path, proxy_urls)
+
+    with open(result_path, encoding="utf-8") as f:
+        result = json.load(f)
+    stats = dict(wiki.stats)
+    wall = result["wall"] or 1e-9
+    result.update({
+        "pipeline": name,
+        "workdir": workdir,
+        "server": stats,
+        "clients": dict(wiki.clients),
+        "pages_per_s": (stats["pages"] + stats["api"]) / wall,
+        "images_per_s": (stats["images"] + stats["thumbs"]) / wall,
+        "mb_per_s": stats["image_bytes"] / 1024 / 1024 / wall,
+    })
+    return result
+
+def format_number(value, digits=2):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def print_report(results, previous=None):
+    header = f"{'流程':<24}{'状态':<9}{'耗时s':>8}{'页面/s':>9}{'图片/s':>9}{'MB/s':>8}{'峰值内存MB':>12}{'CPU s':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['pipeline']:<24}{r['status']:<9}{format_number(r['wall']):>8}"
+              f"{format_number(r['pages_per_s']):>9}{format_number(r['images_per_s']):>9}"
+              f"{format_number(r['mb_per_s']):>8}{format_number(r['peak_rss_mb'], 1):>12}"
+              f"{format_number(r['cpu']):>8}")
+        if r["status"] != "ok":
+            print(f"    {r.get('reason', '')}")
+
+    if previous:
+        print("\n与上次结果对比（变化百分比）:")
+        before = {r["pipeline"]: r for r in previous}
+        for r in results:
+            old = before.get(r["pipeline"])
+            if not old or old["status"] != "ok" or r["status"] != "ok":
+                continue
+            changes = []
+            for key in ("wall", "pages_per_s", "images_per_s", "mb_per_s", "peak_rss_mb", "cpu"):
+                if old.get(key) and r.get(key) is not None:
+                    changes.append(f"{key} {100 * (r[key] - old[key]) / old[key]:+.1f}%")
+            print(f"  {r['pipeline']:<24}{', '.join(changes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟Wiki上对各爬虫做性能基准")
+    parser.add_argument("pipelines", nargs="*", help=f"要运行的流程（{', '.join(PIPELINES)}），默认全部")
+    parser.add_argument("--operators", type=int, default=30, help="模拟干员数量")
+    parser.add_argument("--ships", type=int, default=30, help="模拟舰船数量")
+    parser.add_argument("--files", type=int, default=60, help="NPC/搜索页面的文件数量")
+    parser.add_argument("--image-kb", type=int, default=200, help="每张图片的大小（KB）")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01, help="每个请求的随机额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回429/503的概率")
+    parser.add_argument("--host-rate", type=float, default=50.0, help="限速器对模拟服务器的初始速率（请求/秒）")
+    parser.add_argument("--client-rate", type=float, default=None,
+                        help="模拟服务器对每个客户端（出口）的速率上限（请求/秒），超出返回429")
+    parser.add_argument("--proxies", type=int, default=0, help="启动多少个模拟代理作为出口，0为直接连接")
+    parser.add_argument("--max-width", type=int, default=None, help="分辨率策略：下载图片的最大宽度，默认为原图")
+    parser.add_argument("--webp", action="store_true", help="分辨率策略：优先下载WebP缩略图")
+    parser.add_argument("--changed", type=float, default=0.1,
+                        help="增量发现流程（azurlane_recent、prts_new_files）：上次运行之后有变化的比例")
+    parser.add_argument("--pool-size", type=int, default=4, help="浏览器池大小")
+    parser.add_argument("--no-browser", action="store_true", help="跳过需要Chrome的阶段")
+    parser.add_argument("--json", help="把结果保存为JSON")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    # 子进程内部使用的参数
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--proxy-urls", help=argparse.SUPPRESS)
+    parser.add_argument("--since", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+    unknown = set(args.pipelines) - set(PIPELINES)
+    if unknown:
+        parser.error(f"未知的流程: {', '.join(sorted(unknown))}")
+
+    wiki = MockWiki(operators=args.operators, ships=args.ships, files=args.files,
+                    image_size=args.image_kb * 1024, latency=args.latency, jitter=args.jitter,
+                    error_rate=args.error_rate, client_rate=args.client_rate)
+    wiki.start()
+    print(f"模拟Wiki: {wiki.base}")
+    proxies = [MockProxy() for _ in range(args.proxies)]
+    proxy_urls = [proxy.start() for proxy in proxies]
+    if proxy_urls:
+        print(f"模拟代理: {', '.join(proxy_urls)}")
+
+    results = []
+    try:
+        for name in args.pipelines or list(PIPELINES):
+            print(f"正在运行: {name}")
+            results.append(run_pipeline(name, wiki, args, proxy_urls))
+    finally:
+        wiki.stop()
+        for proxy in proxies:
+            proxy.stop()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+    print_report(results, previous)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "args": vars(args), "results": results}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.json}")
+
+if __name__ == "__main__":
+    main()
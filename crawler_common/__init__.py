@@ -0,0 +1 @@
+"""各爬虫脚本共用的组件"""
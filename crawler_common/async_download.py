@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+class AsyncDownloader:
+    """
+    异步并发下载引擎
+    在后台线程中运行asyncio事件循环，调用方用submit()把任务放进队列后立即返回，
+    全局并发数和每个主机的并发数分别受限，不再需要每次请求前固定sleep
+    """
+
+    def __init__(self, download_func, concurrency=16, per_host=8, max_pending=None):
+        # download_func(url, *args) 为同步下载函数，在线程池中执行，返回True表示成功
+        self.download_func = download_func
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.succeeded = 0
+        self.failed = 0
+
+        # 限制排队中的任务数，防止提交速度远超下载速度时内存无限增长
+        self._pending_slots = threading.BoundedSemaphore(max_pending or concurrency * 8)
+        self._futures = set()
+        self._lock = threading.Condition()
+
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._global_limit = None
+        self._host_limits = {}
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _host_limit(self, url):
+        """获取某个主机的信号量（只在事件循环线程中调用）"""
+        if self._global_limit is None:
+            self._global_limit = asyncio.Semaphore(self.concurrency)
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def _download(self, url, args):
+        host_limit = self._host_limit(url)
+        async with self._global_limit, host_limit:
+            try:
+                ok = await self._loop.run_in_executor(self._executor, self.download_func, url, *args)
+            except Exception as e:
+                print(f"下载任务异常 {url} | 错误: {str(e)}")
+                ok = False
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+        return ok
+
+    def submit(self, url, *args):
+        """
+        提交一个下载任务，返回concurrent.futures.Future
+        调用方在返回的Future上注册的回调（如写入爬取记录）运行完之后，任务才算完成，join()会等待它们
+        """
+        self._pending_slots.acquire()
+        result = Future()
+        with self._lock:
+            self._futures.add(result)
+        task = asyncio.run_coroutine_threadsafe(self._download(url, args), self._loop)
+        task.add_done_callback(lambda done: self._task_done(result, done))
+        return result
+
+    def _task_done(self, result, task):
+        # set_result在当前线程中依次运行result上已注册的回调，之后才从未完成集合中移除
+        try:
+            try:
+                result.set_result(task.result())
+            except BaseException as e:
+                result.set_exception(e)
+        finally:
+            with self._lock:
+                self._futures.discard(result)
+                self._lock.notify_all()
+            self._pending_slots.release()
+
+    def join(self):
+        """等待所有已提交的任务及其回调完成"""
+        with self._lock:
+            while self._futures:
+                self._lock.wait()
+
+    def close(self):
+        """等待任务完成后关闭事件循环和线程池"""
+        self.join()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+
+class BlobStore:
+    """
+    按内容哈希（SHA-1）存放文件的仓库
+    每份内容只保存一次（root/ab/cd/<sha1>），各输出目录中的文件名以硬链接指向它；
+    文件系统不支持硬链接时退回到复制
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        self._lock = threading.Lock()
+        # ETag+长度 -> sha1，用于在读取响应体之前发现重复内容
+        self._conn = sqlite3.connect(os.path.join(root, "aliases.db"), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS aliases (key TEXT PRIMARY KEY, sha1 TEXT NOT NULL)")
+
+    def blob_path(self, sha1):
+        return os.path.join(self.root, sha1[:2], sha1[2:4], sha1)
+
+    def has(self, sha1):
+        return bool(sha1) and os.path.exists(self.blob_path(sha1))
+
+    def part_path(self, dest):
+        """dest对应的下载中文件，放在仓库所在的文件系统上以便直接移入仓库；路径固定，中断后可续传"""
+        key = hashlib.sha1(os.path.abspath(dest).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "tmp", f"{key}.part")
+
+    def put(self, temp_path, sha1, dest):
+        """把下载好的临时文件存入仓库（内容已存在时丢弃），再链接到dest"""
+        blob = self.blob_path(sha1)
+        if os.path.exists(blob):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(temp_path, blob)
+        self.link(sha1, dest)
+
+    def link(self, sha1, dest):
+        """让dest指向仓库中的内容，已存在的dest会被原子替换"""
+        blob = self.blob_path(sha1)
+        if os.path.exists(dest) and os.path.samefile(blob, dest):
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        tmp = f"{dest}.link"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest)
+
+    def discard_unused(self, sha1):
+        """删除不再被任何输出文件硬链接的内容（只剩仓库自身这一个链接）"""
+        blob = self.blob_path(sha1)
+        if os.path.exists(blob) and os.stat(blob).st_nlink == 1:
+            os.remove(blob)
+
+    def lookup(self, etag, content_length):
+        """根据服务器给出的ETag和长度查找已有内容的sha1"""
+        if not etag:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT sha1 FROM aliases WHERE key = ?",
+                                     (f"{etag}|{content_length}",)).fetchone()
+        return row[0] if row and self.has(row[0]) else None
+
+    def remember(self, etag, content_length, sha1):
+        if not etag:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO aliases (key, sha1) VALUES (?, ?)",
+                               (f"{etag}|{content_length}", sha1))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,51 @@
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+# 精简模式下屏蔽的请求：图片、字体、音视频和统计脚本（爬虫只需要HTML/JS里的链接）
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp3", "*.ogg", "*.wav", "*.mp4", "*.webm",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*hm.baidu.com*", "*cnzz.com*", "*googlesyndication.com*",
+]
+
+def make_chrome(headless=True, driver_path=None, lean=True, proxy=None):
+    """
+    创建Chrome实例，driver_path为空时由selenium自动查找chromedriver
+    proxy为代理地址（如 http://host:port、socks5://host:port）时所有请求经过该代理
+    lean为True时使用精简配置：不加载图片，DOMContentLoaded后即返回，并屏蔽图片/字体/媒体/统计请求
+    """
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    if proxy:
+        options.add_argument(f"--proxy-server={proxy}")
+    if lean:
+        options.page_load_strategy = "eager"
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--mute-audio")
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+        })
+
+    service = Service(driver_path) if driver_path else None
+    driver = webdriver.Chrome(service=service, options=options)
+    if lean:
+        block_resources(driver)
+    return driver
+
+def block_resources(driver, patterns=BLOCKED_URL_PATTERNS):
+    """通过CDP屏蔽匹配的请求（只对当前标签页生效），不支持CDP时忽略"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    except (WebDriverException, AttributeError) as e:
+        print(f"无法启用请求屏蔽: {str(e).splitlines()[0]}")
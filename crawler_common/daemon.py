@@ -0,0 +1,244 @@
+import importlib.util
+import itertools
+import json
+import threading
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from crawler_common import rate_limit
+from crawler_common.browser import make_chrome
+from crawler_common.driver_pool import DriverPool
+from crawler_common.metrics import metrics
+from crawler_common.proxy_pool import use_proxies
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_WORKERS = 2  # 同时运行的任务数（同名任务总是依次运行）
+KEEP_RECORDS = 200  # 保留最近多少个任务的记录
+MAX_PAGES_PER_BROWSER = 200  # 常驻的浏览器处理多少个页面后重建
+
+def load_script(path, name=None):
+    """按文件路径加载爬虫脚本（脚本文件名不是合法的模块名）"""
+    name = name or f"script_{abs(hash(path))}"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class CrawlerDaemon:
+    """
+    常驻的爬虫进程：保持一组预热的无头浏览器和HTTP会话，通过本地HTTP接口接收任务
+    jobs为 {任务名: func(daemon, **参数) -> 可JSON序列化的结果}，任务函数通过 daemon.pool.lease() 借用浏览器，
+    通过 daemon.session 发送请求，通过 daemon.script(路径) 加载（并缓存）要复用的爬虫脚本
+    """
+
+    def __init__(self, jobs, pool_size=2, warm=1, job_workers=JOB_WORKERS, factory=None):
+        self.jobs = jobs
+        self.pool = DriverPool(pool_size, factory=factory or partial(make_chrome, headless=True),
+                               max_pages=MAX_PAGES_PER_BROWSER)
+        self.session = requests.Session()
+        self.warm = warm
+        self._executor = ThreadPoolExecutor(job_workers)
+        self._records = {}
+        self._futures = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._job_locks = defaultdict(threading.Lock)
+        self._scripts = {}
+
+    def start(self):
+        """预先启动warm个浏览器，第一个任务不用等浏览器启动"""
+        if self.warm:
+            print(f"正在预热 {self.warm} 个浏览器...")
+            self.pool.warm(self.warm)
+
+    def script(self, path):
+        """加载爬虫脚本，只在第一次用到时导入"""
+        with self._lock:
+            if path not in self._scripts:
+                self._scripts[path] = load_script(path)
+            return self._scripts[path]
+
+    def submit(self, name, params=None):
+        """提交任务，返回任务记录"""
+        if name not in self.jobs:
+            raise KeyError(f"未知的任务: {name}（可用: {', '.join(self.jobs)}）")
+        with self._lock:
+            job_id = str(next(self._ids))
+            record = {"id": job_id, "job": name, "params": params or {}, "state": QUEUED,
+                      "submitted": time.time(), "started": None, "finished": None, "result": None, "error": None}
+            self._records[job_id] = record
+            # 只保留最近的记录
+            for old in list(self._records)[:-KEEP_RECORDS]:
+                self._records.pop(old, None)
+                self._futures.pop(old, None)
+            self._futures[job_id] = self._executor.submit(self._run, record)
+        print(f"已接收任务 {job_id}: {name} {params or ''}")
+        return dict(record)
+
+    def _run(self, record):
+        # 同名任务依次运行，避免两个任务同时写同一个输出目录和爬取记录
+        with self._job_locks[record["job"]]:
+            record.update(state=RUNNING, started=time.time())
+            try:
+                record["result"] = self.jobs[record["job"]](self, **record["params"])
+                record["state"] = DONE
+            except Exception as e:
+                traceback.print_exc()
+                record.update(state=FAILED, error=f"{type(e).__name__}: {e}")
+            record["finished"] = time.time()
+        print(f"任务 {record['id']} {record['job']} {record['state']}，"
+              f"用时 {record['finished'] - record['started']:.1f} 秒")
+
+    def wait(self, job_id, timeout=None):
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future:
+            future.result(timeout)
+        return self.status(job_id)
+
+    def status(self, job_id=None):
+        with self._lock:
+            if job_id is None:
+                return [dict(record) for record in self._records.values()]
+            if job_id not in self._records:
+                raise KeyError(f"没有该任务: {job_id}")
+            return dict(self._records[job_id])
+
+    def serve(self, host="127.0.0.1", port=8791):
+        """
+        本地HTTP接口：
+        POST /jobs {"job": 任务名, "params": {...}, "wait": true/false}  提交任务，wait时等任务完成再返回
+        GET /jobs、GET /jobs/<id>  查询任务；GET /metrics  Prometheus格式的运行指标；GET /proxies  出口代理的状态
+        """
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, body, content_type="application/json; charset=utf-8"):
+                data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                path = self.path.strip("/")
+                try:
+                    if path == "metrics":
+                        return self.reply(200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+                    if path == "jobs":
+                        return self.reply(200, daemon.status())
+                    if path == "proxies":
+                        return self.reply(200, rate_limit.egress.status() if rate_limit.egress else [])
+                    if path.startswith("jobs/"):
+                        return self.reply(200, daemon.status(path[len("jobs/"):]))
+                    raise KeyError(path)
+                except KeyError as e:
+                    self.reply(404, {"error": e.args[0] if e.args else str(e)})
+
+            def do_POST(self):
+                if self.path.strip("/") != "jobs":
+                    return self.reply(404, {"error": self.path})
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                    record = daemon.submit(request.get("job"), request.get("params"))
+                    if request.get("wait"):
+                        record = daemon.wait(record["id"])
+                    self.reply(200, record)
+                except KeyError as e:
+                    self.reply(404, {"error": e.args[0] if e.args else str(e)})
+                except Exception as e:
+                    self.reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def submit_job(url, name, params=None, wait=False):
+    """向常驻进程提交任务，返回任务记录"""
+    response = requests.post(f"{url.rstrip('/')}/jobs", json={"job": name, "params": params or {}, "wait": wait},
+                             timeout=None if wait else 30)
+    body = response.json()
+    if response.status_code != 200:
+        raise RuntimeError(body.get("error"))
+    return body
+
+def parse_params(items):
+    """命令行中的 key=value 参数；值按JSON解析（true、123等），解析失败时作为字符串"""
+    params = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+def run_cli(jobs, description, port=8791, pool_size=2, warm=1, factory=None, proxies=None):
+    """
+    常驻进程的命令行入口：
+    serve                          启动常驻进程（proxies不为空时请求和浏览器经过代理池的出口）
+    submit <任务名> [key=value ...] [--wait]  提交任务
+    status [任务id]                 查询任务
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("command", choices=("serve", "submit", "status"))
+    parser.add_argument("args", nargs="*", help="submit: 任务名和 key=value 参数；status: 任务id")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--pool-size", type=int, default=pool_size, help="浏览器池大小")
+    parser.add_argument("--warm", type=int, default=warm, help="启动时预热的浏览器数量")
+    parser.add_argument("--wait", action="store_true", help="submit时等待任务完成")
+    args = parser.parse_args()
+    url = f"http://{args.host}:{args.port}"
+
+    if args.command == "serve":
+        egress = use_proxies(proxies)
+        if egress and factory is None:
+            factory = egress.chrome_factory()
+        with CrawlerDaemon(jobs, pool_size=args.pool_size, warm=args.warm, factory=factory) as daemon:
+            daemon.start()
+            server = daemon.serve(args.host, args.port)
+            print(f"常驻服务已启动: {url}，可用任务: {', '.join(jobs)}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                server.shutdown()
+        return
+
+    if args.command == "submit":
+        if not args.args:
+            parser.error("submit需要任务名")
+        record = submit_job(url, args.args[0], parse_params(args.args[1:]), args.wait)
+    else:
+        response = requests.get(f"{url}/jobs" + (f"/{args.args[0]}" if args.args else ""), timeout=30)
+        record = response.json()
+    print(json.dumps(record, ensure_ascii=False, indent=2))
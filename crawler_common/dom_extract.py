@@ -0,0 +1,44 @@
+import json
+
+from crawler_common.metrics import metrics
+
+# 在浏览器中一次执行完成整页的数据提取，代替逐个元素的 find_element/get_attribute
+# （每次调用都是一次WebDriver往返，几百个元素就是上千次同步请求）
+
+# 干员一览：div.long-container → [{chinese_name, english_name, operator_id, operator_url}]
+OPERATOR_LIST_SCRIPT = """
+const text = el => el ? (el.innerText || el.textContent || "").trim() : "";
+const records = [];
+for (const card of document.querySelectorAll("div.long-container")) {
+    const nameDiv = card.querySelector("div.name > div");
+    if (!nameDiv) continue;
+    const link = nameDiv.querySelector("a");
+    records.push({
+        chinese_name: text(nameDiv.querySelector("a > div")),
+        english_name: text(nameDiv.querySelector("div:nth-child(2)")),
+        operator_id: text(nameDiv.querySelector("div:nth-child(4)")),
+        operator_url: link ? link.href : ""
+    });
+}
+return JSON.stringify(records);
+"""
+
+# 任意选择器下的图片 → [{id, src}]
+IMAGE_SCRIPT = """
+return JSON.stringify(Array.from(document.querySelectorAll(arguments[0]),
+    img => ({id: img.id || "", src: img.src || img.getAttribute("src") || ""})));
+"""
+
+def run_json_script(driver, script, *args):
+    """执行返回JSON字符串的脚本（返回字符串比返回大数组序列化更快），解析为Python对象"""
+    with metrics.timer("extract"):
+        result = driver.execute_script(script, *args)
+    return json.loads(result) if result else []
+
+def extract_operators(driver):
+    """一次调用提取干员一览中的所有干员，跳过信息不完整的条目"""
+    return [record for record in run_json_script(driver, OPERATOR_LIST_SCRIPT) if all(record.values())]
+
+def extract_images(driver, selector):
+    """一次调用提取选择器匹配的所有图片的id和src"""
+    return run_json_script(driver, IMAGE_SCRIPT, selector)
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import request_with_limit
+
+CHUNK_SIZE = 1024 * 1024  # 每次读取和写入的块大小
+TIMEOUT = (10, 60)  # (连接超时, 读取超时)，单位秒；读取超时是两次收到数据之间的最长间隔
+PART_SUFFIX = ".part"
+
+class AssetIndex:
+    """
+    已下载资源的索引（SQLite）
+    记录每个本地文件对应的ETag、Last-Modified、Content-Length、本地大小和SHA-1，
+    用于下次运行时发送条件请求
+    """
+
+    FIELDS = ("url", "etag", "last_modified", "content_length", "local_size", "sha1")
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS assets (path TEXT PRIMARY KEY, url TEXT, etag TEXT, "
+            "last_modified TEXT, content_length INTEGER, local_size INTEGER, sha1 TEXT, updated REAL)"
+        )
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM assets WHERE path = ?", (os.path.abspath(path),)
+            ).fetchone()
+        return dict(zip(self.FIELDS, row)) if row else None
+
+    def update(self, path, **fields):
+        record = self.get(path) or dict.fromkeys(self.FIELDS)
+        record.update(fields)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO assets (path, {', '.join(self.FIELDS)}, updated) "
+                f"VALUES (?, {', '.join('?' * len(self.FIELDS))}, ?)",
+                (os.path.abspath(path), *(record[f] for f in self.FIELDS), time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def local_matches(record, path):
+    """本地文件是否仍是上次下载的那个（存在且大小一致）"""
+    return bool(record) and os.path.exists(path) and os.path.getsize(path) == record["local_size"]
+
+def link_existing(store, sha1, path, index, url, **fields):
+    """内容已在仓库中时，直接把path链接过去"""
+    store.link(sha1, path)
+    metrics.count("deduplicated")
+    if index:
+        index.update(path, url=url, local_size=os.path.getsize(path), sha1=sha1, **fields)
+    print(f"内容已存在，直接链接: {os.path.basename(path)}")
+    return True
+
+def part_paths(path, store=None):
+    """未完成下载的.part文件，以及记录其ETag/Last-Modified的校验文件"""
+    part_path = store.part_path(path) if store else path + PART_SUFFIX
+    return part_path, part_path + ".validator"
+
+def resume_offset(part_path, validator_path):
+    """已下载的字节数和用于If-Range的校验值；没有校验值时不能安全续传，返回 (0, None)"""
+    try:
+        with open(validator_path, encoding="utf-8") as f:
+            validator = f.read().strip()
+        offset = os.path.getsize(part_path)
+    except OSError:
+        return 0, None
+    return (offset, validator) if offset and validator else (0, None)
+
+def discard_part(part_path, validator_path):
+    for p in (part_path, validator_path):
+        if os.path.exists(p):
+            os.remove(p)
+
+def content_range_start(response):
+    """206响应中 Content-Range: bytes start-end/total 的起始位置和总长度"""
+    value = response.headers.get("Content-Range", "")
+    try:
+        span, _, total = value.split()[1].partition("/")
+        return int(span.split("-")[0]), int(total) if total.isdigit() else None
+    except (IndexError, ValueError):
+        return None, None
+
+def download_file(session, url, path, index=None, store=None, expected_sha1=None, headers=None,
+                  timeout=TIMEOUT, chunk_size=CHUNK_SIZE, require_image=False):
+    """
+    下载文件到path，返回是否成功（未变化而跳过也算成功）
+    先写入.part文件，长度与Content-Length一致后才原子地替换为path；
+    中断留下的.part文件在下次下载时用Range续传（If-Range保证服务器上的文件没有变化）
+    传入index时启用增量模式：发送If-None-Match/If-Modified-Since，304时不重写文件
+    传入store时内容存入按哈希去重的仓库，path为指向它的硬链接；
+    expected_sha1（如MediaWiki API返回的sha1）对应的内容已存在时不发出请求
+    """
+    with metrics.timer("download"):
+        ok = _download_file(session, url, path, index, store, expected_sha1, headers, timeout,
+                            chunk_size, require_image)
+    if not ok:
+        metrics.error("download", "failed")
+    return ok
+
+def _download_file(session, url, path, index, store, expected_sha1, headers, timeout, chunk_size,
+                   require_image):
+    if store and store.has(expected_sha1):
+        return link_existing(store, expected_sha1, path, index, url)
+
+    headers = dict(headers or {})
+    part_path, validator_path = part_paths(path, store)
+    offset, validator = resume_offset(part_path, validator_path)
+    record = index.get(path) if index else None
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+    elif local_matches(record, path):
+        if record["etag"]:
+            headers["If-None-Match"] = record["etag"]
+        if record["last_modified"]:
+            headers["If-Modified-Since"] = record["last_modified"]
+
+    response = request_with_limit(session, url, headers=headers, stream=True, timeout=timeout)
+    try:
+        if response.status_code == 304:
+            print(f"未变化，跳过: {os.path.basename(path)}")
+            metrics.count("not_modified")
+            return True
+        if response.status_code == 416 and offset:
+            # 续传位置无效（.part已损坏或比服务器上的文件还长），丢弃后从头下载
+            response.close()
+            discard_part(part_path, validator_path)
+            headers = {k: v for k, v in headers.items() if k not in ("Range", "If-Range")}
+            return _download_file(session, url, path, index, store, expected_sha1, headers, timeout,
+                                  chunk_size, require_image)
+        if response.status_code not in (200, 206):
+            print(f"下载失败，状态码: {response.status_code} | URL: {url}")
+            return False
+        if require_image and 'image' not in response.headers.get('Content-Type', '').lower():
+            print(f"非图片内容: {url}")
+            return False
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        content_length = response.headers.get("Content-Length")
+        content_length = int(content_length) if content_length and content_length.isdigit() else None
+        # 压缩传输（gzip/br等）时Content-Length和Range都按压缩后的字节计算，与写入的解压内容对不上
+        encoded = response.headers.get("Content-Encoding", "identity").lower() not in ("", "identity")
+
+        if response.status_code == 206 and encoded:
+            # 压缩后的片段无法接在已解压的.part后面，丢弃后从头下载
+            response.close()
+            discard_part(part_path, validator_path)
+            headers = {k: v for k, v in headers.items() if k not in ("Range", "If-Range")}
+            return _download_file(session, url, path, index, store, expected_sha1, headers, timeout,
+                                  chunk_size, require_image)
+        if response.status_code == 206:
+            start, total = content_range_start(response)
+            if start != offset:
+                print(f"续传位置不符，丢弃已下载部分: {os.path.basename(path)}")
+                discard_part(part_path, validator_path)
+                return False
+            if total is None and content_length is not None:
+                total = offset + content_length
+            print(f"从 {offset} 字节处继续下载: {os.path.basename(path)}")
+            metrics.count("resumed")
+        else:
+            # 200：服务器忽略了Range或文件已变化，从头下载
+            if offset:
+                discard_part(part_path, validator_path)
+                offset = 0
+            total = content_length
+
+            # 服务器不支持条件请求时，ETag和大小都一致也视为未变化
+            if local_matches(record, path) and etag and etag == record["etag"] \
+                    and content_length == record["content_length"]:
+                print(f"未变化，跳过: {os.path.basename(path)}")
+                metrics.count("not_modified")
+                return True
+
+            # 其他文件名下已经下载过同样的内容
+            known = store.lookup(etag, content_length) if store else None
+            if known:
+                return link_existing(store, known, path, index, url, etag=etag,
+                                     last_modified=last_modified, content_length=content_length)
+
+        sha1 = hashlib.sha1()
+        size = offset
+        if offset:
+            # 续传时先把已有部分计入哈希
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    sha1.update(chunk)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(part_path)), exist_ok=True)
+            # 记录校验值，中断后才能安全续传；压缩传输的内容不续传
+            if (etag or last_modified) and not encoded:
+                with open(validator_path, "w", encoding="utf-8") as f:
+                    f.write(etag or last_modified)
+            elif os.path.exists(validator_path):
+                os.remove(validator_path)
+
+        with metrics.timer("transfer"), open(part_path, "ab" if offset else "wb") as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+                sha1.update(chunk)
+                size += len(chunk)
+        metrics.count("bytes", size - offset)
+
+        # 压缩传输时按实际收到的压缩字节数检查
+        received = offset + response.raw.tell() if encoded else size
+        if total is not None and received != total:
+            print(f"下载不完整（{received}/{total} 字节），已保留进度: {os.path.basename(path)}")
+            metrics.error("transfer", "incomplete")
+            return False
+
+        digest = sha1.hexdigest()
+        if os.path.exists(validator_path):
+            os.remove(validator_path)
+        if store:
+            store.put(part_path, digest, path)
+            store.remember(etag, total, digest)
+        else:
+            # 替换目录项而不是原地改写，也不会改动与仓库共享的硬链接
+            os.replace(part_path, path)
+
+        if index:
+            index.update(path, url=url, etag=etag, last_modified=last_modified,
+                         content_length=total, local_size=size, sha1=digest)
+        return True
+    finally:
+        response.close()
@@ -0,0 +1,147 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+from crawler_common.browser import make_chrome
+
+def is_alive(driver):
+    """浏览器会话是否仍然可用"""
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+def quit_quietly(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+class DriverPool:
+    """
+    多个浏览器实例组成的池
+    每个工作线程独占一个浏览器；浏览器崩溃时重建，
+    处理max_pages个页面后也会重建，避免内存持续增长；
+    factory提供usable(driver)时（如代理池的浏览器工厂），不再可用的浏览器（所用代理已被移除）也会关闭重建
+    """
+
+    def __init__(self, size=4, factory=make_chrome, max_pages=50):
+        self.size = size
+        self.factory = factory
+        self.max_pages = max_pages
+        self.usable = getattr(factory, "usable", None)
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        """取出一个空闲浏览器，没有时新建，已达上限时等待"""
+        self._slots.acquire()
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._usable(driver):
+                return driver
+            self._retire(driver)
+        try:
+            driver = self.factory()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, crashed=False):
+        """归还浏览器；崩溃或处理页面数达到上限时关闭它，下次按需重建"""
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+            recycle = crashed or self._pages[id(driver)] >= self.max_pages
+        if recycle or not self._usable(driver):
+            self._retire(driver)
+        else:
+            self._idle.put(driver)
+        self._slots.release()
+
+    def _usable(self, driver):
+        return self.usable is None or self.usable(driver)
+
+    def _retire(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        quit_quietly(driver)
+
+    def warm(self, count):
+        """预先启动count个浏览器放入空闲队列（常驻进程中第一个任务不用等待浏览器启动）"""
+        drivers = []
+        try:
+            for _ in range(min(count, self.size)):
+                drivers.append(self.acquire())
+        finally:
+            for driver in drivers:
+                self._idle.put(driver)
+                self._slots.release()
+
+    @contextmanager
+    def lease(self):
+        """借用一个浏览器，用完后检查是否崩溃再归还"""
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver, crashed=not is_alive(driver))
+
+    def run(self, func, items, retries=1):
+        """用size个工作线程并行执行 func(driver, item)，浏览器崩溃时换新浏览器重试"""
+        tasks = queue.Queue()
+        for item in items:
+            tasks.put(item)
+
+        def worker():
+            while True:
+                try:
+                    item = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                for attempt in range(retries + 1):
+                    try:
+                        driver = self.acquire()
+                    except Exception as e:
+                        print(f"启动浏览器失败: {str(e)}")
+                        break
+                    try:
+                        func(driver, item)
+                    except Exception as e:
+                        print(f"工作线程出错: {str(e)}")
+                    crashed = not is_alive(driver)
+                    self.release(driver, crashed)
+                    if not crashed:
+                        break
+                    print("浏览器已崩溃，正在重建" + ("并重试" if attempt < retries else ""))
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def close(self):
+        """关闭所有空闲浏览器"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            quit_quietly(driver)
+        with self._lock:
+            self._pages.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
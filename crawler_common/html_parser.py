@@ -0,0 +1,116 @@
+import codecs
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from crawler_common.metrics import metrics
+
+# 优先使用lxml（C实现，比html.parser快得多），未安装时退回标准库解析器
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+def parse_html(html, only=None, parser=None):
+    """
+    解析HTML
+    only为SoupStrainer时只构建匹配的子树，其余部分直接丢弃，速度更快、内存更少
+    """
+    with metrics.timer("parse"):
+        return BeautifulSoup(html, parser or PARSER, parse_only=only)
+
+def only_tags(name, classes=None, **attrs):
+    """构造只保留指定标签（及其子树）的SoupStrainer，classes匹配任意一个class即可"""
+    if classes:
+        wanted = set(classes)
+
+        # 解析过程中class可能还是未拆分的字符串（如 "wikitable sortable"），需要自己拆分
+        def match_class(value):
+            if not value:
+                return False
+            values = value.split() if isinstance(value, str) else value
+            return bool(wanted.intersection(values))
+
+        attrs["class"] = match_class
+    return SoupStrainer(name, attrs=attrs)
+
+class TableRowParser(HTMLParser):
+    """
+    增量解析指定class的表格：每读到一个 </tr> 就得到这一行的td单元格，不构建整个文档树
+    单元格为 {"attrs": 属性, "text": 文本, "links": [{"href", "text"}]}，嵌套在单元格里的表格只计入文本
+    """
+
+    def __init__(self, table_classes):
+        super().__init__(convert_charrefs=True)
+        self.wanted = set(table_classes)
+        self.tables = []  # 当前所在的各层表格是否为要解析的表格
+        self.row = None
+        self.cell = None
+        self.link = None
+        self.rows = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "table":
+            self.tables.append(bool(self.wanted.intersection((attrs.get("class") or "").split())))
+        elif not self.tables or not self.tables[-1]:
+            return
+        elif tag == "tr":
+            self.finish_row()
+            self.row = []
+        elif tag in ("td", "th") and self.row is not None:
+            # 与 find_all('td') 一致，行首的th不计入单元格
+            self.cell = {"attrs": attrs, "text": [], "links": []} if tag == "td" else None
+            if self.cell is not None:
+                self.row.append(self.cell)
+        elif tag == "a" and self.cell is not None:
+            self.link = {"href": attrs.get("href"), "text": []}
+            self.cell["links"].append(self.link)
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            if self.tables and self.tables.pop():
+                self.finish_row()
+        elif not self.tables or not self.tables[-1]:
+            return
+        elif tag == "tr":
+            self.finish_row()
+        elif tag in ("td", "th"):
+            self.cell = None
+            self.link = None
+        elif tag == "a":
+            self.link = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell["text"].append(data)
+            if self.link is not None:
+                self.link["text"].append(data)
+
+    def finish_row(self):
+        if self.row is not None:
+            for cell in self.row:
+                cell["text"] = "".join(cell["text"])
+                for link in cell["links"]:
+                    link["text"] = "".join(link["text"])
+            self.rows.append(self.row)
+        self.row = None
+        self.cell = None
+        self.link = None
+
+    def pop_rows(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+def iter_table_rows(chunks, table_classes, encoding="utf-8"):
+    """边接收响应体分块边解析，逐行产出表格中的td单元格，内存占用与页面大小无关"""
+    parser = TableRowParser(table_classes)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        with metrics.timer("parse"):
+            parser.feed(decoder.decode(chunk))
+        yield from parser.pop_rows()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.pop_rows()
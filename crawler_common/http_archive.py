@@ -0,0 +1,202 @@
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import request_with_limit
+
+# 存档模式
+OFF = "off"  # 不使用存档，每次联网
+CACHE = "cache"  # 存档未过期时直接使用，否则联网并写入存档
+REFRESH = "refresh"  # 总是联网并更新存档
+REPLAY = "replay"  # 只读存档，完全不联网
+STREAM_CHUNK = 64 * 1024  # stream() 每次产出的字节数
+STREAM_QUEUE = 32  # stream() 联网时后台线程最多提前读取的块数，内存占用不随页面大小增长
+
+class ArchivedResponse:
+    """存档中的响应，提供与requests.Response相同的常用属性"""
+
+    def __init__(self, url, status_code, headers, content, encoding, fetched_at, from_archive):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+        self.fetched_at = fetched_at
+        self.from_archive = from_archive
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}: {self.url}")
+
+class ResponseArchive:
+    """
+    HTML页面的本地存档（gzip压缩，按URL哈希存放）
+    每条记录第一行是JSON元数据，后面是原始响应体；
+    超过ttl秒的记录视为过期，replay模式下即使过期也直接使用
+    """
+
+    def __init__(self, root, mode=CACHE, ttl=7 * 24 * 3600):
+        self.root = root
+        self.mode = mode
+        self.ttl = ttl
+
+    def path_for(self, url):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.gz")
+
+    def open_record(self, url):
+        """打开存档记录，返回 (元数据, 定位在响应体开头的文件)，不存在时返回 (None, None)"""
+        path = self.path_for(url)
+        if not os.path.exists(path):
+            return None, None
+        f = gzip.open(path, "rb")
+        return json.loads(f.readline()), f
+
+    def load(self, url):
+        """读取存档记录，不存在时返回None"""
+        meta, f = self.open_record(url)
+        if meta is None:
+            return None
+        with f:
+            content = f.read()
+        return ArchivedResponse(meta["url"], meta["status"], meta["headers"], content,
+                                meta["encoding"], meta["fetched_at"], True)
+
+    def save(self, response, chunks=None):
+        """
+        写入存档（先写临时文件再替换，避免中断时留下损坏的记录；临时文件名各不相同，同一URL并发写入互不影响）
+        chunks为响应体的分块迭代器时边读边写，不在内存中拼出整个响应体；不传时写入response.content
+        """
+        path = self.path_for(response.url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+            "fetched_at": response.fetched_at,
+        }
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wb") as f:
+                f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8") + b"\n")
+                for chunk in (chunks if chunks is not None else [response.content]):
+                    f.write(chunk)
+            os.replace(temp, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp)
+            raise
+
+    def fresh(self, fetched_at):
+        return fetched_at is not None and time.time() - fetched_at < self.ttl
+
+    def fetch(self, session, url, refresh=False, **kwargs):
+        """按存档模式获取页面，返回ArchivedResponse；refresh为True时（replay模式除外）不使用存档，联网获取并更新存档"""
+        if self.mode == REPLAY or (self.mode == CACHE and not refresh):
+            record = self.load(url)
+            if self.mode == REPLAY:
+                if record is None:
+                    raise LookupError(f"存档中没有该页面: {url}")
+                return record
+            if self.fresh(record and record.fetched_at):
+                metrics.count("archive_hits")
+                return record
+
+        with metrics.timer("fetch"):
+            live = request_with_limit(session, url, **kwargs)
+            content = live.content
+        # 存档以请求的URL为键，重定向后仍能按原URL找到
+        response = ArchivedResponse(url, live.status_code, dict(live.headers), content,
+                                    live.encoding, time.time(), False)
+        if self.mode != OFF and live.status_code == 200:
+            self.save(response)
+        return response
+
+    def stream(self, session, url, chunk_size=STREAM_CHUNK, refresh=False, **kwargs):
+        """
+        按存档模式获取页面，以分块的形式产出响应体，供增量解析；refresh与fetch()相同
+        联网时由后台线程提前读取最多STREAM_QUEUE块（调用方处理得慢时连接也不会立即空闲），边读边写入存档；
+        存档命中时直接从存档文件分块读取，两种情况都不会把整个页面放进内存
+        """
+        if self.mode == REPLAY or (self.mode == CACHE and not refresh):
+            meta, f = self.open_record(url)
+            if self.mode == REPLAY and meta is None:
+                raise LookupError(f"存档中没有该页面: {url}")
+            if self.mode == REPLAY or self.fresh(meta and meta["fetched_at"]):
+                if self.mode == CACHE:
+                    metrics.count("archive_hits")
+                with f:
+                    yield from iter(lambda: f.read(chunk_size), b"")
+                return
+            if f:
+                f.close()
+
+        with metrics.timer("fetch"):
+            live = request_with_limit(session, url, stream=True, **kwargs)
+        if live.status_code != 200:
+            live.close()
+            raise RuntimeError(f"HTTP {live.status_code}: {url}")
+
+        chunks = queue.Queue(maxsize=STREAM_QUEUE)
+        closed = threading.Event()
+
+        def put(item):
+            # 调用方不再读取（生成器被关闭）时放弃，读线程不会永远阻塞在满的队列上
+            while not closed.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    pass
+            raise StreamClosed(url)
+
+        def body():
+            for chunk in live.iter_content(chunk_size):
+                put(chunk)
+                yield chunk
+
+        def read():
+            try:
+                if self.mode != OFF:
+                    self.save(ArchivedResponse(url, live.status_code, dict(live.headers), None,
+                                               live.encoding, time.time(), False), body())
+                else:
+                    for _ in body():
+                        pass
+                put(None)
+            except StreamClosed:
+                pass
+            except Exception as e:
+                try:
+                    put(e)
+                except StreamClosed:
+                    pass
+            finally:
+                live.close()
+
+        threading.Thread(target=read, daemon=True).start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            closed.set()
+
+class StreamClosed(Exception):
+    """stream() 的调用方提前停止读取"""
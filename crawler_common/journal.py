@@ -0,0 +1,125 @@
+import json
+import sqlite3
+import threading
+import time
+
+# 条目状态
+DISCOVERED = "discovered"
+RESOLVED = "resolved"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+SKIPPED = "skipped"  # 不会再成功的条目（如已被删除的文件），不再处理
+
+class CrawlJournal:
+    """
+    持久化的爬取记录（SQLite WAL模式）
+    记录每个发现的条目及其状态，每完成一个条目立即写入；
+    重新运行时已完成的条目通过内存集合O(1)跳过，从中断处继续
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "key TEXT PRIMARY KEY, state TEXT NOT NULL, data TEXT, error TEXT, updated REAL)"
+        )
+        # 增量发现的游标等运行状态
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._done = {row[0] for row in self._conn.execute(
+            "SELECT key FROM items WHERE state = ?", (DOWNLOADED,))}
+
+    def discover(self, key, data=None):
+        """记录新发现的条目，已存在的条目保持原状态"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO items (key, state, data, updated) VALUES (?, ?, ?, ?)",
+                (key, DISCOVERED, json.dumps(data, ensure_ascii=False) if data is not None else None, time.time()),
+            )
+
+    def mark(self, key, state, data=None, error=None):
+        """更新条目状态，data为None时保留原有数据"""
+        payload = json.dumps(data, ensure_ascii=False) if data is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO items (key, state, data, error, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+                "data = COALESCE(excluded.data, items.data), error = excluded.error, updated = excluded.updated",
+                (key, state, payload, error, time.time()),
+            )
+            if state == DOWNLOADED:
+                self._done.add(key)
+            else:
+                self._done.discard(key)
+
+    def mark_when_done(self, key, results):
+        """
+        results为下载结果（bool）或Future组成的列表，全部完成后标记条目：
+        全部成功为downloaded，否则为failed；results为None表示处理失败
+        """
+        if results is None:
+            self.mark(key, FAILED)
+            return
+        self.mark(key, RESOLVED)
+        futures = [r for r in results if hasattr(r, "add_done_callback")]
+        plain = [r for r in results if not hasattr(r, "add_done_callback")]
+        state = {"remaining": len(futures), "ok": all(plain)}
+        lock = threading.Lock()
+
+        def finish():
+            self.mark(key, DOWNLOADED if state["ok"] else FAILED)
+
+        def on_done(future):
+            with lock:
+                state["ok"] = state["ok"] and not future.cancelled() and future.exception() is None \
+                    and bool(future.result())
+                state["remaining"] -= 1
+                last = state["remaining"] == 0
+            if last:
+                finish()
+
+        if not futures:
+            finish()
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def is_done(self, key):
+        return key in self._done
+
+    def get(self, key):
+        """返回 (state, data)，不存在时返回 (None, None)"""
+        with self._lock:
+            row = self._conn.execute("SELECT state, data FROM items WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None, None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def get_meta(self, key, default=None):
+        """读取运行状态（如增量发现的游标），不存在时返回default"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        """保存运行状态，value为可JSON序列化的值"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               (key, json.dumps(value, ensure_ascii=False)))
+
+    def counts(self):
+        """各状态的条目数"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,309 @@
+import calendar
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import parse_qs, quote, unquote, urlencode, urljoin, urlparse
+
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import request_with_limit
+
+BATCH_SIZE = 50  # MediaWiki对普通用户每次查询最多50个标题
+CARGO_LIMIT = 500  # cargoquery每次返回的行数（Cargo默认上限为5000）
+LIST_LIMIT = 500  # list=logevents/recentchanges每次返回的条数（普通用户上限为500）
+# 缩略图路径：<图片根地址>/thumb/x/xy/文件名/<宽>px-文件名，对应的原图为 <图片根地址>/x/xy/文件名
+THUMB_PATTERN = re.compile(r"^(?P<base>.*?)/thumb/(?P<hash>[0-9a-f]/[0-9a-f]{2})/(?P<name>[^/]+)/[^/]+$")
+SRCSET_URL = re.compile(r"[\s,]*(\S+)")  # srcset中的一个候选地址（前面可能有分隔用的逗号和空白）
+ORIGINAL_PATTERN = re.compile(r"^(?P<base>.*?)/(?P<hash>[0-9a-f]/[0-9a-f]{2})/(?P<name>[^/]+)$")
+# 非位图文件的缩略图格式（如SVG的缩略图为PNG：<宽>px-文件名.svg.png）
+THUMB_FORMATS = {".svg": ".png", ".tif": ".jpg", ".tiff": ".jpg", ".pdf": ".jpg"}
+# 下载地址中没有扩展名时按API返回的mime类型补上
+MIME_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif", "image/webp": ".webp",
+                   "image/svg+xml": ".svg"}
+
+def title_from_url(url):
+    """从文件页链接中提取页面标题，如 /w/文件:Avg_npc_001.png 或 index.php?title=..."""
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    if "title" in query:
+        return query["title"][0].replace("_", " ")
+    path = unquote(parsed.path)
+    for prefix in ("/w/", "/wiki/"):
+        if path.startswith(prefix):
+            return path[len(prefix):].replace("_", " ")
+    return path.rsplit("/", 1)[-1].replace("_", " ")
+
+def strip_namespace(title):
+    """去掉 文件:/File: 命名空间前缀"""
+    if title.startswith(("文件:", "File:", "Image:", "图像:")):
+        return title.split(":", 1)[1].strip()
+    return title
+
+def file_name(title):
+    """文件标题对应的存储文件名：去掉命名空间，空格换成下划线，首字母大写"""
+    name = strip_namespace(unquote(title)).replace(" ", "_")
+    return name[:1].upper() + name[1:]
+
+def name_for_url(name, url, mime=None):
+    """
+    保存下载的文件时使用的文件名：name的主干加上实际下载地址的扩展名
+    （WebP或PNG缩略图与原图的扩展名不同）；地址中没有扩展名时按mime类型，都没有时沿用name的扩展名
+    """
+    stem, ext = os.path.splitext(name)
+    url_ext = os.path.splitext(urlparse(url).path)[1] if url else ""
+    return stem + (url_ext or MIME_EXTENSIONS.get(mime) or ext)
+
+def saved_name(title, url, mime=None):
+    """
+    文件标题对应的保存文件名：name_for_url(file_name(title), ...)
+    浏览器、API和推算模式都用它命名，切换解析方式不会产生第二份同样的文件
+    """
+    return name_for_url(file_name(title), url, mime)
+
+def hash_path(name):
+    """MediaWiki默认的哈希目录 x/xy（文件名MD5的前1位和前2位）"""
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+    return f"{digest[0]}/{digest[:2]}"
+
+def original_url(image_base, title):
+    """由文件标题直接推算原图地址，不需要打开文件页面或请求API"""
+    name = file_name(title)
+    return f"{image_base.rstrip('/')}/{hash_path(name)}/{quote(name)}"
+
+def thumb_to_original(url):
+    """缩略图地址换算为原图地址；不是缩略图时只去掉查询参数"""
+    url = url.split("?", 1)[0]
+    match = THUMB_PATTERN.match(url)
+    if match:
+        return f"{match['base']}/{match['hash']}/{match['name']}"
+    return url
+
+def thumb_url(url, width, webp=False):
+    """
+    原图（或其他尺寸的缩略图）地址换算为宽width的缩略图地址：<图片根地址>/thumb/x/xy/文件名/<宽>px-文件名
+    webp为True时请求服务器转换的WebP缩略图（缩略图文件名后加.webp）；不是MediaWiki图片地址时返回原地址
+    """
+    original = thumb_to_original(url)
+    match = ORIGINAL_PATTERN.match(original)
+    if not match:
+        return original
+    name = match["name"]
+    thumb = f"{width}px-{name}" + THUMB_FORMATS.get(os.path.splitext(unquote(name))[1].lower(), "")
+    return f"{match['base']}/thumb/{match['hash']}/{name}/{thumb}" + (".webp" if webp else "")
+
+_no_webp = set()  # 请求WebP缩略图失败过的主机，之后不再尝试
+
+def sized_urls(url, max_width=None, webp=False, width=None, thumb=None):
+    """
+    按分辨率策略列出依次尝试的下载地址：[WebP缩略图, 缩略图, 原图]
+    max_width为空，或已知原图宽度width不超过max_width时只有原图；thumb为API返回的缩略图地址，没有时按路径规则推算
+    服务器不提供WebP、或原图比max_width还窄（不生成缩略图）时请求失败，依次退回后面的地址
+    """
+    original = thumb_to_original(url)
+    if not max_width or (width and width <= max_width):
+        return [original]
+    thumb = thumb or thumb_url(original, max_width)
+    if thumb == original:
+        return [original]
+    urls = [thumb, original]
+    if webp and urlparse(thumb).netloc not in _no_webp:
+        urls.insert(0, thumb + ".webp")
+    return urls
+
+def first_available(download, urls):
+    """依次调用 download(地址) 直到成功，返回成功的地址，全部失败时返回None"""
+    for url in urls:
+        if download(url):
+            return url
+        if url.endswith(".webp"):
+            _no_webp.add(urlparse(url).netloc)
+    return None
+
+def sized_name(name, max_width=None):
+    """限制宽度时输出目录和记录文件加上宽度后缀（如 NPC立绘_1024px、NPC立绘_1024px.journal.db），不与原图混在一起"""
+    if not max_width:
+        return name
+    head, dot, tail = name.partition(".")
+    return f"{head}_{max_width}px{dot}{tail}"
+
+def parse_srcset(srcset):
+    """
+    解析srcset为 [(地址, 描述符数值)]，描述符如 1.5x、800w，省略时为1x
+    按HTML规范切分：地址是一段不含空白的字符（末尾的逗号表示没有描述符），描述符到下一个逗号为止
+    """
+    candidates = []
+    text = srcset or ""
+    pos = 0
+    while True:
+        match = SRCSET_URL.match(text, pos)
+        if not match:
+            break
+        url, pos = match.group(1), match.end()
+        descriptor = ""
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            end = text.find(",", pos)
+            end = len(text) if end < 0 else end
+            descriptor, pos = text[pos:end].strip(), end
+        try:
+            value = float(descriptor[:-1]) if descriptor else 1.0
+        except ValueError:
+            value = 1.0
+        candidates.append((url, value))
+    return candidates
+
+def best_image_url(src, srcset=None, base=None):
+    """从img的src和srcset中选出最大的候选，补全为绝对地址并换算为原图地址"""
+    candidates = parse_srcset(srcset)
+    if src:
+        candidates.insert(0, (src, 1.0))
+    if not candidates:
+        return None
+    url = max(candidates, key=lambda candidate: candidate[1])[0]
+    if base:
+        url = urljoin(base, url)
+    elif url.startswith("//"):
+        url = "https:" + url
+    return thumb_to_original(url)
+
+def resolve_file_titles(session, api_url, titles, batch_size=BATCH_SIZE, max_width=None):
+    """
+    通过 api.php?action=query&prop=imageinfo 批量解析文件
+    返回 {原始标题: {'url', 'size', 'width', 'height', 'mime', 'sha1', 'thumb_url'}}，不存在的文件不会出现在结果中
+    传入max_width时同时请求该宽度的缩略图地址（iiurlwidth），thumb_url为缩略图地址，否则为None
+    """
+    results = {}
+    titles = list(dict.fromkeys(titles))
+
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "prop": "imageinfo",
+            "iiprop": "url|size|mime|sha1",
+            "redirects": "1",
+            "titles": "|".join(batch),
+        }
+        if max_width:
+            params["iiurlwidth"] = max_width
+        with metrics.timer("resolve"):
+            response = request_with_limit(session, api_url, params=params, timeout=30)
+            response.raise_for_status()
+            query = response.json().get("query", {})
+
+        # 记录API规范化/重定向后的标题与原始标题的对应关系
+        origin = {title: title for title in batch}
+        for key in ("normalized", "redirects"):
+            for item in query.get(key, []):
+                origin[item["to"]] = origin.get(item["from"], item["from"])
+
+        for page in query.get("pages", []):
+            info = (page.get("imageinfo") or [None])[0]
+            if page.get("missing") or not info:
+                continue
+            results[origin.get(page["title"], page["title"])] = {
+                "url": info["url"],
+                "size": info.get("size"),
+                "width": info.get("width"),
+                "height": info.get("height"),
+                "mime": info.get("mime"),
+                "sha1": info.get("sha1"),
+                # 原图不比max_width宽时API返回的thumburl就是原图地址
+                "thumb_url": info.get("thumburl") if info.get("thumburl") != info["url"] else None,
+            }
+
+        print(f"已解析 {min(start + batch_size, len(titles))}/{len(titles)} 个文件")
+
+    return results
+
+def cargo_query(session, api_url, tables, fields, where=None, limit=CARGO_LIMIT, fetch=None):
+    """
+    通过 api.php?action=cargoquery 分页查询Cargo表，逐行产出 {字段: 值}
+    fetch(url) 可替换默认的请求方式（如经过页面存档），返回带text属性的响应
+    """
+    offset = 0
+    while True:
+        params = {"action": "cargoquery", "format": "json", "tables": tables, "fields": fields,
+                  "limit": limit, "offset": offset}
+        if where:
+            params["where"] = where
+        url = f"{api_url}?{urlencode(params)}"
+        with metrics.timer("resolve"):
+            response = fetch(url) if fetch else request_with_limit(session, url, timeout=30)
+            response.raise_for_status()
+            data = json.loads(response.text)
+        if "error" in data:
+            raise RuntimeError(data["error"].get("info") or data["error"])
+
+        rows = [item.get("title", {}) for item in data.get("cargoquery", [])]
+        yield from rows
+        if len(rows) < limit:
+            return
+        offset += limit
+
+def api_timestamp(seconds=None):
+    """MediaWiki API使用的UTC时间戳，如 2024-01-01T00:00:00Z"""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() if seconds is None else seconds))
+
+def parse_api_timestamp(value):
+    """api_timestamp 的逆运算，返回Unix时间"""
+    return calendar.timegm(time.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+def api_query(session, api_url, params, fetch=None):
+    """
+    发出 action=query 请求并按API返回的continue参数翻页，逐页产出query部分
+    fetch(url) 可替换默认的请求方式（如经过页面存档），返回带text属性的响应
+    """
+    params = dict(params, action="query", format="json", formatversion="2")
+    extra = {}
+    while True:
+        url = f"{api_url}?{urlencode(dict(params, **extra))}"
+        with metrics.timer("resolve"):
+            response = fetch(url) if fetch else request_with_limit(session, url, timeout=30)
+            response.raise_for_status()
+            data = json.loads(response.text)
+        if "error" in data:
+            raise RuntimeError(data["error"].get("info") or data["error"])
+        yield data.get("query", {})
+        if "continue" not in data:
+            return
+        extra = data["continue"]
+
+def iter_uploads(session, api_url, since, fetch=None):
+    """
+    上传日志（list=logevents&letype=upload）中since（api_timestamp格式）之后的记录，按时间从早到晚产出
+    {'title', 'timestamp', 'action'}；action为upload（新文件）、overwrite（上传新版本）或revert
+    """
+    params = {"list": "logevents", "letype": "upload", "ledir": "newer", "lestart": since,
+              "leprop": "title|timestamp|type|ids", "lelimit": LIST_LIMIT}
+    for query in api_query(session, api_url, params, fetch):
+        for event in query.get("logevents", []):
+            yield {"title": event["title"], "timestamp": event["timestamp"], "action": event.get("action")}
+
+def iter_recent_changes(session, api_url, since, namespace=0, fetch=None):
+    """
+    最近更改（list=recentchanges）中since之后新建或编辑过的页面，按时间从早到晚产出 {'title', 'timestamp', 'type'}
+    最近更改只保留一段时间（MediaWiki默认90天），更早的cursor需要完整爬取
+    """
+    params = {"list": "recentchanges", "rcdir": "newer", "rcstart": since, "rcnamespace": namespace,
+              "rctype": "edit|new", "rcprop": "title|timestamp|ids", "rclimit": LIST_LIMIT}
+    for query in api_query(session, api_url, params, fetch):
+        for change in query.get("recentchanges", []):
+            yield {"title": change["title"], "timestamp": change["timestamp"], "type": change.get("type")}
+
+def file_usage(session, api_url, titles, namespace=0, batch_size=BATCH_SIZE, fetch=None):
+    """通过 prop=fileusage 批量查询使用这些文件的页面，返回 {文件标题: [页面标题]}"""
+    usage = {}
+    titles = list(dict.fromkeys(titles))
+    for start in range(0, len(titles), batch_size):
+        params = {"prop": "fileusage", "funamespace": namespace, "fulimit": "max",
+                  "titles": "|".join(titles[start:start + batch_size])}
+        for query in api_query(session, api_url, params, fetch):
+            for page in query.get("pages", []):
+                pages = usage.setdefault(page["title"], [])
+                pages.extend(item["title"] for item in page.get("fileusage", []))
+    return usage
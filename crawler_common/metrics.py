@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# 各阶段耗时直方图的桶上限（秒），与Prometheus的histogram格式一致
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROGRESS_INTERVAL = 5  # 进度行的输出间隔（秒）
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估算分位数（取所在桶的上限，最后一个桶取最大值）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 4),
+        }
+
+class Metrics:
+    """
+    爬虫运行指标：各阶段（navigate/extract/resolve/fetch/download等）的耗时直方图、
+    计数器（字节数、重试次数、跳过数等）和按阶段分类的错误，
+    可导出为JSON或Prometheus文本格式，并可在后台定期输出带速率和剩余时间的进度行
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress_thread = None
+        self._progress_stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.histograms = {}
+            self.counters = {}
+            self.errors = {}
+            self.total = 0
+            self.completed = 0
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """记录代码块的耗时；抛出异常时按异常类型记一次该阶段的错误"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, type(e).__name__)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def error(self, stage, kind):
+        with self._lock:
+            key = (stage, kind)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def add_total(self, amount=1):
+        """增加预计要处理的条目数（流式发现时可以边发现边增加）"""
+        with self._lock:
+            self.total += amount
+
+    def complete(self, amount=1):
+        with self._lock:
+            self.completed += amount
+
+    # ---- 报告 ----
+
+    def report(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            return {
+                "started": self.started,
+                "elapsed": round(elapsed, 3),
+                "total": self.total,
+                "completed": self.completed,
+                "items_per_s": round(self.completed / elapsed, 3) if elapsed else None,
+                "stages": {stage: h.to_dict() for stage, h in self.histograms.items()},
+                "counters": dict(self.counters),
+                "errors": [{"stage": stage, "error": kind, "count": n}
+                           for (stage, kind), n in sorted(self.errors.items())],
+            }
+
+    def to_prometheus(self, prefix="crawler"):
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, h in self.histograms.items():
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            lines.append(f"# TYPE {prefix}_events_total counter")
+            for name, value in self.counters.items():
+                lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+            lines.append(f"# TYPE {prefix}_errors_total counter")
+            for (stage, kind), n in sorted(self.errors.items()):
+                lines.append(f'{prefix}_errors_total{{stage="{stage}",error="{kind}"}} {n}')
+            lines.append(f"# TYPE {prefix}_items_completed gauge")
+            lines.append(f"{prefix}_items_completed {self.completed}")
+            lines.append(f"# TYPE {prefix}_items_total gauge")
+            lines.append(f"{prefix}_items_total {self.total}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        """保存运行报告：.prom 后缀为Prometheus文本格式，其余为JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        print(f"运行报告已保存: {path}")
+
+    def summary(self):
+        """按总耗时排序的各阶段摘要，最前面的通常就是瓶颈"""
+        report = self.report()
+        lines = [f"共 {report['elapsed']:.1f} 秒，完成 {report['completed']}/{report['total']}"]
+        stages = sorted(report["stages"].items(), key=lambda item: item[1]["sum"], reverse=True)
+        for stage, h in stages:
+            lines.append(f"  {stage:<10} {h['count']:>6} 次  合计 {h['sum']:>8.1f}s  "
+                         f"平均 {h['mean']:.3f}s  p90≤{h['p90']}s  最大 {h['max']:.2f}s")
+        for name, value in sorted(report["counters"].items()):
+            lines.append(f"  {name}: {value}")
+        for e in report["errors"]:
+            lines.append(f"  错误 {e['stage']}/{e['error']}: {e['count']}")
+        return "\n".join(lines)
+
+    # ---- 进度行 ----
+
+    def progress_line(self, unit="张"):
+        with self._lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            completed, total = self.completed, self.total
+            mb = self.counters.get("bytes", 0) / 1024 / 1024
+        rate = completed / elapsed
+        line = f"[进度] {completed}/{total} {unit}"
+        if total:
+            line += f" ({100 * completed / total:.0f}%)"
+        line += f" | {rate:.1f} {unit}/s | {mb / elapsed:.2f} MB/s"
+        if total and rate > 0 and completed < total:
+            eta = int((total - completed) / rate)
+            line += f" | 预计剩余 {eta // 3600:02d}:{eta % 3600 // 60:02d}:{eta % 60:02d}"
+        return line
+
+    def start_progress(self, unit="张", interval=PROGRESS_INTERVAL):
+        """在后台线程中每隔interval秒输出一次进度行"""
+        if self._progress_thread:
+            return
+        self._progress_stop.clear()
+
+        def loop():
+            while not self._progress_stop.wait(interval):
+                print(self.progress_line(unit))
+
+        self._progress_thread = threading.Thread(target=loop, daemon=True)
+        self._progress_thread.start()
+
+    def stop_progress(self):
+        if self._progress_thread:
+            self._progress_stop.set()
+            self._progress_thread.join()
+            self._progress_thread = None
+
+# 各模块共用的指标
+metrics = Metrics()
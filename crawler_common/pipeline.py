@@ -0,0 +1,80 @@
+import queue
+import threading
+
+_DONE = object()
+
+class Stage:
+    def __init__(self, name, func, workers, queue_size):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.errors = 0
+        self.finished = 0
+
+class Pipeline:
+    """
+    由有界队列连接的多阶段流水线
+    每个阶段有自己的工作线程数，func(item)返回交给下一阶段的若干条目（可以为空）；
+    队列满时上游阻塞等待（背压），内存占用不随任务总数增长
+    """
+
+    def __init__(self, queue_size=32):
+        self.queue_size = queue_size
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, func, workers=1, queue_size=None):
+        self.stages.append(Stage(name, func, workers, queue_size or self.queue_size))
+        return self
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                break
+            try:
+                outputs = stage.func(item) or ()
+                for output in outputs:
+                    if next_stage:
+                        next_stage.queue.put(output)
+                with self._lock:
+                    stage.processed += 1
+            except Exception as e:
+                print(f"[{stage.name}] 处理出错: {str(e)}")
+                with self._lock:
+                    stage.errors += 1
+
+        # 本阶段最后一个结束的线程通知下一阶段结束
+        with self._lock:
+            stage.finished += 1
+            last = stage.finished == stage.workers
+        if last and next_stage:
+            for _ in range(next_stage.workers):
+                next_stage.queue.put(_DONE)
+
+    def run(self, source):
+        """在当前线程中迭代source，把条目送入第一阶段，直到所有阶段处理完毕"""
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index,), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        try:
+            for item in source:
+                first.queue.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+    def summary(self):
+        return ", ".join(f"{s.name} {s.processed}" + (f"（出错 {s.errors}）" if s.errors else "")
+                         for s in self.stages)
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Pillow为可选依赖，未安装时后处理不可用，爬虫照常运行
+try:
+    from PIL import Image
+    from PIL.PngImagePlugin import PngInfo
+except ImportError:
+    Image = None
+
+THUMB_SIZES = (256,)  # 预览图的最长边（像素），可配置多个尺寸
+THUMB_FORMAT = "webp"  # 预览图格式："webp" 或 "png"
+THUMB_DIR = "预览图"
+MAX_PIXELS = 64 * 1024 * 1024  # 超过这个像素数的图片不处理，避免占满内存
+RECOMPRESS_MODES = ("1", "L", "LA", "P", "RGB", "RGBA")  # 重新保存不会改变位深的模式，16位等其他模式不重新压缩
+
+def file_sha1(path, chunk_size=1024 * 1024):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def thumb_path(path, size, thumb_dir, thumb_format):
+    """预览图路径：thumb_dir/<尺寸>/<原相对路径>.<格式>"""
+    relative = os.path.relpath(path)
+    if relative.startswith(".."):
+        relative = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return os.path.join(thumb_dir, str(size), f"{os.path.splitext(relative)[0]}.{thumb_format}")
+
+def can_recompress(img):
+    """只重新压缩能原样保存的PNG：动图（APNG）只会保存第一帧，带ICC配置的图片会丢失色彩配置"""
+    return (img.format == "PNG" and getattr(img, "n_frames", 1) == 1 and img.mode in RECOMPRESS_MODES
+            and not img.info.get("icc_profile"))
+
+def same_pixels(img, path):
+    """重新压缩的结果与原图像素（和调色板）完全一致"""
+    with Image.open(path) as saved:
+        return (saved.mode == img.mode and saved.size == img.size and saved.tobytes() == img.tobytes()
+                and saved.getpalette() == img.getpalette())
+
+def process_image(path, recompress, thumb_sizes, thumb_dir, thumb_format):
+    """
+    在工作进程中处理一张图片，不修改path本身：
+    PNG无损优化后写入 path.opt（像素不变且更小时才保留，文本信息随之保存），并生成各尺寸的预览图
+    返回图片的真实格式、尺寸和处理结果，由主进程替换文件并更新索引
+    """
+    result = {"path": path, "original_size": os.path.getsize(path), "optimized": None, "thumbnails": []}
+    with Image.open(path) as img:
+        result.update(format=img.format, width=img.width, height=img.height)
+        if img.width * img.height > MAX_PIXELS:
+            return result
+        img.load()
+
+        if recompress and can_recompress(img):
+            result["original_sha1"] = file_sha1(path)
+            temp = f"{path}.opt"
+            text = PngInfo()
+            for key, value in getattr(img, "text", {}).items():
+                text.add_text(key, value)
+            img.save(temp, "PNG", optimize=True, pnginfo=text)
+            size = os.path.getsize(temp)
+            if size < result["original_size"] and same_pixels(img, temp):
+                result.update(optimized=temp, size=size, sha1=file_sha1(temp))
+            else:
+                os.remove(temp)
+
+        source_mtime = os.path.getmtime(path)
+        for max_side in thumb_sizes:
+            target = thumb_path(path, max_side, thumb_dir, thumb_format)
+            if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                result["thumbnails"].append(target)
+                continue
+            thumb = img.copy()
+            if thumb.mode not in ("RGB", "RGBA"):
+                thumb = thumb.convert("RGBA")
+            thumb.thumbnail((max_side, max_side))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if thumb_format == "webp":
+                thumb.save(target, "WEBP", quality=85, method=4)
+            else:
+                thumb.save(target, "PNG", optimize=True)
+            result["thumbnails"].append(target)
+    return result
+
+class PostProcessor:
+    """
+    下载完成后的图片后处理（进程池，不占用下载线程）
+    - PNG无损重新压缩，更小时替换原文件（同步更新资源索引和内容仓库）
+    - 记录图片真实格式和尺寸（db_path中的images表）
+    - 按thumb_sizes生成预览图
+    已处理且文件未变化的图片不会重复处理
+    """
+
+    def __init__(self, db_path, workers=None, recompress=True, thumb_sizes=THUMB_SIZES,
+                 thumb_dir=THUMB_DIR, thumb_format=THUMB_FORMAT, index=None, store=None):
+        self.enabled = Image is not None
+        if not self.enabled:
+            print("未安装Pillow，跳过图片后处理（pip install Pillow）")
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.options = (recompress, tuple(thumb_sizes), thumb_dir, thumb_format)
+        self.index = index
+        self.store = store
+        self.saved_bytes = 0
+        self.processed = 0
+        self.failed = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, format TEXT, width INTEGER, "
+            "height INTEGER, original_size INTEGER, size INTEGER, thumbnails TEXT, updated REAL)"
+        )
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT format, width, height, original_size, size, thumbnails FROM images WHERE path = ?",
+                (os.path.abspath(path),),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("format", "width", "height", "original_size", "size"), row),
+                    thumbnails=json.loads(row[5] or "[]"))
+
+    def submit(self, path):
+        """把下载好的图片交给进程池；已处理过且大小未变的跳过"""
+        if not self.enabled or not os.path.exists(path):
+            return None
+        record = self.get(path)
+        if record and record["size"] == os.path.getsize(path):
+            return None
+        with self._lock:
+            if self._executor is None:
+                # 首次使用时才启动进程池，导入脚本时不会创建子进程
+                self._executor = ProcessPoolExecutor(self.workers)
+            future = self._executor.submit(process_image, path, *self.options)
+        future.add_done_callback(self._finish)
+        return future
+
+    def _finish(self, future):
+        """在主进程中替换优化后的文件、更新索引并记录结果"""
+        try:
+            result = future.result()
+            path = result["path"]
+            size = result["original_size"]
+            if result["optimized"]:
+                self._replace(path, result)
+                size = result["size"]
+                with self._lock:
+                    self.saved_bytes += result["original_size"] - size
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO images (path, format, width, height, original_size, size, "
+                    "thumbnails, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (os.path.abspath(path), result["format"], result["width"], result["height"],
+                     result["original_size"], size, json.dumps(result["thumbnails"], ensure_ascii=False),
+                     time.time()),
+                )
+                self.processed += 1
+        except Exception as e:
+            print(f"图片后处理失败: {str(e)}")
+            with self._lock:
+                self.failed += 1
+
+    def _replace(self, path, result):
+        if self.store:
+            # 新内容存入仓库并重新链接；旧内容不再被任何文件引用时删除
+            self.store.put(result["optimized"], result["sha1"], path)
+            self.store.discard_unused(result["original_sha1"])
+        else:
+            os.replace(result["optimized"], path)
+        # 资源索引中的本地大小和哈希随之更新，增量模式下不会因大小变化而重新下载
+        if self.index and self.index.get(path):
+            self.index.update(path, local_size=result["size"], sha1=result["sha1"])
+
+    def close(self):
+        """等待所有后处理完成"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+    def summary(self):
+        return (f"后处理 {self.processed} 张，失败 {self.failed} 张，"
+                f"无损压缩节省 {self.saved_bytes / 1024 / 1024:.1f} MB")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def iter_images(folders, extensions=(".png", ".jpg", ".jpeg", ".webp", ".gif")):
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                if name.lower().endswith(extensions):
+                    yield os.path.join(root, name)
+
+if __name__ == "__main__":
+    # 对已下载的目录补做后处理，例如：python -m crawler_common.postprocess 立绘 插画 干员立绘
+    import argparse
+
+    from crawler_common.blob_store import BlobStore
+    from crawler_common.download import AssetIndex
+
+    parser = argparse.ArgumentParser(description="对已下载的图片做无损压缩并生成预览图")
+    parser.add_argument("folders", nargs="+")
+    parser.add_argument("--db", default="images.db", help="记录图片格式和尺寸的数据库")
+    parser.add_argument("--index", help="对应的资源索引（*.assets.db），替换文件后同步更新")
+    parser.add_argument("--blobs", help="内容仓库目录（如 .blobs），文件为硬链接时需要指定")
+    parser.add_argument("--thumb-sizes", default=",".join(map(str, THUMB_SIZES)), help="预览图尺寸，逗号分隔")
+    parser.add_argument("--no-recompress", action="store_true", help="只记录信息和生成预览图")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    with PostProcessor(args.db, workers=args.workers, recompress=not args.no_recompress,
+                       thumb_sizes=[int(s) for s in args.thumb_sizes.split(",") if s],
+                       index=AssetIndex(args.index) if args.index else None,
+                       store=BlobStore(args.blobs) if args.blobs else None) as processor:
+        for image_path in iter_images(args.folders):
+            processor.submit(image_path)
+    print(processor.summary())
@@ -0,0 +1,346 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+from crawler_common import rate_limit
+from crawler_common.browser import make_chrome
+from crawler_common.metrics import metrics
+from crawler_common.rate_limit import AdaptiveRateLimiter, request_with_limit
+
+# SOCKS代理需要PySocks（pip install requests[socks]），未安装时只能使用HTTP代理
+try:
+    import socks  # noqa: F401
+    HAS_SOCKS = True
+except ImportError:
+    HAS_SOCKS = False
+
+PER_PROXY_CONCURRENCY = 4  # 每个代理同时进行的请求数
+MAX_FAILURES = 3  # 连续连接失败多少次后移除代理
+BAN_STATUS = (403, 429)  # 视为该出口被封禁的状态码
+BAN_THRESHOLD = 3  # 连续多少次被封禁后暂停使用该代理
+BAN_COOLDOWN = 600  # 暂停使用被封禁代理的时长（秒），之后由健康检查决定是否恢复
+SLOW_LATENCY = 10.0  # 平均响应时间超过该值（秒）的代理视为过慢并移除
+MIN_SAMPLES = 5  # 至少多少次请求后才按平均响应时间判断
+HEALTH_URL = "https://prts.wiki/api.php?action=query&meta=siteinfo&format=json"
+HEALTH_INTERVAL = 300  # 后台健康检查的间隔（秒）
+HEALTH_TIMEOUT = 10
+
+# 代理状态
+ACTIVE = "active"
+BANNED = "banned"  # 暂停使用，冷却后由健康检查恢复
+REMOVED = "removed"  # 连续失败或过慢，健康检查通过后恢复
+
+class Proxy:
+    """一个出口：代理地址（None为直接连接）及其并发、限速和健康状态"""
+
+    def __init__(self, url, limiter=None):
+        self.url = url
+        # 每个出口有独立的按主机限速器，服务器的单IP限制按出口分别计算
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.state = ACTIVE
+        self.in_flight = 0
+        self.drivers = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.consecutive_bans = 0
+        self.banned_until = 0.0
+        self.latency = None  # 响应时间的指数移动平均
+        self.samples = 0  # 计入latency的请求数（健康检查恢复后重新计算）
+
+    @property
+    def name(self):
+        return self.url or "direct"
+
+    @property
+    def requests_proxies(self):
+        return {"http": self.url, "https": self.url} if self.url else None
+
+    def rank(self):
+        # 优先选择并发少、最近没有失败或被封禁、响应快的出口
+        return self.in_flight, self.consecutive_failures + self.consecutive_bans, self.latency or 0
+
+    @property
+    def available(self):
+        # 被封禁的出口冷却结束后也要等健康检查通过才恢复
+        return self.state == ACTIVE
+
+    def to_dict(self):
+        return {"proxy": self.name, "state": self.state, "in_flight": self.in_flight, "drivers": self.drivers,
+                "requests": self.requests, "failures": self.failures,
+                "latency": round(self.latency, 3) if self.latency is not None else None}
+
+class ProxyPool:
+    """
+    出口代理池：requests会话和浏览器的流量分摊到多个HTTP/SOCKS代理上
+    - 每个代理有并发上限和独立的自适应限速器，请求交给空闲且响应最快的代理
+    - 连接失败的请求换一个代理重试；连续失败或平均响应过慢的代理被移除，连续被封禁（403/429）的代理暂停使用
+    - 健康检查（可在后台定期运行）恢复已经可用的代理
+    """
+
+    def __init__(self, proxies, include_direct=False, max_concurrency=PER_PROXY_CONCURRENCY,
+                 health_url=HEALTH_URL):
+        self.max_concurrency = max_concurrency
+        self.health_url = health_url
+        self.proxies = []
+        for url in proxies:
+            if urlparse(url).scheme.startswith("socks") and not HAS_SOCKS:
+                print(f"未安装PySocks，跳过SOCKS代理 {url}（pip install requests[socks]）")
+                continue
+            self.proxies.append(Proxy(url))
+        if include_direct:
+            # 直接连接与未经代理的浏览器共用全局限速器
+            self.proxies.append(Proxy(None, rate_limit.limiter))
+        if not self.proxies:
+            raise ValueError("代理池为空")
+        self._cond = threading.Condition()
+        self._driver_proxies = {}
+        self._health_thread = None
+        self._health_stop = threading.Event()
+
+    # ---- 请求 ----
+
+    def acquire(self, timeout=None):
+        """取得一个空闲的出口，所有出口都忙时等待；没有可用出口时抛出RuntimeError"""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while True:
+                usable = [p for p in self.proxies if p.available]
+                if not usable:
+                    raise RuntimeError("没有可用的代理：全部被移除或封禁")
+                idle = [p for p in usable if p.in_flight < self.max_concurrency]
+                if idle:
+                    proxy = min(idle, key=Proxy.rank)
+                    proxy.in_flight += 1
+                    return proxy
+                if deadline and time.monotonic() >= deadline:
+                    raise TimeoutError("等待空闲代理超时")
+                self._cond.wait(1)
+
+    def release(self, proxy, status=None, latency=None, error=False):
+        """归还出口并记录请求结果，必要时移除或暂停该代理"""
+        with self._cond:
+            proxy.in_flight -= 1
+            self._record(proxy, status, latency, error)
+            self._cond.notify_all()
+
+    def _record(self, proxy, status, latency, error):
+        proxy.requests += 1
+        if proxy.url is None:
+            return  # 直接连接不会被移除
+        if error:
+            proxy.failures += 1
+            proxy.consecutive_failures += 1
+            if proxy.consecutive_failures >= MAX_FAILURES:
+                self._disable(proxy, REMOVED, f"连续 {proxy.consecutive_failures} 次连接失败")
+            return
+        proxy.consecutive_failures = 0
+        if latency is not None:
+            proxy.latency = latency if proxy.latency is None else proxy.latency * 0.8 + latency * 0.2
+            proxy.samples += 1
+            # 慢的出口也比没有出口好，最后一个可用的出口不因为慢而移除
+            others = any(p is not proxy and p.available for p in self.proxies)
+            if proxy.samples >= MIN_SAMPLES and proxy.latency > SLOW_LATENCY and others:
+                self._disable(proxy, REMOVED, f"平均响应时间 {proxy.latency:.1f} 秒")
+        if status in BAN_STATUS:
+            proxy.consecutive_bans += 1
+            if proxy.consecutive_bans >= BAN_THRESHOLD:
+                proxy.banned_until = time.monotonic() + BAN_COOLDOWN
+                self._disable(proxy, BANNED, f"连续 {proxy.consecutive_bans} 次返回 {status}")
+        elif status is not None:
+            proxy.consecutive_bans = 0
+
+    def _disable(self, proxy, state, reason):
+        if proxy.state != state:
+            proxy.state = state
+            metrics.count(f"proxy_{state}")
+            print(f"代理 {proxy.name} 已{'暂停使用' if state == BANNED else '移除'}: {reason}")
+
+    def request(self, session, url, method="GET", retries=3, **kwargs):
+        """
+        经过代理池发出请求：出口连接失败或被限流/封禁时换一个出口重试
+        stream=True时在响应关闭后才归还出口，并发上限同样约束正文的传输
+        """
+        last_error = None
+        for attempt in range(retries + 1):
+            proxy = self.acquire()
+            try:
+                response = request_with_limit(session, url, method, retries=0, limiter=proxy.limiter,
+                                              proxies=proxy.requests_proxies, **kwargs)
+            except Exception as e:
+                self.release(proxy, error=True)
+                metrics.error("proxy", type(e).__name__)
+                last_error = e
+                continue
+
+            # 只计发出请求到收到响应头的时间，不含限速器的等待
+            latency = response.elapsed.total_seconds()
+            if response.status_code in BAN_STATUS + rate_limit.THROTTLE_STATUS and attempt < retries:
+                response.close()
+                self.release(proxy, response.status_code, latency)
+                metrics.count("proxy_retries")
+                continue
+            if kwargs.get("stream"):
+                self._release_on_close(response, proxy, latency)
+            else:
+                self.release(proxy, response.status_code, latency)
+            return response
+        raise last_error
+
+    def _release_on_close(self, response, proxy, latency):
+        close = response.close
+        released = []
+
+        def close_and_release():
+            close()
+            if not released:
+                released.append(True)
+                self.release(proxy, response.status_code, latency)
+
+        response.close = close_and_release
+
+    # ---- 浏览器 ----
+
+    def chrome_factory(self, headless=True, driver_path=None, lean=True):
+        """
+        供DriverPool使用的浏览器工厂：每个新浏览器使用当前分配浏览器最少的出口
+        浏览器关闭时归还出口；factory.usable(driver)为False（出口已被移除或暂停）时DriverPool关闭并重建该浏览器
+        """
+        def factory():
+            with self._cond:
+                usable = [p for p in self.proxies if p.available]
+                if not usable:
+                    raise RuntimeError("没有可用的代理：全部被移除或封禁")
+                proxy = min(usable, key=lambda p: (p.drivers,) + p.rank())
+                proxy.drivers += 1
+            try:
+                driver = make_chrome(headless=headless, driver_path=driver_path, lean=lean, proxy=proxy.url)
+            except Exception:
+                with self._cond:
+                    proxy.drivers -= 1
+                raise
+            with self._cond:
+                self._driver_proxies[id(driver)] = proxy
+            self._forget_on_quit(driver)
+            return driver
+        factory.usable = self.driver_usable
+        return factory
+
+    def _forget_on_quit(self, driver):
+        quit = driver.quit
+
+        def forget_and_quit():
+            with self._cond:
+                proxy = self._driver_proxies.pop(id(driver), None)
+                if proxy:
+                    proxy.drivers -= 1
+            quit()
+
+        driver.quit = forget_and_quit
+
+    def owns(self, driver):
+        """driver是否由代理池创建（且尚未关闭）"""
+        with self._cond:
+            return id(driver) in self._driver_proxies
+
+    def driver_usable(self, driver):
+        """浏览器所用的出口是否仍可用（不是由代理池创建的浏览器总是可用）"""
+        with self._cond:
+            proxy = self._driver_proxies.get(id(driver))
+            return proxy is None or proxy.available
+
+    def navigate(self, driver, url):
+        """
+        经过浏览器所用的出口打开页面：占用该出口的一个并发名额，结果（状态码、耗时、连接失败）与requests的请求一样计入该出口
+        出口已被移除或暂停时抛出RuntimeError，浏览器归还后由DriverPool重建
+        """
+        with self._cond:
+            proxy = self._driver_proxies[id(driver)]
+            while proxy.available and proxy.in_flight >= self.max_concurrency:
+                self._cond.wait(1)
+            if not proxy.available:
+                raise RuntimeError(f"浏览器所用的代理 {proxy.name} 已不可用")
+            proxy.in_flight += 1
+        try:
+            status, latency = rate_limit.load_page(driver, url, proxy.limiter)
+        except Exception as e:
+            self.release(proxy, error=True)
+            metrics.error("proxy", type(e).__name__)
+            raise
+        self.release(proxy, status, latency)
+        return status
+
+    # ---- 健康检查 ----
+
+    def check_health(self, url=None, timeout=HEALTH_TIMEOUT):
+        """逐个检查代理：通过的恢复使用，失败的移除；被封禁且仍在冷却中的不检查"""
+        import requests
+
+        url = url or self.health_url
+        now = time.monotonic()
+        for proxy in self.proxies:
+            if proxy.url is None or (proxy.state == BANNED and now < proxy.banned_until):
+                continue
+            start = time.monotonic()
+            try:
+                response = requests.get(url, proxies=proxy.requests_proxies, timeout=timeout)
+                ok = response.status_code < 400
+                reason = f"状态码 {response.status_code}"
+            except Exception as e:
+                ok = False
+                reason = type(e).__name__
+            latency = time.monotonic() - start
+            with self._cond:
+                if ok:
+                    if proxy.state != ACTIVE:
+                        print(f"代理 {proxy.name} 已恢复")
+                    proxy.state = ACTIVE
+                    proxy.consecutive_failures = 0
+                    proxy.consecutive_bans = 0
+                    proxy.latency = latency
+                    proxy.samples = 0
+                    self._cond.notify_all()
+                else:
+                    self._disable(proxy, REMOVED, f"健康检查失败（{reason}）")
+        return self.status()
+
+    def start_health_checks(self, interval=HEALTH_INTERVAL):
+        if self._health_thread:
+            return
+        self._health_stop.clear()
+
+        def loop():
+            while not self._health_stop.wait(interval):
+                try:
+                    self.check_health()
+                except Exception as e:
+                    print(f"代理健康检查出错: {str(e)}")
+
+        self._health_thread = threading.Thread(target=loop, daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        if self._health_thread:
+            self._health_stop.set()
+            self._health_thread.join()
+            self._health_thread = None
+
+    def status(self):
+        with self._cond:
+            return [proxy.to_dict() for proxy in self.proxies]
+
+def use_proxies(proxies, include_direct=False, max_concurrency=PER_PROXY_CONCURRENCY, check=True,
+                health_url=HEALTH_URL, health_interval=HEALTH_INTERVAL):
+    """
+    让所有经过 request_with_limit / navigate 的请求使用代理池，返回ProxyPool；proxies为空时不做任何改变
+    check为True时先做一次健康检查，并在后台每health_interval秒检查一次
+    """
+    if not proxies:
+        return None
+    pool = ProxyPool(proxies, include_direct=include_direct, max_concurrency=max_concurrency, health_url=health_url)
+    if check:
+        pool.check_health()
+        pool.start_health_checks(health_interval)
+    rate_limit.egress = pool
+    print(f"使用 {len(pool.proxies)} 个出口: {', '.join(p.name for p in pool.proxies)}")
+    return pool
@@ -0,0 +1,187 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from crawler_common.metrics import metrics
+
+# 各主机的初始速率（每秒请求数），运行中会根据服务器状态自动调整
+HOST_RATES = {
+    "prts.wiki": 1.0,
+    "media.prts.wiki": 4.0,
+    "torappu.prts.wiki": 4.0,
+    "azurlane.koumakan.jp": 1.0,
+    "azurlane.netojuu.com": 4.0,
+}
+DEFAULT_RATE = 1.0
+MIN_RATE = 0.1
+MAX_RATE = 20.0
+BURST = 4  # 令牌桶容量
+TARGET_LATENCY = 1.5  # 响应时间低于该值（秒）时才提速
+THROTTLE_STATUS = (429, 503)
+
+def parse_retry_after(value):
+    """解析Retry-After头，支持秒数和HTTP日期两种格式，返回秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HostBucket:
+    """单个主机的令牌桶和自适应状态"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.error_rate = 0.0  # 错误率的指数移动平均
+
+    def refill(self, now):
+        self.tokens = min(BURST, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class AdaptiveRateLimiter:
+    """
+    按主机划分的自适应限速器
+    每个主机一个令牌桶；遇到429/503或Retry-After时降速并暂停，
+    响应快且错误率低时逐步提速（加性增、乘性减）
+    """
+
+    def __init__(self, host_rates=None, default_rate=DEFAULT_RATE,
+                 min_rate=MIN_RATE, max_rate=MAX_RATE, target_latency=TARGET_LATENCY):
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates)
+        self.default_rate = default_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        if host not in self._buckets:
+            self._buckets[host] = HostBucket(self.host_rates.get(host, self.default_rate))
+        return self._buckets[host]
+
+    def acquire(self, url):
+        """阻塞直到该主机允许发出下一个请求"""
+        host = urlparse(url).netloc
+        while True:
+            with self._lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                bucket.refill(now)
+                if now < bucket.blocked_until:
+                    wait = bucket.blocked_until - now
+                elif bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    return
+                else:
+                    wait = (1 - bucket.tokens) / bucket.rate
+            time.sleep(wait)
+
+    def feedback(self, url, status=None, latency=None, retry_after=None, error=False):
+        """根据请求结果调整该主机的速率"""
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._bucket(host)
+            throttled = error or status in THROTTLE_STATUS
+            bucket.error_rate = bucket.error_rate * 0.9 + (0.1 if throttled else 0.0)
+
+            if throttled:
+                bucket.rate = max(self.min_rate, bucket.rate / 2)
+                pause = retry_after if retry_after is not None else 1 / bucket.rate
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + pause)
+                bucket.tokens = 0.0
+            elif latency is not None and latency > self.target_latency * 2:
+                bucket.rate = max(self.min_rate, bucket.rate * 0.9)
+            elif (latency is None or latency < self.target_latency) and bucket.error_rate < 0.05:
+                bucket.rate = min(self.max_rate, bucket.rate + 0.1)
+
+    def rate(self, url):
+        """当前该主机的速率（每秒请求数）"""
+        with self._lock:
+            return self._bucket(urlparse(url).netloc).rate
+
+# 所有脚本共用的限速器
+limiter = AdaptiveRateLimiter()
+
+# 出口代理池（见proxy_pool.use_proxies），设置后请求和浏览器导航按所用出口分别限速
+egress = None
+
+def request_with_limit(session, url, method="GET", retries=3, limiter=limiter, **kwargs):
+    """
+    经过限速器发出HTTP请求
+    遇到429/503时按Retry-After等待后重试，最终返回最后一次的响应
+    设置了出口代理池且没有指定proxies时，交给代理池选择出口
+    """
+    if egress is not None and "proxies" not in kwargs:
+        return egress.request(session, url, method, retries, **kwargs)
+    for attempt in range(retries + 1):
+        if attempt:
+            metrics.count("retries")
+        with metrics.timer("rate_wait"):
+            limiter.acquire(url)
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except Exception as e:
+            limiter.feedback(url, latency=time.monotonic() - start, error=True)
+            metrics.error("http", type(e).__name__)
+            if attempt == retries:
+                raise
+            continue
+
+        # stream=True时这里只收到了响应头，耗时即首字节时间
+        latency = time.monotonic() - start
+        metrics.observe("ttfb", latency)
+        if response.status_code >= 400:
+            metrics.error("http", f"status_{response.status_code}")
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        limiter.feedback(url, response.status_code, latency, retry_after)
+        if response.status_code not in THROTTLE_STATUS or attempt == retries:
+            return response
+        response.close()
+    return response
+
+# 浏览器最近一次导航的HTTP状态码（Navigation Timing，Chrome 109+），取不到时为null
+NAVIGATION_STATUS_JS = (
+    "const entry = performance.getEntriesByType('navigation')[0];"
+    "return entry && entry.responseStatus ? entry.responseStatus : null;"
+)
+
+def page_status(driver):
+    try:
+        return driver.execute_script(NAVIGATION_STATUS_JS)
+    except Exception:
+        return None
+
+def load_page(driver, url, limiter):
+    """经过limiter让浏览器打开页面，返回 (HTTP状态码, 耗时)；打开失败时向limiter报告后抛出异常"""
+    with metrics.timer("rate_wait"):
+        limiter.acquire(url)
+    start = time.monotonic()
+    try:
+        with metrics.timer("navigate"):
+            driver.get(url)
+    except Exception:
+        limiter.feedback(url, latency=time.monotonic() - start, error=True)
+        raise
+    latency = time.monotonic() - start
+    status = page_status(driver)
+    limiter.feedback(url, status, latency)
+    return status, latency
+
+def navigate(driver, url, limiter=limiter):
+    """
+    经过限速器让浏览器打开页面，返回页面的HTTP状态码（取不到时为None）
+    浏览器经过代理池的出口时交给代理池：使用该出口的限速器和并发上限，并按结果暂停或移除该出口
+    """
+    if egress is not None and egress.owns(driver):
+        return egress.navigate(driver, url)
+    return load_page(driver, url, limiter)[0]
@@ -0,0 +1,322 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 任务状态
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+LEASE_SECONDS = 120  # 领取后多久没有心跳就视为工作进程已退出，任务可被其他进程重新领取
+MAX_ATTEMPTS = 3  # 超过这个尝试次数的任务标记为failed
+POLL_INTERVAL = 5  # 暂时没有可领取的任务（其他进程还持有租约）时的等待间隔
+
+def new_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class WorkQueue:
+    """
+    基于SQLite的共享任务队列，多个工作进程通过租约安全地领取任务：
+    领取时在同一个写事务中把任务标记为leased并写入到期时间，工作进程定期发送心跳续约；
+    进程崩溃后租约过期，任务自动回到可领取状态。put是幂等的，每个进程都可以重复登记同一批任务
+    """
+
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks (key TEXT PRIMARY KEY, data TEXT, state TEXT NOT NULL, "
+            "worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until)")
+
+    def put(self, items):
+        """登记任务，items为 [(key, data)]；已存在的任务保持原状态"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tasks (key, data, state, updated) VALUES (?, ?, ?, ?)",
+                    [(key, json.dumps(data, ensure_ascii=False), PENDING, now) for key, data in items],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker, limit=1, lease=LEASE_SECONDS):
+        """领取最多limit个待处理或租约已过期的任务，返回 [{key, data, attempts}]"""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE事务在读取前就拿到写锁，多个进程不会领取到同一个任务
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 尝试次数已用完、租约又过期的任务不再重试
+                self._conn.execute(
+                    "UPDATE tasks SET state = ?, error = ?, updated = ? WHERE state = ? AND lease_until < ? "
+                    "AND attempts >= ?",
+                    (FAILED, "lease expired", now, LEASED, now, self.max_attempts),
+                )
+                rows = self._conn.execute(
+                    "SELECT key, data, attempts FROM tasks WHERE (state = ? OR (state = ? AND lease_until < ?)) "
+                    "AND attempts < ? ORDER BY attempts, rowid LIMIT ?",
+                    (PENDING, LEASED, now, self.max_attempts, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE tasks SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                    "updated = ? WHERE key = ?",
+                    [(LEASED, worker, now + lease, now, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [{"key": key, "data": json.loads(data) if data else None, "attempts": attempts + 1}
+                for key, data, attempts in rows]
+
+    def heartbeat(self, worker, keys, lease=LEASE_SECONDS):
+        """为仍由worker持有的任务续约，返回续约成功的key（租约已被他人接手的不在其中）"""
+        now = time.time()
+        held = []
+        with self._lock:
+            for key in keys:
+                cursor = self._conn.execute(
+                    "UPDATE tasks SET lease_until = ?, updated = ? WHERE key = ? AND state = ? AND worker = ?",
+                    (now + lease, now, key, LEASED, worker),
+                )
+                if cursor.rowcount:
+                    held.append(key)
+        return held
+
+    def complete(self, worker, key):
+        """标记任务完成；租约已失效（被其他进程接手）时返回False"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_until = NULL, error = NULL, updated = ? "
+                "WHERE key = ? AND state = ? AND worker = ?",
+                (DONE, time.time(), key, LEASED, worker),
+            )
+        return bool(cursor.rowcount)
+
+    def fail(self, worker, key, error=None):
+        """处理失败：尝试次数未用完时放回队列，否则标记为failed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, lease_until = NULL, "
+                "error = ?, updated = ? WHERE key = ? AND state = ? AND worker = ?",
+                (self.max_attempts, PENDING, FAILED, error, time.time(), key, LEASED, worker),
+            )
+        return bool(cursor.rowcount)
+
+    def retry_failed(self):
+        """把failed的任务重新放回队列"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET state = ?, attempts = 0, error = NULL, updated = ? WHERE state = ?",
+                (PENDING, time.time(), FAILED),
+            )
+        return cursor.rowcount
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# ---- 跨机器：HTTP服务端和客户端 ----
+
+class RemoteWorkQueue:
+    """通过HTTP访问 serve() 提供的队列，接口与WorkQueue相同"""
+
+    def __init__(self, url, timeout=30):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _call(self, method, **params):
+        response = self._session.post(f"{self.url}/{method}", json=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["result"]
+
+    def put(self, items):
+        return self._call("put", items=[list(item) for item in items])
+
+    def claim(self, worker, limit=1, lease=LEASE_SECONDS):
+        return self._call("claim", worker=worker, limit=limit, lease=lease)
+
+    def heartbeat(self, worker, keys, lease=LEASE_SECONDS):
+        return self._call("heartbeat", worker=worker, keys=list(keys), lease=lease)
+
+    def complete(self, worker, key):
+        return self._call("complete", worker=worker, key=key)
+
+    def fail(self, worker, key, error=None):
+        return self._call("fail", worker=worker, key=key, error=error)
+
+    def retry_failed(self):
+        return self._call("retry_failed")
+
+    def counts(self):
+        return self._call("counts")
+
+    def close(self):
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+REMOTE_METHODS = ("put", "claim", "heartbeat", "complete", "fail", "retry_failed", "counts")
+
+def serve(queue, host="0.0.0.0", port=8790):
+    """把队列通过HTTP提供给其他机器上的工作进程（POST /<方法名>，参数和结果为JSON）"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            method = self.path.strip("/")
+            try:
+                if method not in REMOTE_METHODS:
+                    raise KeyError(method)
+                length = int(self.headers.get("Content-Length") or 0)
+                params = json.loads(self.rfile.read(length) or b"{}")
+                body = json.dumps({"result": getattr(queue, method)(**params)}, ensure_ascii=False)
+                status = 200
+            except Exception as e:
+                body = json.dumps({"error": f"{type(e).__name__}: {e}"}, ensure_ascii=False)
+                status = 404 if isinstance(e, KeyError) else 500
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+def open_queue(spec):
+    """spec为SQLite文件路径，或 serve() 的地址（http://主机:端口）"""
+    if spec.startswith(("http://", "https://")):
+        return RemoteWorkQueue(spec)
+    return WorkQueue(spec)
+
+# ---- 工作进程 ----
+
+def per_item(func):
+    """把 func(key, data) -> bool 包装成按批处理的函数"""
+    def handle(tasks):
+        return {task["key"]: func(task["key"], task["data"]) for task in tasks}
+    return handle
+
+def run_worker(queue, handle, worker=None, batch_size=1, threads=1, lease=LEASE_SECONDS):
+    """
+    反复从队列领取任务并处理，直到没有待处理的任务，也没有其他进程持有的租约
+    handle(tasks) 接收一批任务，返回 {key: 是否成功}（缺少的key和抛出异常都算失败）
+    处理期间后台线程每隔lease/3秒为手上的任务续约
+    """
+    worker = worker or new_worker_id()
+    in_flight = set()
+    lock = threading.Lock()
+    stop = threading.Event()
+    stats = {"done": 0, "failed": 0, "lost": 0}
+
+    def heartbeat_loop():
+        while not stop.wait(lease / 3):
+            with lock:
+                keys = list(in_flight)
+            if keys:
+                try:
+                    lost = set(keys) - set(queue.heartbeat(worker, keys, lease))
+                except Exception as e:
+                    print(f"续约失败: {str(e)}")
+                    continue
+                if lost:
+                    print(f"{len(lost)} 个任务的租约已被其他进程接手")
+
+    def loop():
+        while True:
+            tasks = queue.claim(worker, batch_size, lease)
+            if not tasks:
+                counts = queue.counts()
+                if not counts.get(PENDING) and not counts.get(LEASED):
+                    return
+                # 其他进程还在处理；等它们完成，或租约过期后接手
+                time.sleep(POLL_INTERVAL)
+                continue
+            keys = [task["key"] for task in tasks]
+            with lock:
+                in_flight.update(keys)
+            try:
+                results = handle(tasks) or {}
+            except Exception as e:
+                print(f"任务处理出错: {str(e)}")
+                results = {}
+            for key in keys:
+                if results.get(key):
+                    ok = queue.complete(worker, key)
+                    counter = "done" if ok else "lost"
+                else:
+                    ok = queue.fail(worker, key, "failed")
+                    counter = "failed" if ok else "lost"
+                with lock:
+                    in_flight.discard(key)
+                    stats[counter] += 1
+
+    heartbeat = threading.Thread(target=heartbeat_loop, daemon=True)
+    heartbeat.start()
+    workers = [threading.Thread(target=loop, daemon=True) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stop.set()
+    heartbeat.join()
+    print(f"工作进程 {worker} 结束: 完成 {stats['done']}，失败 {stats['failed']}，租约失效 {stats['lost']}")
+    return stats
+
+if __name__ == "__main__":
+    # 在一台机器上提供队列，其他机器把脚本中的WORK_QUEUE设为 http://这台机器:端口
+    # 例如：python -m crawler_common.work_queue 碧蓝航线舰船.queue.db --port 8790
+    import argparse
+
+    parser = argparse.ArgumentParser(description="通过HTTP提供共享任务队列")
+    parser.add_argument("path", help="队列的SQLite文件")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--retry-failed", action="store_true", help="启动前把failed的任务放回队列")
+    args = parser.parse_args()
+
+    with WorkQueue(args.path) as work_queue:
+        if args.retry_failed:
+            print(f"已放回 {work_queue.retry_failed()} 个失败的任务")
+        server = serve(work_queue, args.host, args.port)
+        print(f"任务队列已启动: http://{args.host}:{args.port} {work_queue.counts()}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()